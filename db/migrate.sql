@@ -35,3 +35,41 @@ BEGIN;
     CREATE INDEX page_time_desc ON analytics.events (page, 'time' DESC);
 
 COMMIT;
+
+-- Rollups of the events per page, kept in sync by the application on startup
+-- from the `__continuous_aggregates__` declared on the models
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.events_page_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', time) AS bucket
+    ,page
+    ,count(page) AS count
+    ,sum(duration) AS sum_duration
+    ,min(duration) AS min_duration
+    ,max(duration) AS max_duration
+FROM analytics.events
+GROUP BY bucket, page
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('analytics.events_page_hourly',
+    start_offset => INTERVAL '3 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '30 minutes',
+    if_not_exists => true);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.events_page_daily
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 day', time) AS bucket
+    ,page
+    ,count(page) AS count
+    ,sum(duration) AS sum_duration
+    ,min(duration) AS min_duration
+    ,max(duration) AS max_duration
+FROM analytics.events
+GROUP BY bucket, page
+WITH NO DATA;
+
+SELECT add_continuous_aggregate_policy('analytics.events_page_daily',
+    start_offset => INTERVAL '1 month',
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists => true);
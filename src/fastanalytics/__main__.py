@@ -1,32 +1,50 @@
+from typing import TYPE_CHECKING
+
 import uvicorn
 
 from . import __version__, get_logger
 from .config import environ
 from .entrypoints import init_app
 
+if TYPE_CHECKING:
+    from fastapi import FastAPI
+
 logger = get_logger()
-app = init_app(  # type: ignore [no-untyped-call]
-    title="Web page events navigation",
-    description="API to retrieve the analytics capture for an page",
-    version=__version__,
-    debug=environ.environment == "dev",
-)
+
+
+def create_app() -> "FastAPI":
+    """Application of a worker process, built by each worker once started so
+    that the processes never share engines, pools or background tasks"""
+    return init_app(  # type: ignore [no-untyped-call]
+        title="Web page events navigation",
+        description="API to retrieve the analytics capture for an page",
+        version=__version__,
+        debug=environ.environment == "dev",
+    )
 
 
 def main() -> None:
     logger.info("Starting application for environment %s", environ.environment)
     logger.info(
-        "Starting Uvicorn server application at %s:%d",
+        "Starting Uvicorn server application at %s:%d with %d workers",
         environ.app.host,
         environ.app.port,
+        environ.workers,
     )
+    # SIGHUP replaces the workers one at a time, a new worker serves before
+    # the old one stops, and SIGTERM stops them. A worker that stops drains
+    # its in-flight requests for up to `graceful_timeout` seconds
     uvicorn.run(
-        "fastanalytics.__main__:app",
+        "fastanalytics.__main__:create_app",
+        factory=True,
         host=environ.app.host,
         port=environ.app.port,
+        workers=environ.workers,
+        timeout_graceful_shutdown=environ.app.graceful_timeout,
+        timeout_worker_healthcheck=environ.app.startup_timeout,
         server_header=environ.environment == "dev",
         access_log=False,
-        reload=environ.environment == "dev",
+        reload=environ.reload,
         log_config=None,
     )
     logger.info("Server application finished")
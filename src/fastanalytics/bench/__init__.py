@@ -0,0 +1,6 @@
+"""Benchmarks of the API, they require a running application (the database for
+the plan checks, nothing for the serialization and sketches ones) and the optional
+dependencies of the `bench` extra (``pip install fastanalytics[bench]``).
+
+``python -m fastanalytics.bench`` runs the load test of `bench.load`.
+"""
@@ -0,0 +1,73 @@
+import ipaddress
+import random
+import uuid
+from typing import Any
+
+PAGES = ["/home", "/FAQ", "/about", "/blog", "/contact"]
+
+# Same set of agents used by `scripts/dumb_populate`
+USER_AGENTS = [
+    (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Safari/537.36"
+    ),
+    (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2_1) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/17.2 Safari/605.1.15"
+    ),
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:122.0) Gecko/20100101 Firefox/122.0",
+    "Mozilla/5.0 (Windows NT 6.1; Trident/7.0; rv:11.0) like Gecko",
+    (
+        "Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/49.0.2623.112 Safari/537.36"
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 14; Pixel 8 Pro) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/122.0.0.0 Mobile Safari/537.36"
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 11; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "SamsungBrowser/17.0 Chrome/96.0.4664.45 Mobile Safari/537.36"
+    ),
+    (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/17.1 Mobile/15E148 Safari/604.1"
+    ),
+    (
+        "Mozilla/5.0 (iPad; CPU OS 16_7 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/16.7 Mobile/15E148 Safari/604.1"
+    ),
+    (
+        "Mozilla/5.0 (Linux; Android 13; Lenovo TB-J706F) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; Bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+    "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+    "DuckDuckBot/1.1; (+http://duckduckgo.com/duckduckbot.html)",
+    "curl/8.5.0",
+    "Wget/1.21.4 (linux-gnu)",
+    "HTTPie/3.2.2",
+    "python-httpx/0.28.1",
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+    "Twitterbot/1.0",
+]
+
+# Crawlers and command line clients of `USER_AGENTS`
+BOT_AGENTS = [
+    agent
+    for agent in USER_AGENTS
+    if any(mark in agent.lower() for mark in ("bot", "curl/", "wget/", "httpie/", "httpx/", "hit/"))
+]
+HUMAN_AGENTS = [agent for agent in USER_AGENTS if agent not in BOT_AGENTS]
+
+
+def random_event(rng: random.Random) -> dict[str, Any]:
+    """Random payload of POST /events"""
+    return {
+        "page": rng.choice(PAGES),
+        "agent": rng.choice(USER_AGENTS),
+        "ip_address": str(ipaddress.IPv4Address(rng.getrandbits(32))),
+        "session_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "duration": rng.randint(0, 65535),
+    }
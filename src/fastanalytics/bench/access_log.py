@@ -0,0 +1,134 @@
+"""Overhead per request of the access log of `LoggerMiddleware`
+
+A bare ASGI application is called in process, with and without the
+middleware, for the handlers of the logger written synchronously or through
+the queue listener and for several sampling rates of the 2xx responses. The
+records are written as JSON to the null device, each write blocked for
+`--write-delay` microseconds as a slow stderr pipe would.
+
+Usage::
+
+    python -m fastanalytics.bench.access_log --requests 20000 --write-delay 50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Any
+
+from .. import _LOGGER_NAME
+from ..config.environments import AccessLogSettings
+from ..entrypoints.logger import LOGGING_CONFIG, JsonFormatter, queue_handlers
+from ..middleware import LoggerMiddleware
+
+_HEADERS = [
+    (b"host", b"localhost:8080"),
+    (b"user-agent", b"Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:122.0) Firefox/122.0"),
+    (b"accept", b"application/json"),
+    (b"accept-encoding", b"gzip, deflate"),
+    (b"connection", b"keep-alive"),
+    (b"cookie", b"session=" + b"x" * 200),
+    (b"authorization", b"Bearer " + b"x" * 100),
+    (b"x-forwarded-for", b"10.0.0.1"),
+]
+
+
+async def _app(scope: Any, receive: Any, send: Any) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive() -> dict[str, Any]:
+    return {"type": "http.request", "body": b""}
+
+
+async def _send(message: Any) -> None:
+    pass
+
+
+def _scope() -> dict[str, Any]:
+    return {
+        "type": "http",
+        "scheme": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "path": "/api/v1.0/events",
+        "raw_path": b"/api/v1.0/events",
+        "query_string": b"page_size=100",
+        "root_path": "",
+        "headers": list(_HEADERS),
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8080),
+    }
+
+
+async def _latency(app: Any, requests: int) -> float:
+    """Mean time in microseconds of a request"""
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(_scope(), _receive, _send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+class _SlowStream:
+    """File whose writes block the calling thread for a while"""
+
+    def __init__(self, stream: Any, delay: float) -> None:
+        self._stream = stream
+        self._delay = delay
+
+    def write(self, data: str) -> int:
+        if self._delay:
+            time.sleep(self._delay)
+        return self._stream.write(data)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+def _json_handler(stream: Any) -> logging.Handler:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter(fmt_json=LOGGING_CONFIG["formatters"]["json"]["fmt_json"]))  # type: ignore[index]
+    return handler
+
+
+async def run(requests: int, rates: list[float], write_delay: float) -> None:
+    logger = logging.getLogger(_LOGGER_NAME)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    with open(os.devnull, "w") as devnull:
+        null = _SlowStream(devnull, write_delay / 1e6)
+        bare = await _latency(_app, requests)
+        print(f"{'handler':<8} {'2xx rate':>9} {'us/request':>11} {'overhead us':>12}")
+        print(f"{'-':<8} {'-':>9} {bare:>11.2f} {0:>12.2f}")
+        for queued in (False, True):
+            logger.handlers = [_json_handler(null)]
+            listener = queue_handlers(_LOGGER_NAME) if queued else None
+            for rate in rates:
+                settings = AccessLogSettings(sample_rates={"2xx": rate})
+                latency = await _latency(LoggerMiddleware(_app, settings), requests)
+                name = "queue" if queued else "sync"
+                print(f"{name:<8} {rate:>9.2f} {latency:>11.2f} {latency - bare:>12.2f}")
+            if listener is not None:
+                listener.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--rates", type=float, nargs="+", default=[1.0, 0.1, 0.01])
+    parser.add_argument("--write-delay", type=float, default=50.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.rates, args.write_delay))
+
+
+if __name__ == "__main__":
+    main()
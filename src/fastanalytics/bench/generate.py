@@ -0,0 +1,314 @@
+"""Load synthetic events into the events hypertable with COPY
+
+The events are generated in batches by sessions with numpy: pages follow a
+Zipf distribution over a catalog of pages, sessions have geometric lengths,
+their start times follow the hours of the day with bursts of traffic, and a
+share of them are bots (the bot agents of `USER_AGENTS`, crawling pages at
+random with short durations). Each worker loads its slice of the time range
+in time order over its own connection, so every COPY lands in few chunks.
+
+The columns are the ones of the `Event` model. Once loaded, the sketches of
+the `uniques` and percentiles are built from the events by the workers with
+`db.backfill` (unless `--no-sketches`), as the application writes them only
+for the events it ingests. The continuous aggregates
+only refresh the recent buckets on their own, the ones older than their
+`start_offset` need a manual `CALL refresh_continuous_aggregate(...)`.
+
+Usage::
+
+    python -m fastanalytics.bench.generate --rows 100000000 --workers 8 \\
+        --start 2025-01-01 --days 60
+"""
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+import psycopg
+from sqlalchemy import make_url
+
+from ..config import environ
+from ..db.backfill import backfill_sketches
+from ..db.engine import create_engine
+from ..db.sketches import sketch_bucket
+from ..models import Event
+from ._payloads import BOT_AGENTS, HUMAN_AGENTS, PAGES
+
+_TABLE = Event.__table__  # type: ignore[attr-defined]
+# Every column but the primary key generated by the database
+COLUMNS = [column.name for column in _TABLE.columns if column.name != "id"]
+REFERRERS = [
+    "https://www.google.com/",
+    "https://www.bing.com/",
+    "https://duckduckgo.com/",
+    "https://news.ycombinator.com/",
+    "https://www.reddit.com/",
+    "https://t.co/",
+    "https://www.facebook.com/",
+]
+_NULL = "\\N"
+_SECTIONS = ("blog", "products", "docs", "help", "pricing", "careers")
+
+
+def page_catalog(size: int) -> list[str]:
+    """Paths of the site, the pages of `PAGES` are the most visited"""
+    pages = list(PAGES)
+    index = 0
+    while len(pages) < size:
+        pages.append(f"/{_SECTIONS[index % len(_SECTIONS)]}/{index // len(_SECTIONS)}")
+        index += 1
+    return pages[:size]
+
+
+def _escape(value: str) -> str:
+    """Value of the COPY text format"""
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _hour_weights() -> "np.ndarray[Any, Any]":
+    """Relative traffic by hour of the day (UTC), low at night and peaking
+    in the afternoon"""
+    hours = np.arange(24)
+    return 0.15 + np.sin(np.pi * np.clip(hours - 6, 0, 18) / 18) ** 2
+
+
+class Generator:
+    """Batches of events of the COPY text format, reproducible by seed"""
+
+    def __init__(
+        self,
+        seed: int,
+        pages: int,
+        zipf: float,
+        bot_share: float,
+        burst_share: float,
+        session_length: float,
+    ) -> None:
+        self._rng = np.random.default_rng(seed)
+        catalog = page_catalog(pages)
+        self._pages = np.array([_escape(page) for page in catalog], dtype=object)
+        ranks = np.arange(1, len(catalog) + 1, dtype=np.float64)
+        self._page_weights = ranks**-zipf / np.sum(ranks**-zipf)
+        self._humans = np.array([_escape(agent) for agent in HUMAN_AGENTS], dtype=object)
+        self._bots = np.array([_escape(agent) for agent in BOT_AGENTS], dtype=object)
+        self._referrers = np.array([_escape(ref) for ref in REFERRERS] + [_NULL], dtype=object)
+        self._bot_share = bot_share
+        self._burst_share = burst_share
+        self._session_length = session_length
+        hour_weights = _hour_weights()
+        self._hour_accept = hour_weights / hour_weights.max()
+
+    def _session_starts(self, count: int, start: float, end: float) -> "np.ndarray[Any, Any]":
+        """Start times in seconds since the epoch, by hour of the day and bursts"""
+        rng = self._rng
+        starts = np.empty(count)
+        filled = 0
+        while filled < count:
+            candidates = rng.uniform(start, end, size=2 * (count - filled))
+            hours = (candidates // 3600 % 24).astype(np.int64)
+            accepted = candidates[rng.random(len(candidates)) < self._hour_accept[hours]]
+            taken = accepted[: count - filled]
+            starts[filled : filled + len(taken)] = taken
+            filled += len(taken)
+        bursts = rng.random(count) < self._burst_share
+        if bursts.any():
+            # A few minutes of heavy traffic, i.e. a post shared or a campaign
+            centers = rng.uniform(start, end, size=max(1, int((end - start) // 43200)))
+            starts[bursts] = rng.choice(centers, size=int(bursts.sum())) + rng.exponential(
+                120, size=int(bursts.sum())
+            )
+        return starts
+
+    def batch(self, rows: int, start: float, end: float) -> str:
+        """COPY text of `rows` events of sessions started in [start, end)"""
+        rng = self._rng
+        sessions = int(rows / self._session_length * 1.2) + 1
+        bots = rng.random(sessions) < self._bot_share
+        # Bots crawl many pages per session, people read a few
+        lengths = rng.geometric(
+            np.where(bots, 1 / (4 * self._session_length), 1 / self._session_length)
+        )
+        ends = np.cumsum(lengths)
+        sessions = int(np.searchsorted(ends, rows)) + 1
+        if sessions > len(lengths):
+            return self.batch(rows, start, end)
+        lengths, bots = lengths[:sessions], bots[:sessions]
+        lengths[-1] -= ends[sessions - 1] - rows
+        session = np.repeat(np.arange(sessions), lengths)
+        first = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        # Seconds between the page views of a session, the first one at its start
+        gaps = np.where(bots[session], rng.exponential(2, rows), rng.exponential(40, rows))
+        gaps[first] = 0
+        elapsed = np.cumsum(gaps)
+        elapsed -= np.repeat(elapsed[first], lengths)
+        seconds = np.repeat(self._session_starts(sessions, start, end), lengths) + elapsed
+        times = np.datetime_as_string(
+            (seconds * 1e6).astype("datetime64[us]"), unit="us", timezone="UTC"
+        )
+
+        pages = np.where(
+            bots[session],
+            self._pages[rng.integers(0, len(self._pages), rows)],
+            self._pages[rng.choice(len(self._pages), rows, p=self._page_weights)],
+        )
+        agents = np.where(
+            bots,
+            self._bots[rng.integers(0, len(self._bots), sessions)],
+            self._humans[rng.integers(0, len(self._humans), sessions)],
+        )
+        # Only the landing page of a person has an external referrer
+        referrers = np.full(rows, _NULL, dtype=object)
+        landing = self._referrers[rng.integers(0, len(self._referrers), sessions)]
+        referrers[first] = np.where(bots, _NULL, landing)
+        ips = rng.integers(0x01000000, 0xDF000000, sessions, dtype=np.uint32)
+        ip_strings = np.array(
+            [f"{ip >> 24}.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}" for ip in ips.tolist()],
+            dtype=object,
+        )
+        session_ids = np.array(
+            [str(uuid.UUID(bytes=rng.bytes(16), version=4)) for _ in range(sessions)],
+            dtype=object,
+        )
+        durations = np.where(
+            bots[session], rng.exponential(150, rows), rng.lognormal(np.log(15000), 1.0, rows)
+        ).round(1)
+
+        columns = {
+            "time": times.tolist(),
+            "page": pages.tolist(),
+            "agent": agents[session].tolist(),
+            "ip_address": ip_strings[session].tolist(),
+            "referrer": referrers.tolist(),
+            "session_id": session_ids[session].tolist(),
+            "duration": durations.astype(str).tolist(),
+        }
+        return "".join(
+            "\t".join(row) + "\n" for row in zip(*(columns[name] for name in COLUMNS), strict=True)
+        )
+
+
+def _conninfo() -> str:
+    """libpq connection string of the DSN of the application"""
+    url = make_url(environ.pg_dsn.encoded_string()).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+def _load(worker: int, args: argparse.Namespace, start: float, end: float, rows: int) -> int:
+    """Load the events of a worker in batches, in time order"""
+    generator = Generator(
+        seed=args.seed * 1000 + worker,
+        pages=args.pages,
+        zipf=args.zipf,
+        bot_share=args.bot_share,
+        burst_share=args.burst_share,
+        session_length=args.session_length,
+    )
+    batches = max(1, -(-rows // args.batch_size))
+    window = (end - start) / batches
+    statement = f"COPY {_TABLE.fullname} ({', '.join(COLUMNS)}) FROM STDIN"
+    loaded = 0
+    # A dry run only generates the batches
+    connection = nullcontext() if args.dry_run else psycopg.connect(_conninfo(), autocommit=True)
+    with connection as conn:
+        for index in range(batches):
+            size = min(args.batch_size, rows - loaded)
+            data = generator.batch(size, start + index * window, start + (index + 1) * window)
+            if conn is not None:
+                with conn.cursor() as cursor, cursor.copy(statement) as copy:
+                    copy.write(data)
+            loaded += size
+    return loaded
+
+
+def _backfill(start: float, end: float) -> int:
+    """Build the sketches of the loaded events between `start` and `end`"""
+    engine = create_engine()
+    try:
+        return backfill_sketches(
+            engine,
+            datetime.fromtimestamp(start, timezone.utc),
+            datetime.fromtimestamp(end, timezone.utc),
+        )
+    finally:
+        engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        default=datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        - timedelta(days=30),
+        help="Start of the time range, naive times are taken as UTC",
+    )
+    parser.add_argument("--days", type=float, default=30.0)
+    parser.add_argument("--pages", type=int, default=500, help="Size of the page catalog")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponent of the page ranks")
+    parser.add_argument("--bot-share", type=float, default=0.2, help="Fraction of bot sessions")
+    parser.add_argument("--burst-share", type=float, default=0.05)
+    parser.add_argument("--session-length", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true", help="Generate without loading")
+    parser.add_argument(
+        "--sketches",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Build the sketches of the loaded events",
+    )
+    args = parser.parse_args()
+
+    start = args.start if args.start.tzinfo else args.start.replace(tzinfo=timezone.utc)
+    begin = start.timestamp()
+    span = args.days * 86400 / args.workers
+    rows = [
+        args.rows // args.workers + (worker < args.rows % args.workers)
+        for worker in range(args.workers)
+    ]
+    clock = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(
+                _load,
+                worker,
+                args,
+                begin + worker * span,
+                begin + (worker + 1) * span,
+                rows[worker],
+            )
+            for worker in range(args.workers)
+        ]
+        loaded = sum(future.result() for future in futures)
+        elapsed = time.perf_counter() - clock
+        print(
+            f"{'Generated' if args.dry_run else 'Loaded'} {loaded:,} events in {elapsed:.1f}s "
+            f"({loaded / elapsed * 60:,.0f} rows/min) into {_TABLE.fullname}"
+        )
+        if args.dry_run or not args.sketches:
+            return
+        # Whole buckets of sketches per worker, so no two write the same rows
+        bounds = [
+            sketch_bucket(datetime.fromtimestamp(begin + worker * span, timezone.utc)).timestamp()
+            for worker in range(args.workers)
+        ] + [begin + args.workers * span]
+        clock = time.perf_counter()
+        futures = [
+            pool.submit(_backfill, low, high)
+            for low, high in zip(bounds, bounds[1:], strict=False)
+            if low < high
+        ]
+        written = sum(future.result() for future in futures)
+        print(f"Wrote {written:,} sketches in {time.perf_counter() - clock:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
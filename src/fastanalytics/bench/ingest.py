@@ -0,0 +1,73 @@
+"""Throughput of the single event ingestion against the batch ingestion
+
+Usage::
+
+    python -m fastanalytics.bench.ingest --url http://localhost:8000 --events 10000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from ._payloads import random_event
+
+EVENTS_PATH = "/api/v1.0/events"
+
+
+async def _single(client: httpx.AsyncClient, events: list[dict], concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(event: dict) -> None:
+        async with semaphore:
+            response = await client.post(EVENTS_PATH, json=event)
+            response.raise_for_status()
+
+    await asyncio.gather(*(post(event) for event in events))
+
+
+async def _batch(
+    client: httpx.AsyncClient, events: list[dict], concurrency: int, batch_size: int
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post(batch: list[dict]) -> None:
+        async with semaphore:
+            response = await client.post(f"{EVENTS_PATH}/batch", json=batch)
+            response.raise_for_status()
+
+    batches = [events[i : i + batch_size] for i in range(0, len(events), batch_size)]
+    await asyncio.gather(*(post(batch) for batch in batches))
+
+
+async def run(url: str, events: int, concurrency: int, batch_size: int, seed: int) -> None:
+    rng = random.Random(seed)
+    payloads = [random_event(rng) for _ in range(events)]
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        for name, scenario in (
+            ("single", _single(client, payloads, concurrency)),
+            ("batch", _batch(client, payloads, concurrency, batch_size)),
+        ):
+            start = time.perf_counter()
+            await scenario
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:>6}: {events} events in {elapsed:.2f}s ({events / elapsed:,.0f} events/s)"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.events, args.concurrency, args.batch_size, args.seed))
+
+
+if __name__ == "__main__":
+    main()
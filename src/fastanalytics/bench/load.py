@@ -0,0 +1,277 @@
+"""Load test of the ingest and query paths of a running application
+
+A number of concurrent workers send a weighted mix of requests for a fixed
+time: single events (`ingest`), the first page of GET /events (`list`),
+keyset pages deep in GET /events (`deep`) and GET /events/aggregate/{field}
+(`aggregate`). Throughput and p50/p95/p99 latency are reported by operation
+and written as JSON, which can be compared against a baseline run to flag
+regressions. The same seed replays the same requests.
+
+Usage::
+
+    python -m fastanalytics.bench --url http://localhost:8000 --duration 60 \\
+        --mix ingest=40 list=30 deep=10 aggregate=20 --output run.json --baseline base.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from .. import __version__
+from ._payloads import random_event
+
+EVENTS_PATH = "/api/v1.0/events"
+OPERATIONS = ("ingest", "list", "deep", "aggregate")
+_AGGREGATE_FIELDS = ("page", "agent", "referrer")
+_AGGREGATE_INTERVALS = ("1 hour", "6 hours", "1 day")
+_AGGREGATE_FUNCS = ("avg", "min", "max")
+# Increase of the error rate tolerated against the baseline
+_ERROR_RATE_SLACK = 0.01
+
+
+@dataclass
+class _Samples:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+
+class _Worker:
+    """Client loop of a worker, its requests only depend on its seed"""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        rng: random.Random,
+        mix: dict[str, int],
+        page_size: int,
+        deep_pages: int,
+    ) -> None:
+        self._client = client
+        self._rng = rng
+        self._operations = list(mix)
+        self._weights = list(mix.values())
+        self._page_size = page_size
+        self._deep_pages = deep_pages
+        self._cursor: str | None = None
+        self._depth = 0
+
+    async def run(self, deadline: float, samples: dict[str, _Samples]) -> None:
+        while time.perf_counter() < deadline:
+            operation = self._rng.choices(self._operations, self._weights)[0]
+            request = getattr(self, f"_{operation}")()
+            start = time.perf_counter()
+            try:
+                response = await request
+                failed = response.is_error
+            except httpx.HTTPError:
+                response, failed = None, True
+            elapsed = (time.perf_counter() - start) * 1000
+            samples[operation].latencies.append(elapsed)
+            samples[operation].errors += int(failed)
+            if operation == "deep":
+                self._follow(None if failed else response)
+
+    def _ingest(self) -> Any:
+        return self._client.post(EVENTS_PATH, json=random_event(self._rng))
+
+    def _list(self) -> Any:
+        return self._client.get(EVENTS_PATH, params={"page_size": self._page_size})
+
+    def _deep(self) -> Any:
+        params: dict[str, Any] = {"page_size": self._page_size}
+        if self._cursor:
+            params["cursor"] = self._cursor
+        return self._client.get(EVENTS_PATH, params=params)
+
+    def _aggregate(self) -> Any:
+        params = {
+            "page_size": self._page_size,
+            "interval": self._rng.choice(_AGGREGATE_INTERVALS),
+            "func": self._rng.sample(_AGGREGATE_FUNCS, self._rng.randint(1, 3)),
+        }
+        field_name = self._rng.choice(_AGGREGATE_FIELDS)
+        return self._client.get(f"{EVENTS_PATH}/aggregate/{field_name}", params=params)
+
+    def _follow(self, response: httpx.Response | None) -> None:
+        """Move the walk of the keyset pages one page further, back to the
+        first page at the end of the events or after `deep_pages` pages"""
+        cursor = None
+        if response is not None:
+            cursor = response.json()["metadata"]["pagination"].get("nextCursor")
+        self._depth += 1
+        if cursor is None or self._depth >= self._deep_pages:
+            cursor, self._depth = None, 0
+        self._cursor = cursor
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(int(q / 100 * len(values) + 0.5), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(samples: _Samples, elapsed: float) -> dict[str, float]:
+    latencies = sorted(samples.latencies)
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": samples.errors,
+        "error_rate": samples.errors / requests if requests else 0.0,
+        "throughput": requests / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+    }
+
+
+async def run(
+    url: str,
+    mix: dict[str, int],
+    duration: float,
+    concurrency: int,
+    page_size: int,
+    deep_pages: int,
+    seed: int,
+) -> dict[str, Any]:
+    samples = {operation: _Samples() for operation in mix}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        workers = [
+            _Worker(client, random.Random(seed + index), mix, page_size, deep_pages)
+            for index in range(concurrency)
+        ]
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(worker.run(deadline, samples) for worker in workers))
+        elapsed = time.perf_counter() - start
+    return {
+        "meta": {
+            "version": __version__,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "url": url,
+            "mix": mix,
+            "duration": elapsed,
+            "concurrency": concurrency,
+            "page_size": page_size,
+            "deep_pages": deep_pages,
+            "seed": seed,
+        },
+        "results": {
+            operation: summarize(operation_samples, elapsed)
+            for operation, operation_samples in samples.items()
+        },
+    }
+
+
+def regressions(results: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Operations slower or with less throughput than in the baseline by more
+    than `tolerance` (a fraction), or with more errors"""
+    found = []
+    for operation, current in results["results"].items():
+        previous = baseline["results"].get(operation)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                found.append(
+                    f"{operation}: {metric} {current[metric]:.2f} > {previous[metric]:.2f}"
+                )
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            found.append(
+                f"{operation}: throughput {current['throughput']:.1f} "
+                f"< {previous['throughput']:.1f} req/s"
+            )
+        if current["error_rate"] > previous["error_rate"] + _ERROR_RATE_SLACK:
+            found.append(
+                f"{operation}: error rate {current['error_rate']:.2%} "
+                f"> {previous['error_rate']:.2%}"
+            )
+    return found
+
+
+def report(results: dict[str, Any]) -> None:
+    print(
+        f"{'operation':<10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+    for operation, summary in results["results"].items():
+        print(
+            f"{operation:<10} {summary['requests']:>9} {summary['errors']:>7} "
+            f"{summary['throughput']:>9.1f} {summary['p50_ms']:>9.2f} "
+            f"{summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f}"
+        )
+
+
+def _mix(values: list[str]) -> dict[str, int]:
+    mix = {}
+    for value in values:
+        operation, _, weight = value.partition("=")
+        if operation not in OPERATIONS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(
+                f"Invalid mix {value!r}, expected <operation>=<weight> with one of {OPERATIONS}"
+            )
+        if int(weight):
+            mix[operation] = int(weight)
+    if not mix:
+        raise argparse.ArgumentTypeError("The mix has no operation with a positive weight")
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument(
+        "--mix", nargs="+", default=["ingest=40", "list=30", "deep=10", "aggregate=20"]
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--deep-pages", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results of a previous run to compare")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="Fraction of slack before a regression"
+    )
+    args = parser.parse_args()
+    try:
+        mix = _mix(args.mix)
+    except argparse.ArgumentTypeError as e_arg:
+        parser.error(str(e_arg))
+    results = asyncio.run(
+        run(
+            args.url,
+            mix,
+            args.duration,
+            args.concurrency,
+            args.page_size,
+            args.deep_pages,
+            args.seed,
+        )
+    )
+    report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        found = regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Latency of deep pages of GET /events with OFFSET against keyset cursors
+
+Usage::
+
+    python -m fastanalytics.bench.pagination --url http://localhost:8000 --depths 1 10 100 1000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+EVENTS_PATH = "/api/v1.0/events"
+
+
+async def _latency(client: httpx.AsyncClient, params: dict, repeat: int) -> float:
+    """Median latency in milliseconds of a GET /events request"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(EVENTS_PATH, params=params)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def _cursors(client: httpx.AsyncClient, depths: list[int], page_size: int) -> dict[int, str]:
+    """Walk the keyset pages once to collect the cursor that starts each depth"""
+    cursors: dict[int, str] = {}
+    cursor = None
+    for depth in range(1, max(depths) + 1):
+        if depth in depths and cursor is not None:
+            cursors[depth] = cursor
+        params = {"page_size": page_size, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(EVENTS_PATH, params=params)
+        response.raise_for_status()
+        cursor = response.json()["metadata"]["pagination"].get("nextCursor")
+        if cursor is None:
+            break
+    return cursors
+
+
+async def run(url: str, depths: list[int], page_size: int, repeat: int) -> None:
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        cursors = await _cursors(client, depths, page_size)
+        print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+        for depth in sorted(depths):
+            offset = await _latency(client, {"page_size": page_size, "page": depth}, repeat)
+            keyset_params = {"page_size": page_size}
+            if depth in cursors:
+                keyset_params["cursor"] = cursors[depth]
+            elif depth > 1:
+                print(f"{depth:>8} {offset:>12.2f} {'no data':>12}")
+                continue
+            keyset = await _latency(client, keyset_params, repeat)
+            print(f"{depth:>8} {offset:>12.2f} {keyset:>12.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000, 2000])
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.depths, args.page_size, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
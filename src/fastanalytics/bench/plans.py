@@ -0,0 +1,103 @@
+"""Check that the time range filters of the events queries exclude chunks
+
+The queries of GET /events and GET /events/aggregate/{field} are built for a
+time range and explained against the database configured by `PG_DSN`, the
+chunks of the events hypertable scanned by each plan are compared with the
+chunks that overlap the range. It exits with an error when a plan scans a
+chunk outside of the range.
+
+Usage::
+
+    python -m fastanalytics.bench.plans --start 2025-01-01 --end 2025-01-08 --pages /home
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from ..db import create_engine
+from ..db.queries import events_aggregate, events_page
+from ..schemas.queries import Page, PageAggregate
+
+# Chunks that overlap a time range, as TimescaleDB stores their ranges
+_OVERLAPPING_CHUNKS = text("""
+SELECT chunk_name
+FROM timescaledb_information.chunks
+WHERE hypertable_schema = 'analytics'
+    AND hypertable_name = 'events'
+    AND range_end > :start
+    AND range_start < :end;
+""")
+
+_ALL_CHUNKS = text("""
+SELECT chunk_name
+FROM timescaledb_information.chunks
+WHERE hypertable_schema = 'analytics'
+    AND hypertable_name = 'events';
+""")
+
+
+def _scanned_chunks(plan: dict[str, Any]) -> set[str]:
+    """Chunks of the hypertable read by the nodes of a JSON plan, the chunks
+    of compressed data (`compress_hyper_*`) are read through their parent"""
+    chunks = set()
+    relation = plan.get("Relation Name", "")
+    if plan.get("Schema") == "_timescaledb_internal" and relation.startswith("_hyper_"):
+        chunks.add(relation)
+    for child in plan.get("Plans", []):
+        chunks |= _scanned_chunks(child)
+    return chunks
+
+
+def check(start: datetime, end: datetime, pages: list[str] | None) -> bool:
+    engine = create_engine()
+    queries = {
+        "events": events_page(Page(start=start, end=end, page_path=pages)),
+        "aggregate (raw)": events_aggregate(
+            "referrer", PageAggregate(start=start, end=end, page_path=pages)
+        ),
+        "aggregate (rollup)": events_aggregate(
+            "page", PageAggregate(start=start, end=end, page_path=pages, interval="1 day")
+        ),
+    }
+    ok = True
+    with engine.connect() as conn:
+        page = Page(start=start, end=end)
+        overlapping = set(
+            conn.execute(_OVERLAPPING_CHUNKS, {"start": page.start, "end": page.end}).scalars()
+        )
+        chunks = set(conn.execute(_ALL_CHUNKS).scalars())
+        total = len(chunks)
+        print(f"{total} chunks, {len(overlapping)} overlapping [{page.start}, {page.end})")
+        print(f"{'query':<20} {'scanned':>8} {'excluded':>9} {'outside':>8}")
+        for name, query in queries.items():
+            statement = query.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+            explain = conn.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar_one()
+            # The rollups read the chunks of their own materialized hypertable
+            scanned = _scanned_chunks(explain[0]["Plan"]) & chunks
+            outside = scanned - overlapping
+            ok = ok and not outside
+            print(f"{name:<20} {len(scanned):>8} {total - len(scanned):>9} {len(outside):>8}")
+    engine.dispose()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--pages", nargs="*", default=None)
+    args = parser.parse_args()
+    if not check(args.start, args.end, args.pages or None):
+        print("Some plans scan chunks outside of the time range", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Serialization cost of a page of GET /events, with and without the models
+
+The baseline is the path of the threadpool routes: a `ResponsePage` of
+`Event` instances validated against the response model and rendered by
+`JSONResponse`. The fast path of the asyncio routes dumps the rows straight
+to JSON bytes with `dump_page`. No application nor database is needed, the
+rows are generated in process.
+
+Usage::
+
+    python -m fastanalytics.bench.serialization --sizes 100 500 1000
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from ..models import Event
+from ..schemas import EventSchema, Page, ResponsePage, StatusEnum
+from ..schemas.events import EventRow
+from ..schemas.responses import dump_page
+from ._payloads import random_event
+
+_RESPONSE_FIELD = create_model_field("Response", ResponsePage[EventSchema], mode="serialization")
+
+
+def _rows(size: int, rng: random.Random) -> list[dict[str, Any]]:
+    """Events as read from the database, keyed in the order of `EventRow`"""
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for index in range(size):
+        event = random_event(rng)
+        rows.append(
+            {
+                "page": event["page"],
+                "agent": event["agent"],
+                "ip_address": ipaddress.ip_address(event["ip_address"]),
+                "referrer": None,
+                "session_id": uuid.UUID(event["session_id"]),
+                "duration": float(event["duration"]),
+                "id": index,
+                "time": start + timedelta(seconds=index),
+            }
+        )
+    return rows
+
+
+async def _baseline(events: list[Event], page: Page) -> bytes:
+    response = ResponsePage(
+        results=events,
+        status=StatusEnum.success,
+        message="Successfully retrieved the model #Events",
+        total_records=len(events),
+        page=page,
+    )
+    content = await serialize_response(
+        field=_RESPONSE_FIELD, response_content=response, by_alias=True, exclude_none=True
+    )
+    return JSONResponse(content).body
+
+
+async def _fast_path(rows: list[dict[str, Any]], page: Page) -> bytes:
+    return dump_page(
+        EventRow,
+        rows,
+        status=StatusEnum.success,
+        message="Successfully retrieved the model #Events",
+        page=page,
+        total_records=len(rows),
+    )
+
+
+async def _cost(serialize: Any, rows: Any, page: Page, repeat: int) -> float:
+    """Median time in milliseconds to serialize a page"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await serialize(rows, page)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def run(sizes: list[int], repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    print(f"{'rows':>8} {'models ms':>12} {'fast path ms':>14} {'speedup':>9}")
+    for size in sizes:
+        rows = _rows(size, rng)
+        events = [Event(**row) for row in rows]
+        page = Page(page_size=size)
+        baseline = await _cost(_baseline, events, page, repeat)
+        fast_path = await _cost(_fast_path, rows, page, repeat)
+        print(f"{size:>8} {baseline:>12.2f} {fast_path:>14.2f} {baseline / fast_path:>8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.repeat, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Accuracy of the sketches of `fastanalytics.sketches` against exact answers
+
+For each cardinality a number of HyperLogLog sketches of random session IDs
+are built, half of the values in each of two sketches merged as the hourly
+sketches of a coarser interval are, and the relative error of the estimates
+is reported against the documented standard error. The run fails when the
+root mean square error is over twice the standard error.
+
+The percentiles of the durations are checked the same way: the durations of
+people and bots of `bench.generate` are sketched by hour with DDSketch,
+merged, and the p50/p90/p99 of the merged sketch are compared against the
+exact percentiles. DDSketch guarantees the relative accuracy, any error over
+it fails the run.
+
+The top pages are counted by Space-Saving in a sketch per window, merged,
+and compared against the exact counts of a Zipf distribution of pages: a
+count outside its error bound fails the run, the recall of the exact top
+pages is reported.
+
+Usage::
+
+    python -m fastanalytics.bench.sketches --trials 20
+"""
+
+import argparse
+import collections
+import math
+import random
+import statistics
+import sys
+import uuid
+
+from ..sketches import DDSketch, HyperLogLog, SpaceSaving
+from ..sketches.ddsketch import RELATIVE_ACCURACY, exact_quantile
+from ..sketches.hll import STANDARD_ERROR
+from ..sketches.space_saving import merge, top
+
+_CARDINALITIES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+# Float rounding of the bins on top of the guaranteed accuracy
+_EPSILON = 1e-9
+
+
+def hll_errors(cardinality: int, trials: int, rng: random.Random) -> list[float]:
+    """Relative errors of the estimates of merged sketches"""
+    errors = []
+    for _ in range(trials):
+        first, second = HyperLogLog(), HyperLogLog()
+        for index in range(cardinality):
+            sketch = first if index % 2 else second
+            sketch.add(str(uuid.UUID(int=rng.getrandbits(128), version=4)))
+        first.update(second)
+        errors.append((first.estimate() - cardinality) / cardinality)
+    return errors
+
+
+def durations(count: int, bot_share: float, rng: random.Random) -> list[float]:
+    """Durations in milliseconds distributed as the ones of `bench.generate`"""
+    return [
+        round(rng.expovariate(1 / 150), 1)
+        if rng.random() < bot_share
+        else round(rng.lognormvariate(math.log(15000), 1.0), 1)
+        for _ in range(count)
+    ]
+
+
+def ddsketch_errors(
+    values: list[float], buckets: int, rng: random.Random
+) -> dict[str, tuple[float, float, float]]:
+    """Exact and estimated percentiles of the values sketched in `buckets` sketches
+    merged into one, with their relative error"""
+    sketches = [DDSketch() for _ in range(buckets)]
+    for value in values:
+        rng.choice(sketches).add(value)
+    merged = DDSketch()
+    for sketch in sketches:
+        merged.update(sketch)
+    ordered = sorted(values)
+    errors = {}
+    for name, q in _PERCENTILES.items():
+        exact = exact_quantile(ordered, q)
+        estimated = merged.quantile(q) or 0.0
+        errors[name] = (exact, estimated, abs(estimated - exact) / exact if exact else estimated)
+    return errors
+
+
+def top_errors(
+    count: int, windows: int, capacity: int, limit: int, rng: random.Random
+) -> tuple[list[tuple[str, int, int, int]], float]:
+    """Top pages of `windows` merged sketches as `(page, exact, count, error)`
+    and the share of the exact top pages among them"""
+    pages = [f"/page/{int(rng.paretovariate(1.1))}" for _ in range(count)]
+    sketches = [SpaceSaving(capacity) for _ in range(windows)]
+    for index, page in enumerate(pages):
+        sketches[index * windows // count].add(page)
+    exact = collections.Counter(pages)
+    estimated = top(merge(sketches), limit)
+    expected = {page for page, _ in exact.most_common(limit)}
+    recall = len(expected & {page for page, _, _ in estimated}) / len(expected)
+    return [(page, exact[page], count, error) for page, count, error in estimated], recall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cardinalities", type=int, nargs="+", default=_CARDINALITIES)
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--durations", type=int, default=200_000)
+    parser.add_argument("--buckets", type=int, default=24, help="Sketches merged")
+    parser.add_argument("--bot-share", type=float, default=0.2)
+    parser.add_argument("--pages", type=int, default=200_000, help="Page views counted")
+    parser.add_argument("--windows", type=int, default=12, help="Space-Saving sketches merged")
+    parser.add_argument("--capacity", type=int, default=500)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    print(f"HyperLogLog, standard error {STANDARD_ERROR:.2%}")
+    print(f"{'distinct':>10} {'mean error':>11} {'rms error':>10} {'max error':>10}")
+    failed = False
+    for cardinality in args.cardinalities:
+        errors = hll_errors(cardinality, args.trials, rng)
+        rms = math.sqrt(statistics.fmean(error * error for error in errors))
+        failed |= rms > 2 * STANDARD_ERROR
+        print(
+            f"{cardinality:>10} {statistics.mean(errors):>11.2%} "
+            f"{rms:>10.2%} {max(errors, key=abs):>10.2%}"
+        )
+    if failed:
+        print("Root mean square error over twice the standard error", file=sys.stderr)
+
+    print(f"\nDDSketch, relative accuracy {RELATIVE_ACCURACY:.2%}")
+    print(f"{'percentile':>10} {'exact':>12} {'estimated':>12} {'error':>8}")
+    values = durations(args.durations, args.bot_share, rng)
+    inaccurate = False
+    for name, (exact, estimated, error) in ddsketch_errors(values, args.buckets, rng).items():
+        inaccurate |= error > RELATIVE_ACCURACY + _EPSILON
+        print(f"{name:>10} {exact:>12.1f} {estimated:>12.1f} {error:>8.2%}")
+    if inaccurate:
+        print("Percentiles beyond the relative accuracy", file=sys.stderr)
+
+    print(f"\nSpace-Saving, {args.capacity} counters per window")
+    print(f"{'page':>12} {'exact':>8} {'count':>8} {'error':>8}")
+    estimated, recall = top_errors(args.pages, args.windows, args.capacity, args.top, rng)
+    unbounded = False
+    for page, exact, count, error in estimated:
+        unbounded |= not count - error <= exact <= count
+        print(f"{page:>12} {exact:>8} {count:>8} {error:>8}")
+    print(f"Recall of the top {args.top} pages {recall:.0%}")
+    if unbounded:
+        print("Counts beyond their error bound", file=sys.stderr)
+    if failed or inaccurate or unbounded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
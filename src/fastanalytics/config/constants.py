@@ -5,3 +5,13 @@ if TYPE_CHECKING:
 
 REQ_ID_HEADER: 'Literal["X-Request-ID"]' = "X-Request-ID"
 RES_TIME_ELAPSE: 'Literal["X-Elapsed-Time"]' = "X-Elapsed-Time"
+
+# Media type of the columnar representation of the list endpoints
+COLUMNAR_MEDIA_TYPE = "application/vnd.fastanalytics.columnar+json"
+
+# Maximum number of events accepted in a single call of POST /events/batch
+EVENTS_BATCH_LIMIT = 5000
+# Rows fetched from the server-side cursor per round trip of GET /events/export
+EVENTS_EXPORT_BATCH = 5000
+# Maximum number of groups of the open bucket streamed by GET /events/stream
+EVENTS_STREAM_GROUPS = 1000
@@ -1,14 +1,164 @@
-from typing import Literal
+from typing import Annotated, Literal
 
-from pydantic import BaseModel, PostgresDsn
+from pydantic import (
+    BaseModel,
+    Field,
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveFloat,
+    PositiveInt,
+    PostgresDsn,
+)
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 env = Literal["dev", "prod"]
+status_class = Literal["1xx", "2xx", "3xx", "4xx", "5xx"]
+sample_rate = Annotated[float, Field(ge=0, le=1)]
+sketch_field = Literal["page", "agent", "referrer"]
+live_field = Literal["page", "agent"]
+retention_interval = Annotated[
+    str, Field(pattern=r"^\d+\s+(day|days|week|weeks|month|months|year|years)$")
+]
 
 
 class AppSettings(BaseModel):
     host: str = "0.0.0.0"
     port: int = 8080
+    # Worker processes of `python -m fastanalytics`, each one builds its own
+    # application, engines and pools once started. The dev reload runs one
+    workers: PositiveInt = 1
+    # Seconds the in-flight requests of a worker have to finish on shutdown,
+    # or on the restart of the workers with SIGHUP, before they are cancelled
+    graceful_timeout: PositiveInt = 30
+    # Seconds a worker has to answer the health checks of the server, and a
+    # new worker to bootstrap the database and start serving on a restart
+    startup_timeout: PositiveInt = 30
+
+
+class DatabaseSettings(BaseModel):
+    # Connection pool of each engine, size it against the number of workers
+    # so that workers * (pool_size + max_overflow) < max_connections
+    pool_size: PositiveInt = 20
+    max_overflow: NonNegativeInt = 10
+    # Connections of all the workers together, when set the pools of each
+    # worker are sized from it in the ratio of pool_size to max_overflow,
+    # see `db.engine.worker_pool`. 0 keeps pool_size and max_overflow
+    max_connections: NonNegativeInt = 0
+    # Seconds to wait for a connection before failing the checkout
+    pool_timeout: PositiveFloat = 30.0
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    # Milliseconds before Postgres cancels a statement, 0 disables it
+    statement_timeout: NonNegativeInt = 30_000
+    # Log every SQL statement, only useful for debugging
+    echo: bool = False
+    # Milliseconds after which an statement is logged as slow, 0 disables it.
+    # The latency of every statement is recorded anyway, see /internal/queries
+    slow_query_ms: NonNegativeInt = 200
+
+
+class IngestSettings(BaseModel):
+    # Opt-in write-behind mode of POST /events, events are queued in memory
+    # and flushed in bulk by a background task of the application lifespan
+    write_behind: bool = False
+    buffer_size: PositiveInt = 10_000
+    flush_size: PositiveInt = 1_000
+    # Maximum number of seconds an event waits in the buffer before a flush
+    flush_interval: PositiveFloat = 1.0
+
+
+class CacheSettings(BaseModel):
+    # In-process cache of the results of GET /events/aggregate/{field}
+    enabled: bool = True
+    max_entries: PositiveInt = 1_024
+    max_bytes: PositiveInt = 64 * 1024 * 1024
+    # Seconds the groups of the open (most recent) bucket are served from the
+    # cache before they are recomputed, the closed buckets never expire
+    ttl: PositiveFloat = 5.0
+    # Seconds after the end of a bucket during which late events may still be
+    # written into it (other workers, clock skew), until then a closed bucket
+    # is cached with the TTL. With the write-behind buffer it is at least the
+    # flush interval plus the longest backoff of its retries
+    lateness: NonNegativeFloat = 60.0
+
+
+class RetentionSettings(BaseModel):
+    # Age after which the chunks of a hypertable are dropped, by table name,
+    # e.g. {"events": "3 months"}. Retention is opt-in, no table drops its
+    # chunks by default and a policy already in the database is not modified
+    drop_after: dict[str, retention_interval] = {}
+
+
+class AccessLogSettings(BaseModel):
+    # Headers of the requests and responses written in the access log, any
+    # other header (cookies, credentials, ...) is left out
+    headers: list[str] = [
+        "host",
+        "user-agent",
+        "referer",
+        "content-type",
+        "content-length",
+        "content-encoding",
+        "x-forwarded-for",
+        "x-request-id",
+    ]
+    # Fraction of the requests logged by class of the status code
+    sample_rates: dict[status_class, sample_rate] = {
+        "1xx": 1.0,
+        "2xx": 1.0,
+        "3xx": 1.0,
+        "4xx": 1.0,
+        "5xx": 1.0,
+    }
+    # Rates of the routes starting with a path, the longest path matching a
+    # request wins and the classes missing fall back to `sample_rates`,
+    # e.g. {"/api/v1.0/healthzcheck": {"2xx": 0.0}}
+    route_sample_rates: dict[str, dict[status_class, sample_rate]] = {}
+
+
+class SketchSettings(BaseModel):
+    # Fields whose values get a HyperLogLog sketch of their unique sessions per
+    # hour, read by the `uniques` aggregation, an empty list disables the sketches.
+    # A sketch per value and hour, up to 8 KB each: mind the fields of many
+    # values such as `referrer`
+    fields: list[sketch_field] = ["page"]
+    # Seconds between the writes of the sketches of the inserted events,
+    # accumulated in memory by each worker
+    flush_interval: PositiveFloat = 5.0
+
+
+class TopSettings(BaseModel):
+    # Fields whose most frequent values are counted in memory by a Space-Saving
+    # sketch per window for GET /events/top/{field}, an empty list disables them
+    fields: list[sketch_field] = ["page", "referrer"]
+    # Values monitored by each sketch, the more the lower the error of the counts
+    capacity: PositiveInt = 500
+    # Seconds of each window and number of the latest windows answered from
+    # memory, the older windows are read from the database
+    window: PositiveInt = 300
+    windows: PositiveInt = 12
+    # Most frequent values of each closed window written to the database, and
+    # seconds between the writes of the closed windows
+    persisted: PositiveInt = 100
+    persist_interval: PositiveFloat = 10.0
+
+
+class LiveSettings(BaseModel):
+    # Fields whose count, sum, min and max of the duration per minute are held
+    # in memory for the current and previous minutes, and merged into the
+    # avg/min/max of GET /events/aggregate/{field}, an empty list disables it.
+    # Only used with a single worker, each worker holds the events it ingested
+    fields: list[live_field] = ["page"]
+
+
+class StreamSettings(BaseModel):
+    # Seconds between the updates of each subscription of GET /events/stream,
+    # every subscription runs a single query per update whatever its clients
+    interval: PositiveFloat = 2.0
+    # Updates queued per client, a client further behind is dropped
+    queue_size: PositiveInt = 16
+    # Seconds without updates after which a comment keeps the connection open
+    keepalive: PositiveFloat = 15.0
 
 
 class _Settings(BaseSettings):
@@ -24,6 +174,25 @@ class _Settings(BaseSettings):
     timezone: str
     environment: env = "dev"
     app: AppSettings
+    db: DatabaseSettings = DatabaseSettings()
+    ingest: IngestSettings = IngestSettings()
+    cache: CacheSettings = CacheSettings()
+    retention: RetentionSettings = RetentionSettings()
+    access_log: AccessLogSettings = AccessLogSettings()
+    sketches: SketchSettings = SketchSettings()
+    top: TopSettings = TopSettings()
+    live: LiveSettings = LiveSettings()
+    stream: StreamSettings = StreamSettings()
+
+    @property
+    def reload(self) -> bool:
+        """The dev environment reloads the application when the code changes"""
+        return self.environment == "dev"
+
+    @property
+    def workers(self) -> int:
+        """Worker processes started, `app.workers` unless the reloader runs one"""
+        return 1 if self.reload else self.app.workers
 
 
 environ = _Settings()  # pyright: ignore[reportCallIssue]
@@ -1,60 +1,93 @@
 from typing import TYPE_CHECKING
 
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .. import get_logger
 from ..config import environ
 from .activator import activate_ext
-from .engine import create_engine
+from .bootstrap import bootstrap_schema
+from .cache import ResultCache
+from .engine import create_async_engine, create_engine, worker_pool
+from .ingest import MAX_FLUSH_BACKOFF, BufferFullError, IngestBuffer, insert_events
+from .instrument import query_recorder
+from .live import LiveRollup
+from .pool import pool_stats
+from .sketches import SketchBuffer
+from .stream import StreamHub
+from .timescale.aggregates import sync_continuous_aggregates
 from .timescale.functions import approximate_row_count, time_bucket
 from .timescale.hypertables import sync_hypertables
+from .top import HeavyHitters
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
-
     from sqlalchemy import Engine
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from ..config.environments import DatabaseSettings
 
 
 __all__ = [
     "activate_ext",
+    "bootstrap_schema",
     "sync_hypertables",
+    "sync_continuous_aggregates",
     "time_bucket",
     "approximate_row_count",
+    "insert_events",
+    "SketchBuffer",
+    "IngestBuffer",
+    "BufferFullError",
+    "MAX_FLUSH_BACKOFF",
+    "ResultCache",
+    "HeavyHitters",
+    "LiveRollup",
+    "StreamHub",
     "init_engine",
+    "create_engine",
+    "create_async_engine",
+    "worker_pool",
+    "session_factory",
+    "async_session_factory",
+    "pool_stats",
+    "query_recorder",
 ]
 
 
-def init_engine() -> "Engine":
+def init_engine(settings: "DatabaseSettings | None" = None) -> "Engine":
     """Initialize the database connection and the related setup
-    In a lifespan cycle for the application
+    In a lifespan cycle for the application, the schema is only synced when
+    the models changed, see `bootstrap_schema`
 
     Return: `sqlalchemy.Engine`
     """
     logger = get_logger()
     logger.info("Creating SQL engine using timezone %s", environ.timezone)
-    engine = create_engine()
-    with engine.begin() as conn:
-        try:
-            logger.debug('Creating extensions in database ["timescaledb", "uuid-ossp"]')
-            activate_ext(conn, "timescaledb")
-            activate_ext(conn, "uuid-ossp")
-        except SQLAlchemyError as e_sql:
-            logger.error(
-                "SQL Error encounter init_db (%s) (%d) (%s)",
-                type(e_sql).__name__,
-                e_sql.code,
-                e_sql._message(),
-            )
-            raise e_sql
-        except:
-            logger.exception("Unexpected error encounter init_db")
-            raise
+    engine = create_engine(settings)
+    try:
+        bootstrap_schema(logger, engine)
+    except SQLAlchemyError as e_sql:
+        logger.error(
+            "SQL Error encounter init_db (%s) (%s) (%s)",
+            type(e_sql).__name__,
+            e_sql.code,
+            e_sql._message(),
+        )
+        raise e_sql
+    except:
+        logger.exception("Unexpected error encounter init_db")
+        raise
     return engine
 
 
-def get_session() -> "Generator[Session, None, None]":
-    """Get the a new session connected to the database"""
-    # TODO: should we use a sessionmaker here?
-    with Session(create_engine()) as session:
-        yield session
+def session_factory(engine: "Engine") -> "sessionmaker[Session]":
+    """Factory of sessions bound to the engine owned by the application lifespan"""
+    return sessionmaker(engine, class_=Session)
+
+
+def async_session_factory(engine: "AsyncEngine") -> "async_sessionmaker[AsyncSession]":
+    """Factory of asyncio sessions bound to the engine owned by the application lifespan"""
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
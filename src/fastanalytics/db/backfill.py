@@ -0,0 +1,117 @@
+"""Backfill of the sketches of the events inserted without them
+
+The sketches of `event_sketches` are written by the application as it
+ingests the events, the events loaded by other means (before the sketches
+were deployed, with `bench.generate` or a restore) have none and the
+`uniques` and percentiles of their hours would be missing or too low. The
+backfill reads the events of each hour and replaces the sketches of the
+hour with the ones of all its events, so running it again is harmless.
+
+Only backfill closed hours whose events are all in the table: the sketches
+merged meanwhile by the application into an hour being backfilled are lost.
+
+Usage::
+
+    python -m fastanalytics.db.backfill --start 2025-01-01 --end 2025-03-01
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlmodel import Session, col, select
+
+from ..config import environ
+from ..models import Event
+from ..utils import get_utc_now
+from .engine import create_engine
+from .sketches import (
+    SKETCH_BUCKET,
+    add_sketches,
+    sketch_bucket,
+    sketch_rows,
+    write_sketches,
+)
+from .timescale.utils import interval_seconds
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import Engine
+
+    from ..sketches import DDSketch, HyperLogLog
+
+# Events fetched at once from the cursor of an hour
+BACKFILL_BATCH = 10_000
+
+_BUCKET = timedelta(seconds=interval_seconds(SKETCH_BUCKET))
+
+
+def backfill_sketches(
+    engine: "Engine",
+    start: datetime,
+    end: datetime,
+    fields: "Sequence[str] | None" = None,
+) -> int:
+    """Replace the sketches of the buckets between `start` and `end` (widened
+    to whole buckets) with the ones of their events, a bucket per transaction
+
+    Return: the number of sketches written
+    """
+    fields = environ.sketches.fields if fields is None else fields
+    if not fields:
+        return 0
+    columns = {"time", "session_id", "duration", *fields}
+    written = 0
+    bucket = sketch_bucket(start)
+    while bucket < end:
+        statement = (
+            select(*(getattr(Event, column) for column in sorted(columns)))
+            .where(col(Event.time) >= bucket, col(Event.time) < bucket + _BUCKET)
+            .execution_options(yield_per=BACKFILL_BATCH)
+        )
+        sketches: dict[tuple[str, str, datetime], tuple[HyperLogLog, DDSketch]] = {}
+        with Session(engine) as session:
+            for partition in session.execute(statement).partitions():
+                rows = [row._mapping for row in partition]
+                add_sketches(sketches, rows, [row["time"] for row in rows], fields)
+            if sketches:
+                rows = sketch_rows(sketches)
+                write_sketches(session, rows, replace=True)
+                session.commit()
+                written += len(rows)
+        bucket += _BUCKET
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Start of the time range, naive times are taken as UTC",
+    )
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        default=None,
+        help="End of the time range, by default the start of the current hour",
+    )
+    args = parser.parse_args()
+
+    start = args.start if args.start.tzinfo else args.start.replace(tzinfo=timezone.utc)
+    end = args.end or sketch_bucket(get_utc_now())
+    end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    engine = create_engine()
+    clock = time.perf_counter()
+    try:
+        written = backfill_sketches(engine, start, end)
+    finally:
+        engine.dispose()
+    print(f"Wrote {written:,} sketches in {time.perf_counter() - clock:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
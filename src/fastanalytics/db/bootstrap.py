@@ -0,0 +1,161 @@
+"""Bootstrap of the schema declared by the models, once per change of the models
+
+The full sync (extensions, schema, tables, sketch functions, hypertables,
+policies and continuous aggregates) lists the catalogs of TimescaleDB and
+compiles the DDL of every model, a cost paid by every worker on every
+restart. A fingerprint of everything the sync creates, the DDL of the tables
+and their indexes and the parameters of the hypertables and rollups, is kept
+in the `schema_version` table once a sync succeeds: when it matches the
+fingerprint of the models the bootstrap is a single query.
+
+The sync runs under an advisory lock, a worker that waited for it checks the
+fingerprint again as another worker may have synced the same models. A step
+of the sync not described by the models needs a new `BOOTSTRAP_VERSION`.
+Deleting the row of `schema_version` forces the next start to sync.
+"""
+
+import hashlib
+import json
+import time
+from functools import cache
+from typing import TYPE_CHECKING
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateSchema, CreateTable
+
+from ..config import environ
+from ..models import SCHEMA, BaseTable, SchemaVersion
+from ..utils import get_utc_now
+from .activator import activate_ext
+from .sketches import (
+    MERGE_BINS_FUNCTION,
+    SPARSE_SESSIONS_FUNCTION,
+    SUM_BINS_AGGREGATE,
+    create_sketch_functions,
+)
+from .timescale.aggregates import model_continuous_aggregates, sync_continuous_aggregates
+from .timescale.hypertables import sync_hypertables
+from .timescale.utils import extract_model_hyper_params, extract_model_policy_params
+
+if TYPE_CHECKING:
+    import logging
+
+    from sqlalchemy import Connection, Engine
+
+# Version of the steps of the sync, part of the fingerprint
+BOOTSTRAP_VERSION = 1
+EXTENSIONS = ("timescaledb", "uuid-ossp")
+# Key of the advisory lock held while the schema is synced
+_BOOTSTRAP_LOCK = 7_311_020_414
+_TABLE = SchemaVersion.__table__  # type: ignore[attr-defined]
+
+
+@cache
+def schema_fingerprint() -> str:
+    """SHA-256 of the schema declared by the models, as created by the sync"""
+    dialect = postgresql.dialect()  # type: ignore[no-untyped-call]
+    models = [
+        model
+        for model in BaseTable.__subclasses__()
+        if getattr(model, "__table__", None) is not None
+    ]
+    declared = {
+        "version": BOOTSTRAP_VERSION,
+        "extensions": EXTENSIONS,
+        "tables": [
+            str(CreateTable(table).compile(dialect=dialect)).strip()
+            for table in BaseTable.metadata.sorted_tables
+        ],
+        "indexes": sorted(
+            str(CreateIndex(index).compile(dialect=dialect))
+            for table in BaseTable.metadata.sorted_tables
+            for index in table.indexes
+        ),
+        "hypertables": sorted(
+            [
+                extract_model_hyper_params(model).model_dump_json(),
+                extract_model_policy_params(model, environ.retention.drop_after).model_dump_json(),
+                *(params.model_dump_json() for params in model_continuous_aggregates(model)),
+            ]
+            for model in models
+        ),
+        "functions": [
+            MERGE_BINS_FUNCTION.text,
+            SUM_BINS_AGGREGATE.text,
+            SPARSE_SESSIONS_FUNCTION.text,
+        ],
+    }
+    return hashlib.sha256(json.dumps(declared, sort_keys=True).encode()).hexdigest()
+
+
+def stored_fingerprint(conn: "Connection") -> str | None:
+    """Fingerprint of the last sync, `None` before the first one. The connection
+    must be in autocommit mode, a missing table fails the statement"""
+    try:
+        return conn.execute(select(SchemaVersion.fingerprint)).scalar()
+    except ProgrammingError:
+        return None
+
+
+def bootstrap_schema(logger: "logging.Logger", engine: "Engine") -> bool:
+    """Sync the schema declared by the models when its fingerprint differs
+    from the stored one. Return whether the sync ran"""
+    started = time.perf_counter()
+    fingerprint = schema_fingerprint()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if stored_fingerprint(conn) == fingerprint:
+            logger.info(
+                "Schema %s up to date, checked in %.1f ms",
+                fingerprint[:12],
+                (time.perf_counter() - started) * 1000,
+            )
+            return False
+        conn.execute(select(func.pg_advisory_lock(_BOOTSTRAP_LOCK)))
+        try:
+            if stored_fingerprint(conn) == fingerprint:
+                logger.info("Schema %s synced by another worker", fingerprint[:12])
+                return False
+            logger.info("Syncing schema %s", fingerprint[:12])
+            sync_schema(logger, engine, conn)
+            write_fingerprint(conn, fingerprint)
+        finally:
+            conn.execute(select(func.pg_advisory_unlock(_BOOTSTRAP_LOCK)))
+    logger.info(
+        "Schema %s synced in %.1f ms", fingerprint[:12], (time.perf_counter() - started) * 1000
+    )
+    return True
+
+
+def sync_schema(logger: "logging.Logger", engine: "Engine", conn: "Connection") -> None:
+    """Create the extensions, tables, functions and hypertables of the models in
+    a transaction, then the continuous aggregates with `conn` in autocommit mode"""
+    with engine.begin() as ddl:
+        logger.debug("Creating extensions in database %s", list(EXTENSIONS))
+        for extension in EXTENSIONS:
+            activate_ext(ddl, extension)
+        ddl.execute(CreateSchema(SCHEMA, if_not_exists=True))
+        BaseTable.metadata.create_all(ddl)
+        create_sketch_functions(ddl)
+        sync_hypertables(logger, ddl, environ.retention.drop_after)
+    # Continuous aggregates are refreshed on creation, which is not allowed
+    # inside a transaction block
+    sync_continuous_aggregates(logger, conn)
+
+
+def write_fingerprint(conn: "Connection", fingerprint: str) -> None:
+    values = {
+        "id": 1,
+        "version": BOOTSTRAP_VERSION,
+        "fingerprint": fingerprint,
+        "applied_at": get_utc_now(),
+    }
+    statement = insert(_TABLE).values(values)
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[_TABLE.c.id],
+            set_={key: statement.excluded[key] for key in values if key != "id"},
+        )
+    )
@@ -0,0 +1,117 @@
+"""In-process cache of query results, bounded by number of entries and memory"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Row
+
+from ..schemas import CacheStats
+
+
+@dataclass(slots=True)
+class _Entry:
+    value: Any
+    size: int
+    # Monotonic time after which the entry is stale, `None` never expires
+    expires_at: float | None
+
+
+def sizeof(value: Any) -> int:
+    """Rough estimate in bytes of the memory held by a query result, it
+    follows the rows, mappings and sequences but not arbitrary objects"""
+    size = sys.getsizeof(value)
+    if isinstance(value, Row):
+        return size + sum(sizeof(item) for item in value)
+    if isinstance(value, Mapping):
+        return size + sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    if isinstance(value, list | tuple | set | frozenset):
+        return size + sum(sizeof(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """LRU cache of query results.
+
+    Entries are stored either with the TTL of the cache, for results that
+    change as new data is ingested, or without expiration for immutable
+    results. The least recently used entries are evicted once the cache
+    holds more than `max_entries` entries or more than `max_bytes` bytes
+    (as estimated by `sizeof`), a result larger than `max_bytes` is not
+    cached at all. It is safe to use from several threads.
+
+    `lateness` is the number of seconds after the end of a time range during
+    which events may still be written into it, its results are only
+    immutable after that.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, lateness: float = 0.0) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self.lateness = lateness
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """Cached value of a key, `None` when it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._drop(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, *, immutable: bool = False) -> None:
+        """Cache a value, with the TTL of the cache unless it is `immutable`"""
+        size = sizeof(value)
+        if size > self._max_bytes:
+            return
+        expires_at = None if immutable else time.monotonic() + self._ttl
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                enabled=True,
+                entries=len(self._entries),
+                max_entries=self._max_entries,
+                bytes=self._bytes,
+                max_bytes=self._max_bytes,
+                ttl_seconds=self._ttl,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+            )
+
+    def _drop(self, key: Hashable) -> None:
+        self._bytes -= self._entries.pop(key).size
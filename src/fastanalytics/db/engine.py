@@ -1,40 +1,96 @@
-from functools import cache, wraps
+from functools import wraps
 from typing import TYPE_CHECKING, cast
 
 import sqlmodel
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import create_async_engine as sa_create_async_engine
 
 from ..config import environ
+from .instrument import instrument_engine
+from .pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
 if TYPE_CHECKING:
     from collections.abc import Callable
-    from typing import ParamSpec
+    from typing import Any, ParamSpec, TypeVar
 
     from sqlalchemy.engine import Engine
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from ..config.environments import DatabaseSettings
 
     PEngine = ParamSpec("PEngine")
+    TEngine = TypeVar("TEngine", "Engine", "AsyncEngine")
 
 
 def _create_engine(
-    func: "Callable[PEngine, Engine]",
+    func: "Callable[PEngine, TEngine]",
     timezone: str = "UTC",
-) -> "Callable[PEngine, Engine]":
+    statement_timeout: int = 0,
+) -> "Callable[PEngine, TEngine]":
     @wraps(func)
-    def wrapper(*args: "PEngine.args", **kwargs: "PEngine.kwargs") -> "Engine":
+    def wrapper(*args: "PEngine.args", **kwargs: "PEngine.kwargs") -> "TEngine":
         conn_args: dict[str, str] = cast("dict[str, str]", kwargs.get("connect_args", {}))
-        conn_args["options"] = f"-c timezone={timezone}"
+        options = [f"-c timezone={timezone}"]
+        if statement_timeout:
+            options.append(f"-c statement_timeout={statement_timeout}")
+        conn_args["options"] = " ".join(options)
+        kwargs["connect_args"] = conn_args
         return func(*args, **kwargs)
 
     return wrapper
 
 
-@cache
-def create_engine() -> "Engine":
-    creator = _create_engine(sqlmodel.create_engine, environ.timezone)
-    return creator(
+# A sync and an asyncio engine per worker process, each with its own pool
+_ENGINES_PER_WORKER = 2
+
+
+def worker_pool(settings: "DatabaseSettings", workers: int) -> "DatabaseSettings":
+    """Pool settings of the engines of a worker, with `max_connections` split
+    evenly between the engines of `workers` processes when it is set"""
+    if not settings.max_connections:
+        return settings
+    share = max(settings.max_connections // (_ENGINES_PER_WORKER * workers), 1)
+    pool_size = max(share * settings.pool_size // (settings.pool_size + settings.max_overflow), 1)
+    return settings.model_copy(update={"pool_size": pool_size, "max_overflow": share - pool_size})
+
+
+def _engine_kwargs(settings: "DatabaseSettings") -> "dict[str, Any]":
+    return {
+        "echo": settings.echo,
+        "pool_size": settings.pool_size,
+        "max_overflow": settings.max_overflow,
+        "pool_timeout": settings.pool_timeout,
+        "pool_recycle": settings.pool_recycle,
+        "pool_pre_ping": settings.pool_pre_ping,
+    }
+
+
+def create_engine(settings: "DatabaseSettings | None" = None) -> "Engine":
+    """Create a new engine with its own connection pool, the engine is owned by
+    the caller, who is responsible of disposing it. Its statements are timed,
+    see `instrument_engine`"""
+    settings = settings or environ.db
+    creator = _create_engine(sqlmodel.create_engine, environ.timezone, settings.statement_timeout)
+    engine = creator(
         url=environ.pg_dsn.encoded_string(),
         future=True,
-        echo=True,
-        pool_size=100,
-        pool_recycle=3600,
-        pool_timeout=30,
+        poolclass=InstrumentedQueuePool,
+        **_engine_kwargs(settings),
+    )
+    instrument_engine(engine, settings.slow_query_ms)
+    return engine
+
+
+def create_async_engine(settings: "DatabaseSettings | None" = None) -> "AsyncEngine":
+    """Engine for the asyncio path, it always uses the async variant of psycopg
+    regardless of the driver configured in the DSN"""
+    settings = settings or environ.db
+    creator = _create_engine(sa_create_async_engine, environ.timezone, settings.statement_timeout)
+    url = make_url(environ.pg_dsn.encoded_string()).set(drivername="postgresql+psycopg")
+    engine = creator(
+        url=url,
+        poolclass=InstrumentedAsyncQueuePool,
+        **_engine_kwargs(settings),
     )
+    instrument_engine(engine.sync_engine, settings.slow_query_ms)
+    return engine
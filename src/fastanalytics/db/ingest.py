@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlmodel import insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import Event
+from ..schemas.stats import IngestStats
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import Callable, Sequence
+    from datetime import datetime
+    from typing import Any
+
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlmodel import Session
+
+# Longest wait before retrying a flush while the database is unavailable
+MAX_FLUSH_BACKOFF = 30.0
+
+
+class BufferFullError(Exception):
+    """The write-behind buffer reached its capacity"""
+
+
+def insert_events(
+    session: "Session", rows: "Sequence[dict[str, Any]]"
+) -> list[tuple[int, "datetime"]]:
+    """Insert many events in the current transaction of the session.
+
+    The statement is sent as multi-row `INSERT ... VALUES (...), (...) RETURNING`
+    batches (SQLAlchemy *insertmanyvalues*), so a batch of N events costs
+    N / page size round trips instead of the N INSERT + N SELECT of the ORM
+    unit of work.
+
+    Args:
+        session (Session): session to execute the statement with, it is not committed
+        rows (Sequence[dict[str, Any]]): column values of each event to insert
+    Return: primary keys `(id, time)` of the inserted rows in the same order of `rows`
+    """
+    if not rows:
+        return []
+    statement = insert(Event).returning(Event.id, Event.time, sort_by_parameter_order=True)
+    result = session.execute(statement, list(rows))
+    return [(row.id, row.time) for row in result]
+
+
+class IngestBuffer:
+    """Bounded in-process queue of events written to the database in bulk.
+
+    `put` is thread safe so it can be called from the handlers running in the
+    event loop or in the threadpool, the flushes happen in a task of the event
+    loop that owns the buffer and are triggered when `flush_size` events are queued or every
+    `flush_interval` seconds, whichever comes first. While the database is
+    unavailable the retries back off exponentially, up to `MAX_FLUSH_BACKOFF` seconds.
+
+    `on_flush` is called with the rows and times of every batch written, so
+    the events are counted in memory once they are in the table.
+    """
+
+    def __init__(
+        self,
+        engine: "AsyncEngine",
+        logger: "logging.Logger",
+        capacity: int,
+        flush_size: int,
+        flush_interval: float,
+        on_flush: "Callable[[Sequence[dict[str, Any]], Sequence[datetime]], None] | None" = None,
+    ) -> None:
+        self._engine = engine
+        self._logger = logger
+        self._capacity = capacity
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._on_flush = on_flush
+        # Failed flushes in a row because the database is unavailable
+        self._failures = 0
+        self._rows: deque[dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._stats = IngestStats(enabled=True, capacity=capacity)
+
+    def put(self, row: "dict[str, Any]") -> None:
+        """Queue the column values of an event to be inserted
+
+        Raise: `BufferFullError` when the buffer is at capacity
+        """
+        with self._lock:
+            if len(self._rows) >= self._capacity:
+                self._stats.rejected += 1
+                raise BufferFullError(f"Ingest buffer is full ({self._capacity} events)")
+            self._rows.append(row)
+            self._stats.accepted += 1
+            depth = len(self._rows)
+        # A flusher backing off is not woken up, it retries once the backoff is over
+        if (
+            depth >= self._flush_size
+            and not self._failures
+            and self._loop is not None
+            and self._wakeup is not None
+        ):
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def stats(self) -> IngestStats:
+        with self._lock:
+            return self._stats.model_copy(update={"depth": len(self._rows)})
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="ingest-buffer-flush")
+
+    async def stop(self) -> None:
+        """Stop the periodic flushes and drain whatever is left in the buffer"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._logger.info("Draining ingest buffer with %d events", len(self._rows))
+        while self._rows:
+            if not await self.flush():
+                self._logger.error("Dropping %d buffered events on shutdown", len(self._rows))
+                break
+
+    async def flush(self) -> bool:
+        """Write up to `flush_size` events, return whether the write succeeded"""
+        with self._lock:
+            batch = [self._rows.popleft() for _ in range(min(self._flush_size, len(self._rows)))]
+        if not batch:
+            return True
+        start = time.perf_counter()
+        try:
+            keys = await self._write(batch)
+        except (OperationalError, PoolTimeoutError) as e_sql:
+            return self._requeue(batch, e_sql)
+        except SQLAlchemyError as e_sql:
+            return self._discard(batch, e_sql)
+        elapsed = time.perf_counter() - start
+        self._failures = 0
+        if self._on_flush is not None:
+            self._on_flush(batch, [time for _, time in keys])
+        with self._lock:
+            self._stats.flushes += 1
+            self._stats.flushed += len(batch)
+            self._stats.last_flush_seconds = elapsed
+            self._stats.max_flush_seconds = max(self._stats.max_flush_seconds, elapsed)
+            self._stats.total_flush_seconds += elapsed
+        self._logger.debug("Flushed %d buffered events in %.4fs", len(batch), elapsed)
+        return True
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            if self._failures:
+                await asyncio.sleep(self._backoff())
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            # Keep flushing while there is a full batch waiting
+            while await self.flush() and len(self._rows) >= self._flush_size:
+                pass
+
+    def _backoff(self) -> float:
+        return min(self._flush_interval * 2 ** (self._failures - 1), MAX_FLUSH_BACKOFF)
+
+    async def _write(self, rows: "list[dict[str, Any]]") -> "list[tuple[int, datetime]]":
+        async with AsyncSession(self._engine) as session:
+            keys = await session.run_sync(insert_events, rows)
+            await session.commit()
+        return keys
+
+    def _requeue(self, batch: "list[dict[str, Any]]", error: SQLAlchemyError) -> bool:
+        # Connection errors are transient, put the events back at the head of
+        # the queue so the next flush retries them and the buffer applies
+        # backpressure to the clients meanwhile
+        self._failures += 1
+        self._logger.warning(
+            "Database unavailable flushing %d events, retrying in %.1fs (%s)",
+            len(batch),
+            self._backoff(),
+            type(error).__name__,
+        )
+        with self._lock:
+            room = max(self._capacity - len(self._rows), 0)
+            self._rows.extendleft(reversed(batch[:room]))
+            self._stats.failed += max(len(batch) - room, 0)
+        return False
+
+    def _discard(self, batch: "list[dict[str, Any]]", error: SQLAlchemyError) -> bool:
+        self._logger.error(
+            "SQL Error flushing %d buffered events, discarding them (%s) (%s)",
+            len(batch),
+            type(error).__name__,
+            error._message(),
+        )
+        with self._lock:
+            self._stats.failed += len(batch)
+        return False
@@ -0,0 +1,166 @@
+"""Timing of the SQL statements executed by the engines
+
+The cursor executions are timed with the `before_cursor_execute` and
+`after_cursor_execute` events of SQLAlchemy and recorded per query shape,
+the statement with its parameters and literals replaced by `?`. The
+statements slower than the threshold of the engine are logged with the
+request ID of the request that executed them.
+"""
+
+import bisect
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import event
+
+from .. import get_logger
+from ..schemas.stats import QueryStats
+from ..utils import request_id
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine, ExceptionContext
+
+# Upper bounds in milliseconds of the buckets of the latency histograms
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Query shapes recorded, the statements of any other shape are recorded under `_OTHER`
+MAX_SHAPES = 512
+_OTHER = "<other>"
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(
+    r"%\(\w+\)s|%s|\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\bTRUE\b|\bFALSE\b", re.IGNORECASE
+)
+# Lists of values of variable length, i.e. IN (?, ?, ?) or VALUES (?, ?), (?, ?)
+_VALUE_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LISTS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+
+@lru_cache(maxsize=1024)
+def normalize(statement: str) -> str:
+    """Shape of a statement, without its literals and parameters"""
+    shape = _LITERALS.sub("?", _WHITESPACE.sub(" ", statement).strip())
+    return _ROW_LISTS.sub("(?)", _VALUE_LISTS.sub("?", shape))
+
+
+class _Histogram:
+    """Latency histogram of a query shape"""
+
+    __slots__ = ("calls", "errors", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        # The last bucket counts the executions slower than the last bound
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms: float, error: bool) -> None:
+        self.calls += 1
+        self.errors += int(error)
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the quantile, at most the maximum"""
+        rank = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], self.max)
+                return self.max
+        return self.max
+
+    def stats(self, statement: str) -> QueryStats:
+        return QueryStats(
+            statement=statement,
+            calls=self.calls,
+            errors=self.errors,
+            total_ms=self.total,
+            mean_ms=self.total / self.calls if self.calls else 0.0,
+            max_ms=self.max,
+            p50_ms=self.quantile(0.5),
+            p95_ms=self.quantile(0.95),
+            p99_ms=self.quantile(0.99),
+            buckets={
+                str(bound): count
+                for bound, count in zip((*LATENCY_BUCKETS_MS, "+Inf"), self.buckets, strict=True)
+            },
+        )
+
+
+class QueryRecorder:
+    """Latency histograms of the statements executed, by query shape"""
+
+    def __init__(self, max_shapes: int = MAX_SHAPES) -> None:
+        self._max_shapes = max_shapes
+        self._shapes: dict[str, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed_ms: float, error: bool = False) -> None:
+        shape = normalize(statement)
+        with self._lock:
+            histogram = self._shapes.get(shape)
+            if histogram is None:
+                if len(self._shapes) >= self._max_shapes:
+                    shape = _OTHER
+                histogram = self._shapes.setdefault(shape, _Histogram())
+            histogram.record(elapsed_ms, error)
+
+    def stats(self, limit: int | None = None) -> list[QueryStats]:
+        """Stats of the query shapes, the ones with the highest total time first"""
+        with self._lock:
+            shapes = sorted(self._shapes.items(), key=lambda item: item[1].total, reverse=True)
+            return [histogram.stats(shape) for shape, histogram in shapes[:limit]]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+
+# Recorder shared by the engines of the process
+query_recorder = QueryRecorder()
+
+
+def instrument_engine(
+    engine: "Engine", slow_query_ms: float, recorder: QueryRecorder = query_recorder
+) -> None:
+    """Time the statements of an engine (the `sync_engine` of an asyncio engine)
+    and log the ones slower than `slow_query_ms`, 0 disables the log"""
+    logger = get_logger()
+
+    def _finish(conn: "Connection", statement: str, error: bool) -> None:
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        recorder.record(statement, elapsed_ms, error)
+        if slow_query_ms and elapsed_ms >= slow_query_ms:
+            logger.warning(
+                "Slow query took %.1f ms",
+                elapsed_ms,
+                extra={
+                    "sql_query": normalize(statement),
+                    "request_id": request_id.get(),
+                    "duration_ms": round(elapsed_ms, 3),
+                },
+            )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn: "Connection", *args: Any) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn: "Connection", cursor: Any, statement: str, *args: Any) -> None:
+        _finish(conn, statement, error=False)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context: "ExceptionContext") -> None:
+        if context.connection is not None and context.statement is not None:
+            _finish(context.connection, context.statement, error=True)
@@ -0,0 +1,97 @@
+"""Live rollup of the events of the latest minutes, kept by the API process
+
+The open bucket of an aggregation changes with every new event, a cache of
+it goes stale and recomputing it scans the newest chunk of the events. The
+process keeps the running count, sum, min and max of the duration of the
+events it ingests per value of `LIVE__FIELDS` and minute, for the current and
+the previous minute, and `GET /events/aggregate/{field}` merges them with
+the groups of the rest of the time range computed by the database, see
+`db.queries.live_start` and `db.queries.merge_live_groups`.
+
+The events of a minute before the process started are not held, the
+rollup only answers from the first whole minute counted. Every process
+holds the events it ingests, only a share of them with several workers: the
+rollup is disabled then.
+"""
+
+import math
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from ..utils import get_utc_now
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Any
+
+# Width of the partials of the rollup, the time ranges answered from it are
+# made of whole minutes
+LIVE_BUCKET = "1 minute"
+_MINUTE = 60
+
+
+def _minute(time: datetime) -> int:
+    seconds = int(time.timestamp())
+    return seconds - seconds % _MINUTE
+
+
+class LiveRollup:
+    """Count, sum, min and max of the duration of the events of the current and
+    previous minutes by value of `fields`. It is safe to use from several threads."""
+
+    def __init__(self, fields: "Sequence[str]") -> None:
+        self.fields = tuple(fields)
+        # Partials `[count, sum, min, max]` by minute (seconds since the
+        # epoch), field and value of the field
+        self._minutes: dict[int, dict[str, dict[Any, list[float]]]] = {}
+        # First minute held whole
+        self._since = math.ceil(get_utc_now().timestamp() / _MINUTE) * _MINUTE
+        self._lock = threading.Lock()
+
+    def add(self, rows: "Sequence[dict[str, Any]]", times: "Sequence[datetime]") -> None:
+        """Add inserted or queued events to the partials of the minute of their time,
+        the events before the previous minute are already in the database"""
+        previous = _minute(get_utc_now()) - _MINUTE
+        with self._lock:
+            for minute in [minute for minute in self._minutes if minute < previous]:
+                del self._minutes[minute]
+            for row, time in zip(rows, times, strict=True):
+                minute = _minute(time)
+                if minute < previous:
+                    continue
+                partials = self._minutes.get(minute)
+                if partials is None:
+                    partials = self._minutes[minute] = {field: {} for field in self.fields}
+                duration = row["duration"]
+                for field in self.fields:
+                    partial = partials[field].get(row[field])
+                    if partial is None:
+                        partials[field][row[field]] = [1, duration, duration, duration]
+                    else:
+                        partial[0] += 1
+                        partial[1] += duration
+                        partial[2] = min(partial[2], duration)
+                        partial[3] = max(partial[3], duration)
+
+    def held_from(self) -> datetime:
+        """Start of the minutes held whole, the previous minute once the process
+        has been up for one"""
+        previous = _minute(get_utc_now()) - _MINUTE
+        return datetime.fromtimestamp(max(previous, self._since), timezone.utc)
+
+    def snapshot(
+        self, field_name: str
+    ) -> "tuple[datetime, list[tuple[datetime, Any, int, float, float, float]]]":
+        """`held_from` and the partials of the minutes held from it as `(minute,
+        value, count, sum, min, max)`, taken together so that a minute moved
+        out of the rollup is always before `held_from`"""
+        with self._lock:
+            held_from = self.held_from()
+            first = int(held_from.timestamp())
+            return held_from, [
+                (datetime.fromtimestamp(minute, timezone.utc), value, int(count), total, low, high)
+                for minute, partials in sorted(self._minutes.items())
+                if minute >= first
+                for value, (count, total, low, high) in partials[field_name].items()
+            ]
@@ -0,0 +1,79 @@
+"""Keyset (cursor) pagination shared by the queries that page over a total order"""
+
+import base64
+from typing import TYPE_CHECKING, TypeVar
+
+from pydantic_core import from_json, to_json
+from sqlalchemy import literal, tuple_
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Any
+
+    from pydantic import TypeAdapter
+    from sqlalchemy.sql import ColumnElement
+
+    from ..schemas.queries import Page
+
+TSelect = TypeVar("TSelect")
+TRow = TypeVar("TRow")
+
+
+def encode_cursor(values: "Sequence[Any]") -> str:
+    """Opaque cursor holding the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(to_json(list(values))).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, keys: "TypeAdapter[Any]") -> "tuple[Any, ...]":
+    """Sort key stored in a cursor validated against the types of the keys
+
+    Raise: `ValueError` when the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return tuple(keys.validate_python(from_json(raw)))
+    except (ValueError, TypeError) as e_val:
+        raise ValueError("Invalid pagination cursor") from e_val
+
+
+def paginate(
+    query: TSelect,
+    keys: "Sequence[ColumnElement[Any]]",
+    page: "Page",
+    key_types: "TypeAdapter[Any]",
+) -> TSelect:
+    """Order the query by `keys` and restrict it to the page requested.
+
+    With a cursor the page starts right after the key stored in it, which
+    lets Postgres seek the index instead of reading and discarding the
+    previous pages. Without a cursor `page.page` is applied as the legacy
+    OFFSET. One extra row is fetched to know whether a next page exists,
+    see `page_rows`.
+
+    Raise: `ValueError` when the cursor is malformed
+    """
+    descending = page.order == "desc"
+    if page.cursor:
+        values = decode_cursor(page.cursor, key_types)
+        if len(values) != len(keys):
+            raise ValueError("Invalid pagination cursor")
+        row = tuple_(*keys)
+        bound = tuple_(*(literal(value, key.type) for value, key in zip(values, keys, strict=True)))
+        query = query.where(row < bound if descending else row > bound)  # type: ignore[attr-defined]
+    elif page.page > 1:
+        query = query.offset((page.page - 1) * page.page_size)  # type: ignore[attr-defined]
+    ordering = [key.desc() if descending else key.asc() for key in keys]
+    return query.order_by(*ordering).limit(page.page_size + 1)  # type: ignore[attr-defined,no-any-return]
+
+
+def page_rows(
+    rows: "Sequence[TRow]", keys: "Sequence[str]", page: "Page"
+) -> "tuple[Sequence[TRow], str | None]":
+    """Drop the extra row fetched by `paginate`
+
+    Return: the rows of the page and the cursor of the next page, `None` on the last page
+    """
+    if len(rows) <= page.page_size:
+        return rows, None
+    rows = rows[: page.page_size]
+    return rows, encode_cursor([getattr(rows[-1], key) for key in keys])
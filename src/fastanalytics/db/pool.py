@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from ..schemas.stats import PoolStats
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlalchemy.pool import ConnectionPoolEntry, PoolProxiedConnection
+
+# Key of the info of a connection with the seconds spent opening it, not yet
+# taken off the wait of a checkout
+_CONNECT_SECONDS = "fastanalytics_connect_seconds"
+
+
+class _CheckoutMetrics:
+    """Counters of the connection checkouts of a pool"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timeout: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timeout)
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+class _InstrumentedPool(QueuePool):
+    """Queue pool that measures how long the checkouts wait for a connection.
+
+    The time spent opening a connection during a checkout (new or overflow
+    connections, reconnections after a recycle or a failed ping) is not a
+    wait for the pool and is left out of it.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = _CheckoutMetrics()
+        creator = self._invoke_creator
+
+        def _timed_creator(record: "ConnectionPoolEntry") -> Any:
+            start = time.perf_counter()
+            try:
+                return creator(record)
+            finally:
+                record.info[_CONNECT_SECONDS] = (
+                    record.info.get(_CONNECT_SECONDS, 0.0) + time.perf_counter() - start
+                )
+
+        self._invoke_creator = _timed_creator
+
+    def connect(self) -> "PoolProxiedConnection":
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, True)
+            raise
+        connect_seconds = connection.info.pop(_CONNECT_SECONDS, 0.0)
+        self.metrics.record(max(time.perf_counter() - start - connect_seconds, 0.0), False)
+        return connection
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            pool_size=self.size(),
+            max_overflow=self._max_overflow,
+            checked_out=self.checkedout(),
+            checked_in=self.checkedin(),
+            # The counter of the pool starts at -pool_size until the pool is full
+            overflow=max(self.overflow(), 0),
+            checkouts=self.metrics.checkouts,
+            timeouts=self.metrics.timeouts,
+            wait_seconds_total=self.metrics.wait_total,
+            wait_seconds_max=self.metrics.wait_max,
+        )
+
+
+class InstrumentedQueuePool(_InstrumentedPool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(engine: "Engine | AsyncEngine") -> PoolStats | None:
+    """Stats of the pool of an engine, `None` when it is not instrumented"""
+    pool = engine.pool
+    if isinstance(pool, _InstrumentedPool):
+        return pool.stats()
+    return None
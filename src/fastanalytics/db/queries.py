@@ -0,0 +1,442 @@
+from collections import namedtuple
+from datetime import datetime
+from functools import cache
+from typing import TYPE_CHECKING
+
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    TEXT,
+    BigInteger,
+    Float,
+    Interval,
+    cast,
+    distinct,
+    literal,
+    literal_column,
+    or_,
+    true,
+)
+from sqlalchemy.dialects.postgresql import INET
+from sqlmodel import DateTime, col, func, select
+
+from ..config import environ
+from ..models import Event
+from .live import LIVE_BUCKET
+from .pagination import decode_cursor, paginate
+from .sketches import PERCENTILES, SKETCH_BUCKET, SKETCH_FUNCTIONS, sketch_columns
+from .timescale.aggregates import find_rollup, rollup_table
+from .timescale.functions import approximate_row_count, time_bucket
+from .timescale.utils import (
+    bucket_start,
+    is_bucket_aligned,
+    is_fixed_interval,
+    is_interval_multiple,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Any
+
+    from sqlalchemy import Row
+    from sqlalchemy.sql import ColumnElement, ReadOnlyColumnCollection, SQLColumnExpression, Select
+    from sqlmodel.sql.expression import SelectOfScalar
+
+    from ..schemas.queries import EventFilters, ExportQuery, Page, PageAggregate
+    from .timescale.schemas import ContinuousAggParams
+
+# Total order of the events used for the keyset pagination
+EVENT_KEYS = ("time", "id")
+_EVENT_KEY_TYPES = TypeAdapter(tuple[datetime, int])
+# Total order of the aggregated groups, the field is compared as text so
+# every field type (and NULL referrers) has a well defined order
+AGGREGATE_KEYS = ("interval", "field_key")
+_AGGREGATE_KEY_TYPES = TypeAdapter(tuple[datetime, str])
+# Column of the aggregated groups labelled with each aggregation function
+AGGREGATE_COLUMNS = {
+    "avg": "avg_duration",
+    "min": "min_duration",
+    "max": "max_duration",
+    "uniques": "uniques",
+    "p50": "p50_duration",
+    "p90": "p90_duration",
+    "p99": "p99_duration",
+}
+# Aggregations merged with the partials of the live rollup, see `merge_live_groups`
+LIVE_FUNCTIONS = frozenset({"avg", "min", "max"})
+
+
+def _in(column: "ColumnElement[Any]", values: "Sequence[Any]") -> "ColumnElement[bool]":
+    return column == values[0] if len(values) == 1 else column.in_(values)
+
+
+def _dimensions(page: "EventFilters") -> "dict[str, Sequence[Any]]":
+    """Values of the dimension filters of the page by the column they apply to"""
+    filters = {
+        "page": page.page_path,
+        "session_id": page.session_id,
+        "referrer": page.referrer,
+        "ip_address": page.ip_address,
+    }
+    return {name: values for name, values in filters.items() if values}
+
+
+def _filters(
+    page: "EventFilters",
+    col_time: "ColumnElement[Any]",
+    columns: "ReadOnlyColumnCollection[str, Any]",
+) -> "list[ColumnElement[bool]]":
+    """Predicates of the filters of the page over a time column and the
+    columns of the dimensions.
+
+    The time range is compared against constants on the partitioning column
+    so TimescaleDB excludes the chunks outside of it, and the equality (IN)
+    on `page` together with the range is served by the `page_time_desc`
+    index. Networks are matched with the INET containment operator `<<=`.
+    """
+    clauses = []
+    if page.start is not None:
+        clauses.append(col_time >= page.start)
+    if page.end is not None:
+        clauses.append(col_time < page.end)
+    for name, values in _dimensions(page).items():
+        if name == "ip_address":
+            clauses.append(
+                or_(*(columns[name].op("<<=")(cast(literal(str(net)), INET)) for net in values))
+            )
+        else:
+            clauses.append(_in(columns[name], values))
+    return clauses
+
+
+def events_filters(page: "EventFilters") -> "list[ColumnElement[bool]]":
+    """Predicates over the raw events of the time range and dimension filters of the page"""
+    return _filters(page, col(Event.time), Event.__table__.c)  # type: ignore[attr-defined]
+
+
+def events_count(page: "Page | None" = None) -> "SelectOfScalar[int]":
+    """Number of events, approximate and cheap to compute on a hypertable
+    unless the page has filters, then the matching events are counted"""
+    filters = events_filters(page) if page is not None else []
+    if not filters:
+        return select(approximate_row_count(Event))
+    return select(func.count()).select_from(Event).where(*filters)
+
+
+def events_page(page: "Page", as_rows: bool = False) -> "SelectOfScalar[Event]":
+    """Page of raw events sorted by their primary key `(time, id)`, the
+    newest first unless `page.order` is ascending. With `as_rows` the
+    columns are selected as plain rows instead of `Event` instances.
+
+    Raise: `ValueError` when the cursor of the page is malformed
+    """
+    keys = (col(Event.time), col(Event.id))
+    query = select(*Event.__table__.columns) if as_rows else select(Event)  # type: ignore[attr-defined]
+    return paginate(query.where(*events_filters(page)), keys, page, _EVENT_KEY_TYPES)
+
+
+def events_export(export: "ExportQuery") -> "Select[Any]":
+    """Columns of the events matching the filters of the export sorted by
+    `(time, id)`, meant to be streamed with a server-side cursor"""
+    keys = (col(Event.time), col(Event.id))
+    ordering = [key.desc() if export.order == "desc" else key.asc() for key in keys]
+    return (
+        select(*Event.__table__.columns)  # type: ignore[attr-defined]
+        .where(*events_filters(export))
+        .order_by(*ordering)
+    )
+
+
+def events_by_id(event_id: int) -> "SelectOfScalar[Event]":
+    return select(Event).where(Event.id == event_id)
+
+
+def events_aggregate(field_name: str, page: "PageAggregate") -> "Select[Any]":
+    """Page of the aggregation of the events duration grouped by `field_name`
+    over buckets of `page.interval`.
+
+    When a continuous aggregate of the events grouped by the same field has
+    a bucket width that evenly divides `page.interval` the groups are
+    computed by re-aggregating its rollups instead of scanning the raw
+    events, the results are the same as both are grouped over the same
+    boundaries. The rollup is skipped when the time range of the page is not
+    aligned to its buckets or the page filters by another dimension.
+
+    The ordering, the page limits and the total number of groups
+    (`total_groups`, a window count over the groups) are computed by the
+    database, so only the rows of the page are sent to the application. A
+    cursor also bounds the time range scanned to the buckets from the
+    cursor onwards, letting TimescaleDB exclude the chunks before it.
+
+    The `uniques` and the percentiles of the duration are answered from the
+    sketches only for the groups of the page, after the page is limited,
+    unless `page.exact` computes them over the raw events.
+
+    Raise: `ValueError` with an unknown aggregation function, an aggregation
+    the sketches cannot answer or a malformed cursor
+    """
+    from_sketches = bool(SKETCH_FUNCTIONS & set(page.func)) and not page.exact
+    if from_sketches:
+        _check_sketches(field_name, page)
+    rollup = _aggregate_rollup(field_name, page)
+    if rollup is None:
+        col_time = col(Event.time)
+        col_field = col(getattr(Event, field_name))
+        col_count = func.count(col_field)
+        col_avg = func.avg(Event.duration)
+        col_min = func.min(Event.duration)
+        col_max = func.max(Event.duration)
+        filters = events_filters(page)
+    else:
+        source = rollup_table(Event, rollup)
+        col_time = source.c.bucket
+        col_field = source.c[field_name]
+        col_count = cast(func.sum(source.c.count), BigInteger)
+        col_avg = func.sum(source.c.sum_duration).op("/", return_type=Float)(
+            func.nullif(func.sum(source.c.count), 0)
+        )
+        col_min = func.min(source.c.min_duration)
+        col_max = func.max(source.c.max_duration)
+        filters = _filters(page, col_time, source.c)
+    bucket_interval = time_bucket(page.interval, col_time).label("interval")
+    field_key = func.coalesce(cast(col_field, TEXT), "").label("field_key")
+    columns: list[SQLColumnExpression[Any]] = [
+        bucket_interval,
+        col_field.label("field"),
+        field_key,
+        col_count.label("count"),
+        func.count().over().label("total_groups"),
+    ]
+    for agg in page.func:
+        if agg == "avg":
+            columns.append(col_avg.label("avg_duration"))
+        elif agg == "min":
+            columns.append(col_min.label("min_duration"))
+        elif agg == "max":
+            columns.append(col_max.label("max_duration"))
+        elif agg in SKETCH_FUNCTIONS:
+            # Exact, otherwise they are joined from the sketches of the page
+            if from_sketches:
+                continue
+            if agg == "uniques":
+                columns.append(func.count(distinct(Event.session_id)).label("uniques"))
+            else:
+                columns.append(
+                    func.percentile_disc(PERCENTILES[agg])
+                    .within_group(Event.duration)
+                    .label(AGGREGATE_COLUMNS[agg])
+                )
+        else:
+            raise ValueError(f"Unknow aggregation function {agg}")
+    query = select(*columns).where(*filters).group_by(bucket_interval, col_field)
+    if page.cursor:
+        cursor_bucket = literal(
+            decode_cursor(page.cursor, _AGGREGATE_KEY_TYPES)[0], DateTime(timezone=True)
+        )
+        if page.order == "desc":
+            width = literal_column(f"INTERVAL '{page.interval}'", Interval())
+            query = query.where(col_time < cursor_bucket + width)
+        else:
+            query = query.where(col_time >= cursor_bucket)
+    query = paginate(
+        query,
+        (time_bucket(page.interval, col_time), func.coalesce(cast(col_field, TEXT), "")),
+        page,
+        _AGGREGATE_KEY_TYPES,
+    )
+    if not from_sketches:
+        return query
+    groups = query.subquery("groups")
+    sketches, sketch_aggs = sketch_columns(field_name, page, groups.c.interval, groups.c.field_key)
+    keys = (groups.c.interval, groups.c.field_key)
+    return (
+        select(groups, *sketch_aggs)
+        .select_from(groups.outerjoin(sketches, true()))
+        .order_by(*(key.desc() if page.order == "desc" else key.asc() for key in keys))
+    )
+
+
+def events_open_bucket(interval: str) -> "SelectOfScalar[datetime | None]":
+    """Start of the bucket of `interval` holding the latest event, the buckets
+    before it are closed and their aggregates no longer change"""
+    return select(time_bucket(interval, func.max(Event.time)))
+
+
+def aggregate_parts(
+    page: "PageAggregate", open_from: "datetime | None"
+) -> "list[tuple[PageAggregate, bool]]":
+    """Split the time range of an aggregation at the start of the open bucket
+
+    Return: the pages of the closed and the open part of the range (in
+    ascending order of time) with whether the part is closed, a part outside
+    of the range of the page is omitted
+    """
+    if open_from is None:
+        return [(page, False)]
+    parts = []
+    if page.start is None or page.start < open_from:
+        end = open_from if page.end is None else min(page.end, open_from)
+        parts.append((page.model_copy(update={"end": end}), True))
+    if page.end is None or page.end > open_from:
+        start = open_from if page.start is None else max(page.start, open_from)
+        parts.append((page.model_copy(update={"start": start}), False))
+    return parts
+
+
+def _aggregate_rollup(field_name: str, page: "PageAggregate") -> "ContinuousAggParams | None":
+    """Rollup that can compute the aggregation of the page, its buckets must
+    compose the interval and the time range, and it must have the columns of
+    the dimension filters. The exact aggregations of the sketches are only
+    computed over the raw events"""
+    if not set(_dimensions(page)) <= {field_name} or (
+        page.exact and SKETCH_FUNCTIONS & set(page.func)
+    ):
+        return None
+    return find_rollup(Event, field_name, page.interval, (page.start, page.end))
+
+
+def _check_sketches(field_name: str, page: "PageAggregate") -> None:
+    """Raise `ValueError` when the sketches cannot answer the aggregations of the
+    page, their buckets must compose the interval and the time range, and
+    they are not split by any other dimension"""
+    aggs = ", ".join(agg for agg in page.func if agg in SKETCH_FUNCTIONS)
+    if field_name not in environ.sketches.fields:
+        raise ValueError(
+            f"The events are not sketched by {field_name}, compute {aggs} "
+            "with `exact` over a time range of at most a day"
+        )
+    if not is_interval_multiple(page.interval, SKETCH_BUCKET):
+        raise ValueError(f"The interval of {aggs} must be a multiple of {SKETCH_BUCKET}")
+    if any(
+        bound is not None and not is_bucket_aligned(bound, SKETCH_BUCKET)
+        for bound in (page.start, page.end)
+    ):
+        raise ValueError(f"The time range of {aggs} must be aligned to {SKETCH_BUCKET}")
+    if not set(_dimensions(page)) <= {field_name}:
+        raise ValueError(f"The {aggs} can only be filtered by the aggregated field")
+
+
+def live_start(field_name: str, page: "PageAggregate", held_from: datetime) -> datetime | None:
+    """Start of the part of the time range of the page answered by the live
+    rollup, held from `held_from`, `None` when the rollup cannot answer it.
+
+    The partials of the rollup are minutes of the aggregated field, they
+    compose buckets of a fixed interval of whole minutes, a range aligned to
+    the minute and the filters of the aggregated field only. The legacy
+    OFFSET pages are not merged as the groups added shift the offset.
+    """
+    if (
+        not set(page.func) <= LIVE_FUNCTIONS
+        or not set(_dimensions(page)) <= {field_name}
+        or not is_fixed_interval(page.interval)
+        or not is_interval_multiple(page.interval, LIVE_BUCKET)
+        or (page.page > 1 and not page.cursor)
+        or any(
+            bound is not None and not is_bucket_aligned(bound, LIVE_BUCKET)
+            for bound in (page.start, page.end)
+        )
+    ):
+        return None
+    start = held_from if page.start is None else max(page.start, held_from)
+    if page.end is not None and page.end <= start:
+        return None
+    return start
+
+
+@cache
+def _group_type(fields: "tuple[str, ...]") -> type:
+    return namedtuple("AggregateGroup", fields)  # type: ignore[misc]
+
+
+def merge_live_groups(
+    field_name: str,
+    rows: "Sequence[Row[Any]]",
+    total_groups: int,
+    partials: "Sequence[tuple[datetime, Any, int, float, float, float]]",
+    page: "PageAggregate",
+) -> "tuple[list[Any], int]":
+    """Merge the partials of the live rollup into the groups of a page computed
+    by the database up to the start of the live part, `live_start`
+
+    The partials are added to the groups of their bucket and value, and the
+    ones without a group become new groups, ordered within the page. A new
+    group that sorts after the rows of the page belongs to a later page, and
+    one before the cursor to a previous page.
+
+    Return: the rows of the page, with the extra row of `paginate`, and the
+    number of groups counting the new groups of the page
+    """
+    values_filter = _dimensions(page).get(field_name)
+    groups: dict[tuple[datetime, str], list[Any]] = {}
+    for minute, value, count, total, low, high in partials:
+        if values_filter is not None and value not in values_filter:
+            continue
+        key = (bucket_start(minute, page.interval), "" if value is None else str(value))
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [value, count, total, low, high]
+        else:
+            group[1] += count
+            group[2] += total
+            group[3] = min(group[3], low)
+            group[4] = max(group[4], high)
+    if not groups:
+        return list(rows), total_groups
+    fields = (
+        rows[0]._fields
+        if rows
+        else (
+            "interval",
+            "field",
+            "field_key",
+            "count",
+            "total_groups",
+            *(AGGREGATE_COLUMNS[agg] for agg in page.func),
+        )
+    )
+    group_type = _group_type(tuple(fields))
+    merged: list[Any] = []
+    for row in rows:
+        group = groups.pop((row.interval, row.field_key), None)
+        if group is None:
+            merged.append(row)
+            continue
+        values = row._asdict()
+        _, count, total, low, high = group
+        if "avg_duration" in values:
+            # The average of the database is over `count` events, the field is not NULL
+            values["avg_duration"] = (values["avg_duration"] * values["count"] + total) / (
+                values["count"] + count
+            )
+        if "min_duration" in values:
+            values["min_duration"] = min(values["min_duration"], low)
+        if "max_duration" in values:
+            values["max_duration"] = max(values["max_duration"], high)
+        values["count"] += count
+        merged.append(group_type(**values))
+    descending = page.order == "desc"
+    if page.cursor:
+        bound = decode_cursor(page.cursor, _AGGREGATE_KEY_TYPES)
+        groups = {
+            key: group
+            for key, group in groups.items()
+            if (key < bound if descending else key > bound)
+        }
+    new_groups = []
+    for (interval, field_key), (value, count, total, low, high) in groups.items():
+        values = {
+            "interval": interval,
+            "field": value,
+            "field_key": field_key,
+            "count": count,
+            "total_groups": total_groups,
+            "avg_duration": total / count,
+            "min_duration": low,
+            "max_duration": high,
+        }
+        new_groups.append(group_type(**{name: values.get(name) for name in fields}))
+    merged.extend(new_groups)
+    merged.sort(key=lambda row: (row.interval, row.field_key), reverse=descending)
+    merged = merged[: page.page_size + 1]
+    # The new groups of the later pages are not known, only the ones of this page are counted
+    added = sum((row.interval, row.field_key) in groups for row in merged)
+    return merged, total_groups + added
@@ -0,0 +1,345 @@
+"""Sketches of the unique sessions and of the durations of the events per hour
+
+The sketches are kept in the `event_sketches` hypertable, a row per bucket
+of `SKETCH_BUCKET`, field and value of the field. The events inserted by a
+process are sketched in memory by a `SketchBuffer` and merged into the
+stored sketches by an upsert every `SKETCHES__FLUSH_INTERVAL` seconds, a
+row per bucket and value written by the interval instead of per event. A coarser
+interval is answered by merging the sketches of its buckets in the
+database, only the merged sketches of each group of a page are sent to the
+application to be estimated.
+
+- The unique sessions are a `HyperLogLog` (`sketches.hll`), stored as a
+  `BIT` string whose union is the bitwise OR, `|` and `bit_or`. A sparse
+  sketch is sent as the positions of its bits, set by the
+  `sparse_sessions` function, and its mostly empty registers are
+  compressed by the TOAST of Postgres.
+- The durations are a `DDSketch` (`sketches.ddsketch`), stored as a JSONB
+  object of the counts by bin whose union adds the counts, the
+  `merge_bins` function and `sum_bins` aggregate created on startup.
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Integer, Interval, bindparam, literal_column, text, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.types import TypeDecorator
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import SCHEMA, EventSketch
+from ..models.sketches import SketchBits
+from ..sketches import DDSketch, HyperLogLog
+from ..sketches.ddsketch import bin_index, quantile
+from ..sketches.hll import SIZE, estimate
+from .timescale.utils import interval_seconds
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import Sequence
+    from typing import Any
+
+    from sqlalchemy import Connection
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlalchemy.sql import ColumnElement, FromClause
+    from sqlmodel import Session
+
+    from ..schemas.queries import PageAggregate
+
+# Width of the buckets of the sketches, the intervals answered from the
+# sketches are made of them
+SKETCH_BUCKET = "1 hour"
+# Aggregation functions answered from the sketches, the percentiles of the duration
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+SKETCH_FUNCTIONS = frozenset({"uniques", *PERCENTILES})
+
+_BUCKET_SECONDS = interval_seconds(SKETCH_BUCKET)
+_TABLE = EventSketch.__table__  # type: ignore[attr-defined]
+
+# Union of the bins of two duration sketches, and its aggregate
+MERGE_BINS_FUNCTION = text(f"""
+CREATE OR REPLACE FUNCTION {SCHEMA}.merge_bins(a JSONB, b JSONB) RETURNS JSONB
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+SELECT coalesce(jsonb_object_agg(key, count), '{{}}'::JSONB)
+FROM (
+    SELECT key, sum(value::BIGINT) AS count
+    FROM (SELECT * FROM jsonb_each_text(a) UNION ALL SELECT * FROM jsonb_each_text(b)) AS bins
+    GROUP BY key
+) AS merged
+$$;
+""")
+# Registers of a sparse session sketch from the positions of its bits
+SPARSE_SESSIONS_FUNCTION = text(f"""
+CREATE OR REPLACE FUNCTION {SCHEMA}.sparse_sessions(positions INTEGER[]) RETURNS BIT({SIZE * 8})
+LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+DECLARE
+    registers BIT({SIZE * 8}) := B'0'::BIT({SIZE * 8});
+    bit_position INTEGER;
+BEGIN
+    FOREACH bit_position IN ARRAY positions LOOP
+        registers := set_bit(registers, bit_position, 1);
+    END LOOP;
+    RETURN registers;
+END
+$$;
+""")
+SUM_BINS_AGGREGATE = text(f"""
+CREATE OR REPLACE AGGREGATE {SCHEMA}.sum_bins(JSONB) (
+    SFUNC = {SCHEMA}.merge_bins,
+    STYPE = JSONB,
+    COMBINEFUNC = {SCHEMA}.merge_bins,
+    INITCOND = '{{}}',
+    PARALLEL = SAFE
+);
+""")
+
+
+class SketchEstimate(TypeDecorator):  # type: ignore[type-arg]
+    """Registers of a `HyperLogLog` read as the estimated number of distinct values"""
+
+    impl = SketchBits.impl
+    cache_ok = True
+
+    def process_result_value(self, value: str | None, dialect: "Any") -> int | None:
+        return None if value is None else estimate(int(value, 2).to_bytes(SIZE, "big"))
+
+
+class SketchQuantile(TypeDecorator):  # type: ignore[type-arg]
+    """Bins of a `DDSketch` read as one of its quantiles"""
+
+    impl = JSONB
+    cache_ok = True
+
+    def __init__(self, q: float) -> None:
+        super().__init__()
+        self.q = q
+
+    def process_result_value(self, value: "Any", dialect: "Any") -> float | None:
+        if not value:
+            return None
+        return quantile({int(index): count for index, count in value.items()}, self.q)
+
+
+def create_sketch_functions(conn: "Connection") -> None:
+    """Create the functions merging the sketches in the database"""
+    conn.execute(MERGE_BINS_FUNCTION)
+    conn.execute(SUM_BINS_AGGREGATE)
+    conn.execute(SPARSE_SESSIONS_FUNCTION)
+
+
+def sketch_value(value: "Any") -> str:
+    """Key of the value of a field in the sketches, as `field_key` of the aggregates"""
+    return "" if value is None else str(value)
+
+
+def sketch_bucket(time: datetime) -> datetime:
+    """Start of the bucket of the sketches holding `time`"""
+    seconds = time.timestamp()
+    return datetime.fromtimestamp(seconds - seconds % _BUCKET_SECONDS, timezone.utc)
+
+
+def add_sketches(
+    sketches: "dict[tuple[str, str, datetime], tuple[HyperLogLog, DDSketch]]",
+    rows: "Sequence[dict[str, Any]]",
+    times: "Sequence[datetime]",
+    fields: "Sequence[str]",
+) -> None:
+    """Add the sessions and durations of events to their sketches by field,
+    value and bucket, a sketch is created for its first events"""
+    for row, time in zip(rows, times, strict=True):
+        bucket = sketch_bucket(time)
+        session_id = str(row["session_id"])
+        duration = bin_index(row["duration"])
+        for field in fields:
+            key = (field, sketch_value(row[field]), bucket)
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = (HyperLogLog(), DDSketch())
+            sketch[0].add(session_id)
+            sketch[1].bins[duration] = sketch[1].bins.get(duration, 0) + 1
+
+
+def sketch_rows(
+    sketches: "dict[tuple[str, str, datetime], tuple[HyperLogLog, DDSketch]]",
+) -> "list[dict[str, Any]]":
+    """Rows of `event_sketches` of the sketches by field, value and bucket,
+    sorted by their unique key so that concurrent upserts lock the rows in
+    the same order. The registers of a sparse session sketch are sent as
+    the `positions` of their bits"""
+    rows = []
+    for (field, value, bucket), (sessions, durations) in sorted(sketches.items()):
+        positions = sessions.positions()
+        rows.append(
+            {
+                "field": field,
+                "value": value,
+                "time": bucket,
+                "positions": positions,
+                "registers": None if positions is not None else sessions.to_bytes(),
+                "durations": {str(index): count for index, count in durations.bins.items()},
+            }
+        )
+    return rows
+
+
+def write_sketches(
+    session: "Session", rows: "Sequence[dict[str, Any]]", replace: bool = False
+) -> None:
+    """Merge the rows of `sketch_rows` into the stored sketches in the current
+    transaction of the session, it is not committed. With `replace` they
+    overwrite the stored sketches instead, the rows of a whole bucket"""
+    sessions = func.coalesce(
+        bindparam("registers", type_=_TABLE.c.sessions.type),
+        getattr(func, SCHEMA).sparse_sessions(
+            bindparam("positions", type_=ARRAY(Integer)), type_=_TABLE.c.sessions.type
+        ),
+    )
+    statement = insert(_TABLE).values(sessions=sessions)
+    if replace:
+        statement = statement.on_conflict_do_update(
+            index_elements=[_TABLE.c.field, _TABLE.c.value, _TABLE.c.time],
+            set_={
+                "sessions": statement.excluded.sessions,
+                "durations": statement.excluded.durations,
+            },
+        )
+        session.execute(statement, rows)
+        return
+    statement = statement.on_conflict_do_update(
+        index_elements=[_TABLE.c.field, _TABLE.c.value, _TABLE.c.time],
+        set_={
+            "sessions": _TABLE.c.sessions.op("|")(statement.excluded.sessions),
+            "durations": getattr(func, SCHEMA).merge_bins(
+                _TABLE.c.durations, statement.excluded.durations, type_=JSONB
+            ),
+        },
+    )
+    session.execute(statement, rows)
+
+
+class SketchBuffer:
+    """Sketches of the events inserted by this process, not yet merged into
+    the stored ones.
+
+    `add` is thread safe so it can be called from the handlers running in the
+    event loop or in the threadpool, the sketches are written every
+    `flush_interval` seconds by a task of the event loop that owns the
+    buffer. The sketches of a failed write are kept and merged with the next one.
+    """
+
+    def __init__(
+        self,
+        engine: "AsyncEngine",
+        logger: "logging.Logger",
+        fields: "Sequence[str]",
+        flush_interval: float,
+    ) -> None:
+        self._engine = engine
+        self._logger = logger
+        self.fields = tuple(fields)
+        self._flush_interval = flush_interval
+        self._sketches: dict[tuple[str, str, datetime], tuple[HyperLogLog, DDSketch]] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    def add(self, rows: "Sequence[dict[str, Any]]", times: "Sequence[datetime]") -> None:
+        """Sketch inserted events, written by the next flush"""
+        with self._lock:
+            add_sketches(self._sketches, rows, times, self.fields)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="sketches-flush")
+
+    async def stop(self) -> None:
+        """Stop the periodic writes and write the sketches left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """Merge the sketches added since the last write into the stored ones.
+        Return whether the write succeeded"""
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+        if not sketches:
+            return True
+        rows = sketch_rows(sketches)
+        try:
+            async with AsyncSession(self._engine) as session:
+                await session.run_sync(write_sketches, rows)
+                await session.commit()
+        except SQLAlchemyError as e_sql:
+            self._logger.warning(
+                "SQL Error writing %d sketches, retrying later (%s)",
+                len(rows),
+                type(e_sql).__name__,
+            )
+            with self._lock:
+                for key, (sessions, durations) in self._sketches.items():
+                    sketch = sketches.get(key)
+                    if sketch is None:
+                        sketches[key] = (sessions, durations)
+                    else:
+                        sketch[0].update(sessions)
+                        sketch[1].update(durations)
+                self._sketches = sketches
+            return False
+        self._logger.debug("Wrote %d sketches", len(rows))
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+
+def sketch_columns(
+    field_name: str,
+    page: "PageAggregate",
+    bucket: "ColumnElement[datetime]",
+    field_key: "ColumnElement[str]",
+) -> "tuple[FromClause, list[ColumnElement[Any]]]":
+    """Aggregations of `page.func` answered from the sketches of a group of an
+    aggregation, the sketches of the buckets of `field_key` between `bucket`
+    and `bucket + interval` merged by the database.
+
+    Return: the LATERAL subquery merging the sketches of the group, to be
+    joined with the groups, and the labelled columns of the aggregations
+    """
+    width = literal_column(f"INTERVAL '{page.interval}'", Interval())
+    clauses = [
+        _TABLE.c.field == field_name,
+        _TABLE.c.value == field_key,
+        _TABLE.c.time >= bucket,
+        _TABLE.c.time < bucket + width,
+    ]
+    if page.start is not None:
+        clauses.append(_TABLE.c.time >= page.start)
+    if page.end is not None:
+        clauses.append(_TABLE.c.time < page.end)
+    merged = []
+    if "uniques" in page.func:
+        merged.append(func.bit_or(_TABLE.c.sessions).label("sessions"))
+    if set(page.func) & set(PERCENTILES):
+        merged.append(getattr(func, SCHEMA).sum_bins(_TABLE.c.durations).label("durations"))
+    sketches = select(*merged).where(*clauses).lateral("sketches")
+    columns: list[ColumnElement[Any]] = []
+    for agg in page.func:
+        if agg == "uniques":
+            columns.append(type_coerce(sketches.c.sessions, SketchEstimate()).label("uniques"))
+        elif agg in PERCENTILES:
+            columns.append(
+                type_coerce(sketches.c.durations, SketchQuantile(PERCENTILES[agg])).label(
+                    f"{agg}_duration"
+                )
+            )
+    return sketches, columns
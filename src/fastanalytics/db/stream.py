@@ -0,0 +1,157 @@
+"""Fan-out of the live aggregate updates of `GET /events/stream`
+
+Every distinct subscription (field, interval and aggregations) has a single
+producer task that recomputes the groups of the open bucket every
+`STREAM__INTERVAL` seconds and sends the groups that changed to the bounded
+queue of each client of the subscription, so the load of the database
+depends on the number of distinct subscriptions and not on the number of
+clients. A client whose queue is full is dropped instead of holding back the
+others, it reconnects and starts again from a snapshot.
+"""
+
+import asyncio
+from typing import TYPE_CHECKING
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..schemas import StreamStats
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import Awaitable, Callable, Hashable
+    from typing import Any
+
+    # Groups of the open bucket by their key
+    Groups = dict[Hashable, dict[str, Any]]
+    # Event name and groups sent to a client, `None` ends its stream
+    Message = tuple[str, list[dict[str, Any]]] | None
+
+
+class Subscription:
+    """Bounded queue of the messages of a client"""
+
+    __slots__ = ("queue",)
+
+    def __init__(self, size: int) -> None:
+        self.queue: asyncio.Queue[Message] = asyncio.Queue(size)
+
+    def close(self) -> None:
+        """End the stream of the client, dropping the messages it did not read"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class _Producer:
+    __slots__ = ("fetch", "subscriptions", "groups", "task")
+
+    def __init__(self, fetch: "Callable[[], Awaitable[Groups]]") -> None:
+        self.fetch = fetch
+        self.subscriptions: set[Subscription] = set()
+        # Latest groups fetched, `None` until the first fetch
+        self.groups: Groups | None = None
+        self.task: asyncio.Task[None] | None = None
+
+
+class StreamHub:
+    """Producers of the live aggregate updates by subscription key, to be used
+    from the event loop that owns them"""
+
+    def __init__(
+        self, logger: "logging.Logger", interval: float, queue_size: int, keepalive: float
+    ) -> None:
+        self._logger = logger
+        self._interval = interval
+        self._queue_size = queue_size
+        # Seconds without a message before the clients get a comment, so the
+        # proxies do not close an idle stream
+        self.keepalive = keepalive
+        self._producers: dict[Hashable, _Producer] = {}
+        self._published = 0
+        self._dropped = 0
+
+    def subscribe(self, key: "Hashable", fetch: "Callable[[], Awaitable[Groups]]") -> Subscription:
+        """Subscribe a client to the updates of `key`, starting its producer
+        with `fetch` for the first client. The client gets a snapshot of the
+        groups first, as soon as they are fetched"""
+        producer = self._producers.get(key)
+        if producer is None:
+            producer = self._producers[key] = _Producer(fetch)
+            producer.task = asyncio.create_task(self._run(producer), name=f"stream-{key}")
+        subscription = Subscription(self._queue_size)
+        if producer.groups is not None:
+            subscription.queue.put_nowait(("snapshot", list(producer.groups.values())))
+        producer.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, key: "Hashable", subscription: Subscription) -> None:
+        """Remove a client, the producer stops with its last client"""
+        producer = self._producers.get(key)
+        if producer is None:
+            return
+        producer.subscriptions.discard(subscription)
+        if not producer.subscriptions:
+            del self._producers[key]
+            if producer.task is not None:
+                producer.task.cancel()
+
+    def stats(self) -> StreamStats:
+        return StreamStats(
+            producers=len(self._producers),
+            subscribers=sum(len(producer.subscriptions) for producer in self._producers.values()),
+            published=self._published,
+            dropped=self._dropped,
+        )
+
+    async def stop(self) -> None:
+        """Stop every producer and end the streams of their clients"""
+        producers = list(self._producers.values())
+        self._producers.clear()
+        for producer in producers:
+            for subscription in producer.subscriptions:
+                subscription.close()
+            if producer.task is not None:
+                producer.task.cancel()
+        await asyncio.gather(
+            *(producer.task for producer in producers if producer.task is not None),
+            return_exceptions=True,
+        )
+
+    async def _run(self, producer: _Producer) -> None:
+        while True:
+            # The clients keep the latest groups until the next fetch, the
+            # producer must outlive any error or its clients only get keepalives
+            try:
+                groups = await producer.fetch()
+                if producer.groups is None:
+                    self._publish(producer, "snapshot", list(groups.values()))
+                else:
+                    changed = [
+                        group for key, group in groups.items() if producer.groups.get(key) != group
+                    ]
+                    if changed:
+                        self._publish(producer, "update", changed)
+                producer.groups = groups
+            except SQLAlchemyError as e_sql:
+                self._logger.warning(
+                    "SQL Error fetching the groups of a stream (%s) (%s)",
+                    type(e_sql).__name__,
+                    e_sql._message(),
+                )
+            except Exception:
+                self._logger.exception("Unexpected error producing the groups of a stream")
+            await asyncio.sleep(self._interval)
+
+    def _publish(self, producer: _Producer, event: str, groups: "list[dict[str, Any]]") -> None:
+        for subscription in list(producer.subscriptions):
+            try:
+                subscription.queue.put_nowait((event, groups))
+            except asyncio.QueueFull:
+                self._logger.warning(
+                    "Dropping a stream client, %d updates behind", self._queue_size
+                )
+                producer.subscriptions.discard(subscription)
+                subscription.close()
+                self._dropped += 1
+            else:
+                self._published += 1
@@ -0,0 +1,130 @@
+from functools import cache
+from typing import TYPE_CHECKING
+
+from sqlalchemy import BigInteger, Float, TableClause, column, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import DateTime
+
+from ...models import BaseTable
+from . import statements as sql
+from .schemas import ContinuousAggParams, ContinuousAggSchema
+from .utils import (
+    continuous_aggregate_sql,
+    extract_model_cagg_params,
+    interval_seconds,
+    is_bucket_aligned,
+    is_interval_multiple,
+)
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import Sequence
+    from datetime import datetime
+
+
+def sync_continuous_aggregates(logger: "logging.Logger", conn: Connection) -> None:
+    """Synchronize the continuous aggregates declared by the models with the database.
+
+    Missing aggregates are created and refreshed once over the existing data,
+    the refresh policy of every declared aggregate is (re)applied so the
+    rollups are kept up to date by TimescaleDB background jobs.
+
+    The connection must be in autocommit mode, a continuous aggregate cannot be
+    refreshed inside a transaction block.
+    """
+    declared = [
+        params
+        for model in BaseTable.__subclasses__()
+        if getattr(model, "__table__", None) is not None
+        for params in model_continuous_aggregates(model)
+    ]
+    logger.debug("Found %d continuous aggregates declared by the models", len(declared))
+    if not declared:
+        return
+    current_views = {f"{view.view_schema}.{view.view_name}" for view in continuous_aggregates(conn)}
+    for params in declared:
+        try:
+            if params.view_name not in current_views:
+                logger.info("Creating continuous aggregate %s", params.view_name)
+                create_continuous_aggregate(conn, params)
+            logger.debug("Applying refresh policy for continuous aggregate %s", params.view_name)
+            conn.execute(
+                sql.ADD_CONTINUOUS_AGGREGATE_POLICY,
+                params.model_dump(
+                    include={"view_name", "start_offset", "end_offset", "schedule_interval"}
+                ),
+            )
+        except SQLAlchemyError as e_sql:
+            logger.error(
+                "Could not sync continuous aggregate %s (%s) (%s) (%s)",
+                params.view_name,
+                type(e_sql).__name__,
+                e_sql.code,
+                e_sql._message(),
+            )
+            raise e_sql
+
+
+def create_continuous_aggregate(conn: Connection, params: ContinuousAggParams) -> None:
+    """Create a continuous aggregate and materialize the existing data of the hypertable"""
+    conn.execute(text(continuous_aggregate_sql(params)))
+    conn.execute(sql.REFRESH_CONTINUOUS_AGGREGATE, {"view_name": params.view_name})
+
+
+def continuous_aggregates(conn: Connection) -> list[ContinuousAggSchema]:
+    """Fetch all the continuous aggregates in the database"""
+    return [
+        ContinuousAggSchema.model_validate(view._asdict())
+        for view in conn.execute(sql.AVAILABLE_CONTINUOUS_AGGREGATES).all()
+    ]
+
+
+@cache
+def model_continuous_aggregates(model: type[BaseTable]) -> tuple[ContinuousAggParams, ...]:
+    """Continuous aggregates declared by a model, the widest bucket first"""
+    return tuple(
+        sorted(
+            extract_model_cagg_params(model),
+            key=lambda params: interval_seconds(params.bucket_width),
+            reverse=True,
+        )
+    )
+
+
+def find_rollup(
+    model: type[BaseTable],
+    group_by: str,
+    interval: str,
+    bounds: "Sequence[datetime | None]" = (),
+) -> ContinuousAggParams | None:
+    """The widest continuous aggregate of the model grouped by `group_by` whose
+    buckets evenly compose buckets of `interval` and start at every time of
+    `bounds`, so the aggregation can be computed from the rollup instead of
+    the raw rows of the hypertable"""
+    for params in model_continuous_aggregates(model):
+        if (
+            params.group_by == group_by
+            and is_interval_multiple(interval, params.bucket_width)
+            and all(
+                bound is None or is_bucket_aligned(bound, params.bucket_width) for bound in bounds
+            )
+        ):
+            return params
+    return None
+
+
+def rollup_table(model: type[BaseTable], params: ContinuousAggParams) -> TableClause:
+    """Lightweight table construct of a continuous aggregate to build queries on"""
+    schema, name = params.view_name.rsplit(".", 1)
+    measure = params.measure
+    return table(
+        name,
+        column("bucket", DateTime(timezone=True)),
+        column(params.group_by, model.__table__.c[params.group_by].type),  # type: ignore[attr-defined]
+        column("count", BigInteger),
+        column(f"sum_{measure}", Float),
+        column(f"min_{measure}", Float),
+        column(f"max_{measure}", Float),
+        schema=schema,
+    )
@@ -2,7 +2,7 @@
 from typing import TYPE_CHECKING
 
 import pytz
-from sqlmodel import func, text
+from sqlmodel import DateTime, func, text
 
 from .utils import orm_table_name
 
@@ -40,4 +40,4 @@ def time_bucket(
         args.append(origin)
     if offset:
         args.append(text(f"'{offset}'::INTERVAL"))
-    return func.time_bucket(*args)
+    return func.time_bucket(*args, type_=DateTime(timezone=True))
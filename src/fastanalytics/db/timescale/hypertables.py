@@ -7,14 +7,24 @@ from sqlalchemy.exc import SQLAlchemyError
 from ...models import BaseTable
 from . import statements as sql
 from .schemas import HyperTableSchema
-from .utils import extract_model_hyper_params, hypertable_sql
+from .utils import (
+    compression_sql,
+    extract_model_hyper_params,
+    extract_model_policy_params,
+    hypertable_sql,
+)
 
 if TYPE_CHECKING:
     import logging
+    from collections.abc import Mapping
 
 
-def sync_hypertables(logger: "logging.Logger", conn: Connection) -> None:
-    """Synchronize all tables associated with a model to be an hypertable in the database"""
+def sync_hypertables(
+    logger: "logging.Logger", conn: Connection, retention: "Mapping[str, str] | None" = None
+) -> None:
+    """Synchronize all tables associated with a model to be an hypertable in the database,
+    along with the compression and retention policies declared by the model and
+    the retention of its table in `retention`"""
     models = [
         model
         for model in BaseTable.__subclasses__()
@@ -22,16 +32,16 @@ def sync_hypertables(logger: "logging.Logger", conn: Connection) -> None:
     ]
     logger.debug("Found %d models to check for hypertables", len(models))
     current_tables = {table.hypertable_name for table in hypertables(conn)}
-    models = [
+    new_models = [
         model for model in models if getattr(model, "__tablename__", None) not in current_tables
     ]
-    if not models:
+    if not new_models:
         logger.debug("No new models to create hypertables for")
-        return
-    logger.info(
-        'Creating hypertables for models "%s"', ",".join(model.__name__ for model in models)
-    )
-    for model in models:
+    else:
+        logger.info(
+            'Creating hypertables for models "%s"', ",".join(model.__name__ for model in new_models)
+        )
+    for model in new_models:
         logger.debug("Creating hypertable for model %s", model.__name__)
         try:
             create_hypertable(conn, model)
@@ -44,6 +54,59 @@ def sync_hypertables(logger: "logging.Logger", conn: Connection) -> None:
                 e_sql._message(),
             )
             raise e_sql
+    if not models:
+        return
+    tables = {table.hypertable_name: table for table in hypertables(conn)}
+    for model in models:
+        try:
+            apply_policies(logger, conn, model, tables.get(model.__tablename__), retention)
+        except SQLAlchemyError as e_sql:
+            logger.error(
+                "Could not apply policies for model %s (%s) (%s) (%s)",
+                model.__name__,
+                type(e_sql).__name__,
+                e_sql.code,
+                e_sql._message(),
+            )
+            raise e_sql
+
+
+def apply_policies(
+    logger: "logging.Logger",
+    conn: Connection,
+    model: type[BaseTable],
+    table: HyperTableSchema | None,
+    retention: "Mapping[str, str] | None" = None,
+) -> None:
+    """Apply the compression and retention settings of a model to its hypertable.
+
+    It is idempotent, the compression is only enabled when the hypertable does
+    not have it yet and the policies are only added when missing. A policy that
+    already exists is not modified, a change in the model settings requires
+    removing the policy in the database first.
+    """
+    params = extract_model_policy_params(model, retention)
+    if params.compression:
+        if table is None or not table.compression_enabled:
+            logger.info("Enabling compression for model %s", model.__name__)
+            conn.execute(text(compression_sql(params)))
+        if table is None or table.compress_after is None:
+            logger.info(
+                "Adding compression policy after %s for model %s",
+                params.compress_after,
+                model.__name__,
+            )
+            conn.execute(
+                sql.ADD_COMPRESSION_POLICY,
+                params.model_dump(include={"table_name", "compress_after"}),
+            )
+    if params.drop_after is not None and (table is None or table.drop_after is None):
+        logger.info(
+            "Adding retention policy after %s for model %s", params.drop_after, model.__name__
+        )
+        conn.execute(
+            sql.ADD_RETENTION_POLICY, params.model_dump(include={"table_name", "drop_after"})
+        )
 
 
 def create_hypertable(conn: Connection, model: type[BaseTable]) -> None:
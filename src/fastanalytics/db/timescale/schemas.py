@@ -14,6 +14,49 @@ class HyperParams(BaseModel):
     migrate_data: bool
 
 
+class PolicyParams(BaseModel):
+    """Compression and retention settings declared by a model"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    table_name: str
+    segmentby: str | None
+    orderby: str | None
+    compress_after: str | None
+    drop_after: str | None
+
+    @property
+    def compression(self) -> bool:
+        return self.compress_after is not None
+
+
+class ContinuousAggParams(BaseModel):
+    """Parameters of a continuous aggregate declared by a model"""
+
+    model_config = ConfigDict(extra="forbid")
+
+    view_name: str
+    hypertable: str
+    time_column: str
+    bucket_width: str
+    group_by: str
+    measure: str
+    start_offset: str | None
+    end_offset: str
+    schedule_interval: str
+
+
+class ContinuousAggSchema(BaseModel):
+    """Continuous aggregate in the database"""
+
+    model_config = ConfigDict(extra="allow", alias_generator=to_snake)
+
+    view_schema: str
+    view_name: str
+    materialized_only: bool
+    compression_enabled: bool | None = None
+
+
 class HyperTableSchema(BaseModel):
     """Base class for hypertables"""
 
@@ -28,3 +71,6 @@ class HyperTableSchema(BaseModel):
     num_chunks: int
     compression_enabled: bool
     tablespaces: str | None = None
+    # State of the background policies, `None` when the policy does not exist
+    compress_after: str | None = None
+    drop_after: str | None = None
@@ -21,12 +21,65 @@ SELECT hypertable_id, created FROM create_hypertable(
 
 
 AVAILABLE_HYPERTABLES = text("""
-SELECT hypertable_schema
-    ,hypertable_name
-    ,owner
-    ,num_dimensions
-    ,num_chunks
+SELECT ht.hypertable_schema
+    ,ht.hypertable_name
+    ,ht.owner
+    ,ht.num_dimensions
+    ,ht.num_chunks
+    ,ht.compression_enabled
+    ,ht.tablespaces
+    ,compression.config ->> 'compress_after' AS compress_after
+    ,retention.config ->> 'drop_after' AS drop_after
+FROM timescaledb_information.hypertables AS ht
+LEFT JOIN timescaledb_information.jobs AS compression
+    ON compression.hypertable_schema = ht.hypertable_schema
+    AND compression.hypertable_name = ht.hypertable_name
+    AND compression.proc_name = 'policy_compression'
+LEFT JOIN timescaledb_information.jobs AS retention
+    ON retention.hypertable_schema = ht.hypertable_schema
+    AND retention.hypertable_name = ht.hypertable_name
+    AND retention.proc_name = 'policy_retention';
+""")
+
+
+ADD_COMPRESSION_POLICY = text("""
+SELECT add_compression_policy(
+    :table_name,
+    compress_after => CAST(:compress_after AS INTERVAL),
+    if_not_exists => true
+);
+""")
+
+
+ADD_RETENTION_POLICY = text("""
+SELECT add_retention_policy(
+    :table_name,
+    drop_after => CAST(:drop_after AS INTERVAL),
+    if_not_exists => true
+);
+""")
+
+
+AVAILABLE_CONTINUOUS_AGGREGATES = text("""
+SELECT view_schema
+    ,view_name
+    ,materialized_only
     ,compression_enabled
-    ,tablespaces
-FROM timescaledb_information.hypertables;
+FROM timescaledb_information.continuous_aggregates;
+""")
+
+
+ADD_CONTINUOUS_AGGREGATE_POLICY = text("""
+SELECT add_continuous_aggregate_policy(
+    :view_name,
+    start_offset => CAST(:start_offset AS INTERVAL),
+    end_offset => CAST(:end_offset AS INTERVAL),
+    schedule_interval => CAST(:schedule_interval AS INTERVAL),
+    if_not_exists => true
+);
+""")
+
+
+REFRESH_CONTINUOUS_AGGREGATE = text("""
+CALL refresh_continuous_aggregate(:view_name, NULL, NULL);
 """)
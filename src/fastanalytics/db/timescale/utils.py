@@ -1,27 +1,88 @@
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import TYPE_CHECKING
 
 from pydantic.alias_generators import to_snake
-from sqlalchemy import MetaData, Table
+from sqlalchemy import MetaData, Table, text
 
 from . import statements as sql
-from .schemas import HyperParams
+from .schemas import ContinuousAggParams, HyperParams, PolicyParams
 
 if TYPE_CHECKING:
+    from collections.abc import Mapping
+
     from ...models import BaseTable
 
 
+# Length in seconds of the fixed width units of a Postgres interval
+_INTERVAL_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 604800}
+_CALENDAR_UNITS = {"month", "year"}
+# Origin of the buckets of `time_bucket` for fixed width intervals, a Monday
+_BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+
+
+def interval_value(interval: str) -> str:
+    """Value of an interval declared in a model as `INTERVAL <value>`"""
+    interval = interval.strip().upper()
+    if not interval.startswith("INTERVAL "):
+        raise ValueError(f"Invalid time interval format: {interval}. Must start with 'INTERVAL '")
+    return interval.replace("INTERVAL ", "", 1).strip()
+
+
+def _interval_parts(interval: str) -> tuple[int, str]:
+    amount, unit = interval.strip().lower().split()
+    return int(amount), unit.removesuffix("s")
+
+
+def is_interval_multiple(interval: str, width: str) -> bool:
+    """Whether buckets of `interval` are made of whole buckets of `width`,
+    both as `<amount> <unit>` (e.g. `3 hours` is a multiple of `1 hour`).
+
+    Calendar intervals (months, years) are multiples of any fixed width that
+    evenly divides a day, as their boundaries always fall on midnight UTC.
+    """
+    amount, unit = _interval_parts(interval)
+    width_amount, width_unit = _interval_parts(width)
+    if width_unit in _CALENDAR_UNITS or width_unit not in _INTERVAL_UNITS:
+        return False
+    width_seconds = width_amount * _INTERVAL_UNITS[width_unit]
+    if width_seconds <= 0:
+        return False
+    if unit in _CALENDAR_UNITS:
+        return _INTERVAL_UNITS["day"] % width_seconds == 0
+    if unit not in _INTERVAL_UNITS:
+        return False
+    return (amount * _INTERVAL_UNITS[unit]) % width_seconds == 0
+
+
+def interval_seconds(interval: str) -> int:
+    """Length in seconds of a fixed width interval as `<amount> <unit>`"""
+    amount, unit = _interval_parts(interval)
+    return amount * _INTERVAL_UNITS[unit]
+
+
+def is_bucket_aligned(value: datetime, width: str) -> bool:
+    """Whether a time is the start of a bucket of the fixed width interval `width`"""
+    return value.timestamp() % interval_seconds(width) == 0
+
+
+def bucket_start(value: datetime, width: str) -> datetime:
+    """Start of the bucket of the fixed width interval `width` holding a time,
+    the same as `time_bucket(width, value)` in the database"""
+    offset = (value - _BUCKET_ORIGIN) % timedelta(seconds=interval_seconds(width))
+    return value - offset
+
+
+def is_fixed_interval(interval: str) -> bool:
+    """Whether an interval as `<amount> <unit>` has a fixed length, not months or years"""
+    return _interval_parts(interval)[1] in _INTERVAL_UNITS
+
+
 def extract_model_hyper_params(model: "type[BaseTable]") -> "HyperParams":
     time_interval = getattr(model, "__time_interval__", None)
     if time_interval is None:
         raise ValueError("Model must define a __time_interval__ attribute")
     if isinstance(time_interval, str):
-        time_interval = time_interval.strip().upper()
-        if not time_interval.startswith("INTERVAL "):
-            raise ValueError(
-                f"Invalid time interval format: {time_interval}. Must start with 'INTERVAL '"
-            )
-        time_interval = time_interval.replace("INTERVAL ", "", 1).strip()
+        time_interval = interval_value(time_interval)
     if isinstance(time_interval, timedelta):
         time_interval = int(time_interval.microseconds)
 
@@ -38,6 +99,26 @@ def extract_model_hyper_params(model: "type[BaseTable]") -> "HyperParams":
     )
 
 
+def extract_model_policy_params(
+    model: "type[BaseTable]", retention: "Mapping[str, str] | None" = None
+) -> "PolicyParams":
+    """Compression and retention settings declared by a model, the retention
+    of its table in `retention` (`{table name: interval}`) takes precedence"""
+    compress_after = getattr(model, "__compress_after__", None)
+    drop_after = getattr(model, "__drop_after__", None)
+    if retention and model.__tablename__ in retention:
+        drop_after = f"INTERVAL {retention[model.__tablename__]}"
+    return PolicyParams.model_validate(
+        {
+            "table_name": orm_table_name(model),
+            "segmentby": getattr(model, "__compress_segmentby__", None),
+            "orderby": getattr(model, "__compress_orderby__", None),
+            "compress_after": interval_value(compress_after).lower() if compress_after else None,
+            "drop_after": interval_value(drop_after).lower() if drop_after else None,
+        }
+    )
+
+
 def orm_table_name(model: "type[BaseTable]") -> "str":
     metadata = getattr(
         model,
@@ -74,3 +155,65 @@ def hypertable_sql(params: HyperParams) -> "str":
             }
         )
     )
+
+
+def compression_sql(params: PolicyParams) -> "str":
+    """DDL enabling the native compression of a hypertable"""
+    options = ["timescaledb.compress"]
+    if params.segmentby:
+        options.append("timescaledb.compress_segmentby = :segmentby")
+    if params.orderby:
+        options.append("timescaledb.compress_orderby = :orderby")
+    query = text(f"ALTER TABLE {params.table_name} SET ({', '.join(options)});")
+    binds = {
+        key: value
+        for key, value in params.model_dump(include={"segmentby", "orderby"}).items()
+        if value
+    }
+    return str(query.bindparams(**binds).compile(compile_kwargs={"literal_binds": True}))
+
+
+def extract_model_cagg_params(model: "type[BaseTable]") -> "list[ContinuousAggParams]":
+    """Continuous aggregates declared by a model in `__continuous_aggregates__`"""
+    declared = getattr(model, "__continuous_aggregates__", None) or ()
+    table_name = orm_table_name(model)
+    schema = table_name.rsplit(".", 1)[0] if "." in table_name else "public"
+    params = []
+    for cagg in declared:
+        params.append(
+            ContinuousAggParams.model_validate(
+                {
+                    "view_name": f"{schema}.{cagg['name']}",
+                    "hypertable": table_name,
+                    "time_column": getattr(model, "__time_column__", None),
+                    "bucket_width": interval_value(cagg["bucket_width"]).lower(),
+                    "group_by": cagg["group_by"],
+                    "measure": cagg["measure"],
+                    "start_offset": interval_value(cagg["start_offset"]).lower()
+                    if cagg.get("start_offset")
+                    else None,
+                    "end_offset": interval_value(cagg["end_offset"]).lower(),
+                    "schedule_interval": interval_value(cagg["schedule_interval"]).lower(),
+                }
+            )
+        )
+    return params
+
+
+def continuous_aggregate_sql(params: ContinuousAggParams) -> "str":
+    """DDL of a continuous aggregate with the count, sum, min and max of the
+    measure per bucket and group, real time aggregation is enabled so the
+    buckets not materialized yet are computed from the hypertable"""
+    return f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {params.view_name}
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '{params.bucket_width}', {params.time_column}) AS bucket
+    ,{params.group_by}
+    ,count({params.group_by}) AS count
+    ,sum({params.measure}) AS sum_{params.measure}
+    ,min({params.measure}) AS min_{params.measure}
+    ,max({params.measure}) AS max_{params.measure}
+FROM {params.hypertable}
+GROUP BY bucket, {params.group_by}
+WITH NO DATA;
+"""
@@ -0,0 +1,252 @@
+"""Most frequent values of the fields of the events (top pages, referrers, ...)
+
+The events are counted as they are ingested by a Space-Saving sketch per
+field and window of `TOP__WINDOW` seconds (`sketches.space_saving`), in
+memory, so the top values of the latest `TOP__WINDOWS` windows are answered
+by merging at most that many sketches without touching the database. Once a
+window is closed its `TOP__PERSISTED` top values are written to the
+`event_top_values` hypertable, which answers the windows older than the ones
+held in memory (and the ones before the process started).
+
+Every process counts the events it ingests, their counts are only added up
+in the database: with several workers the windows held in memory are only a
+share of the events, every window is read from the database once written.
+"""
+
+import asyncio
+import math
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models import EventTopValue
+from ..sketches import SpaceSaving
+from ..sketches.space_saving import merge
+from ..utils import get_utc_now
+from .sketches import sketch_value
+
+if TYPE_CHECKING:
+    import logging
+    from collections.abc import Iterable, Sequence
+    from typing import Any
+
+    from sqlalchemy import Row, Select
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlmodel import Session
+
+_TABLE = EventTopValue.__table__  # type: ignore[attr-defined]
+
+
+def top_values(field_name: str, start: datetime, end: datetime, limit: int) -> "Select[Any]":
+    """Most frequent values of the persisted windows between `start` and `end`"""
+    count = func.sum(EventTopValue.count)
+    return (
+        select(
+            EventTopValue.value, count.label("count"), func.sum(EventTopValue.error).label("error")
+        )
+        .where(
+            EventTopValue.field == field_name,
+            EventTopValue.time >= start,
+            EventTopValue.time < end,
+        )
+        .group_by(EventTopValue.value)
+        .order_by(count.desc())
+        .limit(limit)
+    )
+
+
+def add_counters(
+    counters: "dict[str, tuple[int, int]]", rows: "Iterable[Row[Any] | tuple[str, int, int]]"
+) -> None:
+    """Add the `(value, count, error)` rows of `top_values` to merged counters"""
+    for value, count, error in rows:
+        merged_count, merged_error = counters.get(value, (0, 0))
+        counters[value] = (merged_count + int(count), merged_error + int(error))
+
+
+def write_windows(session: "Session", rows: "Sequence[dict[str, Any]]") -> None:
+    """Add the counts of closed windows to the ones already written by other workers"""
+    statement = insert(_TABLE)
+    statement = statement.on_conflict_do_update(
+        index_elements=[_TABLE.c.field, _TABLE.c.value, _TABLE.c.time],
+        set_={
+            "count": _TABLE.c.count + statement.excluded.count,
+            "error": _TABLE.c.error + statement.excluded.error,
+        },
+    )
+    session.execute(statement, rows)
+
+
+class HeavyHitters:
+    """Space-Saving sketches of the values of `fields` per time window.
+
+    `add` is thread safe so it can be called from the handlers running in the
+    event loop or in the threadpool, the closed windows are written every
+    `persist_interval` seconds by a task of the event loop that owns the
+    sketches and dropped once they are older than the `windows` latest.
+
+    With `shared` other processes count events too, the windows held in
+    memory are not answered and the windows are only read once written.
+    """
+
+    def __init__(
+        self,
+        engine: "AsyncEngine",
+        logger: "logging.Logger",
+        fields: "Sequence[str]",
+        capacity: int,
+        window: int,
+        windows: int,
+        persisted: int,
+        persist_interval: float,
+        shared: bool = False,
+    ) -> None:
+        self._engine = engine
+        self._logger = logger
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._width = window
+        self._windows = windows
+        self._persisted = persisted
+        self._persist_interval = persist_interval
+        self.shared = shared
+        # Sketches of each field by start of the window, in seconds since the epoch
+        self._sketches: dict[int, dict[str, SpaceSaving]] = {}
+        self._written: set[int] = set()
+        # First window counted by this process, the events counted in it by a
+        # previous process are only in the database
+        self._since = self._start(get_utc_now())
+        self._lock = threading.Lock()
+        self._task: asyncio.Task[None] | None = None
+
+    def _start(self, time: datetime) -> int:
+        seconds = int(time.timestamp())
+        return seconds - seconds % self._width
+
+    def add(self, rows: "Sequence[dict[str, Any]]", times: "Sequence[datetime]") -> None:
+        """Count the values of inserted or queued events in the window of their time
+
+        The events of a window already written or older than the windows held
+        in memory are not counted
+        """
+        oldest = self._start(get_utc_now()) - (self._windows - 1) * self._width
+        with self._lock:
+            for row, time in zip(rows, times, strict=True):
+                start = self._start(time)
+                if start < oldest or start in self._written:
+                    continue
+                sketches = self._sketches.get(start)
+                if sketches is None:
+                    sketches = self._sketches[start] = {
+                        field: SpaceSaving(self.capacity) for field in self.fields
+                    }
+                for field in self.fields:
+                    sketches[field].add(sketch_value(row[field]))
+
+    def time_range(self, start: datetime | None, end: datetime | None) -> tuple[datetime, datetime]:
+        """Range of whole windows covering `start` and `end`, by default the
+        windows held in memory up to now, the current one included"""
+        if end is None:
+            end_seconds = self._start(get_utc_now()) + self._width
+        else:
+            end_seconds = math.ceil(end.timestamp() / self._width) * self._width
+        start_seconds = (
+            end_seconds - self._width * self._windows if start is None else self._start(start)
+        )
+        return (
+            datetime.fromtimestamp(start_seconds, timezone.utc),
+            datetime.fromtimestamp(end_seconds, timezone.utc),
+        )
+
+    def counters(
+        self, field_name: str, start: datetime, end: datetime
+    ) -> "tuple[dict[str, tuple[int, int]], datetime]":
+        """Merged counters of the windows held in memory between `start` and `end`
+
+        Return: the counters as `{value: (count, error)}` and the time from
+        which the windows are answered from memory, the windows before it
+        are to be read from the database with `top_values`
+        """
+        if self.shared:
+            return {}, end
+        now = self._start(get_utc_now())
+        held_from = max(now - (self._windows - 1) * self._width, self._since)
+        first = max(int(start.timestamp()), held_from)
+        last = int(end.timestamp())
+        with self._lock:
+            counters = merge(
+                sketches[field_name]
+                for window, sketches in self._sketches.items()
+                if first <= window < last
+            )
+        return counters, datetime.fromtimestamp(min(first, last), timezone.utc)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="heavy-hitters-persist")
+
+    async def stop(self) -> None:
+        """Stop the periodic writes and write every window, the open ones included"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.persist(closed_only=False)
+
+    async def persist(self, closed_only: bool = True) -> bool:
+        """Write the windows closed for at least `persist_interval` seconds,
+        so the events of their last seconds are counted, and drop the ones
+        no longer held in memory. Return whether the write succeeded"""
+        now = get_utc_now().timestamp()
+        with self._lock:
+            windows = {
+                start: sketches
+                for start, sketches in self._sketches.items()
+                if start not in self._written
+                and (not closed_only or start + self._width + self._persist_interval <= now)
+            }
+            rows = [
+                {
+                    "field": field,
+                    "value": value,
+                    "time": datetime.fromtimestamp(start, timezone.utc),
+                    "count": count,
+                    "error": error,
+                }
+                for start, sketches in sorted(windows.items())
+                for field, sketch in sketches.items()
+                for value, count, error in sketch.top(self._persisted)
+            ]
+        if rows:
+            try:
+                async with AsyncSession(self._engine) as session:
+                    await session.run_sync(write_windows, rows)
+                    await session.commit()
+            except SQLAlchemyError as e_sql:
+                self._logger.warning(
+                    "SQL Error writing %d top values, retrying later (%s)",
+                    len(rows),
+                    type(e_sql).__name__,
+                )
+                return False
+            self._logger.debug("Wrote %d top values of %d windows", len(rows), len(windows))
+        oldest = self._start(get_utc_now()) - (self._windows - 1) * self._width
+        with self._lock:
+            self._written.update(windows)
+            for start in [start for start in self._sketches if start < oldest]:
+                if start in self._written:
+                    del self._sketches[start]
+                    self._written.discard(start)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._persist_interval)
+            await self.persist()
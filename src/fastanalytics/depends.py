@@ -1,16 +1,49 @@
-from typing import Annotated
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated, Any
 
-from fastapi import Depends, Query
+from fastapi import Body, Depends, Query, Request
 from sqlmodel import Session as SqlSession
+from sqlmodel.ext.asyncio.session import AsyncSession as SqlAsyncSession
 
-from .db import get_session
+from .config import constants
 from .schemas import Page
-from .schemas.queries import PageAggregate
+from .schemas.queries import ExportQuery, PageAggregate, StreamQuery, TopQuery
+
+
+def get_session(request: Request) -> Generator[SqlSession, None, None]:
+    """Get a new session from the factory owned by the application lifespan"""
+    with request.state.session_factory() as session:
+        yield session
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[SqlAsyncSession, None]:
+    """Get a new asyncio session from the factory owned by the application lifespan"""
+    async with request.state.async_session_factory() as session:
+        yield session
+
 
 Session = Annotated[SqlSession, Depends(get_session)]
+AsyncSession = Annotated[SqlAsyncSession, Depends(get_async_session)]
 
 PageQuery = Annotated[Page, Query()]
 PageQueryAgg = Annotated[
     PageAggregate,
     Query(description="Pagination with aggregation over a time interval"),
 ]
+
+TopQueryParam = Annotated[TopQuery, Query(description="Time range of the most frequent values")]
+
+ExportQueryParam = Annotated[ExportQuery, Query(description="Filters and format of an export")]
+
+StreamQueryParam = Annotated[StreamQuery, Query(description="Subscription to live aggregates")]
+
+# Items are validated one by one, so a malformed item (even one that is not an
+# object) is reported by its index instead of rejecting the whole batch
+EventsBatchBody = Annotated[
+    list[Any],
+    Body(
+        min_length=1,
+        max_length=constants.EVENTS_BATCH_LIMIT,
+        description="Events to create, each item is validated as a single event",
+    ),
+]
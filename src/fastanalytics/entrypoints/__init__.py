@@ -1,8 +1,23 @@
+import os
 from contextlib import asynccontextmanager
+from functools import partial
 
 from .. import get_logger
 from ..config import environ
-from ..db import init_engine
+from ..db import (
+    MAX_FLUSH_BACKOFF,
+    HeavyHitters,
+    IngestBuffer,
+    LiveRollup,
+    ResultCache,
+    SketchBuffer,
+    StreamHub,
+    async_session_factory,
+    create_async_engine,
+    init_engine,
+    session_factory,
+    worker_pool,
+)
 from .asgi import create_app
 from .logger import setup_logger
 
@@ -11,14 +26,109 @@ __all__ = [
 ]
 
 
+def _count_flushed(counters, rows, times):
+    """Count the events written by the ingest buffer in the sketches of the
+    most frequent values, the live rollup and the sketches of the sessions"""
+    for counter in counters:
+        if counter is not None:
+            counter.add(rows, times)
+
+
 def init_app(*args, **kwargs):
     logger = get_logger()
     external_span = kwargs.pop("lifespan", None)
 
     @asynccontextmanager
     async def _span(_app):
-        ctx = {"logger": logger}
-        engine = init_engine()
+        # Every worker process runs its own lifespan, so the engines and
+        # their sockets are never shared between processes
+        db_settings = worker_pool(environ.db, environ.workers)
+        logger.info(
+            "Worker %d pools of %d connections and %d overflow per engine",
+            os.getpid(),
+            db_settings.pool_size,
+            db_settings.max_overflow,
+        )
+        engine = init_engine(db_settings)
+        async_engine = create_async_engine(db_settings)
+        aggregate_cache = None
+        if environ.cache.enabled:
+            # The sketches and the buffered events of a closed bucket are
+            # written up to their flush interval later
+            lateness = environ.cache.lateness
+            if environ.sketches.fields:
+                lateness = max(lateness, environ.sketches.flush_interval)
+            if environ.ingest.write_behind:
+                lateness = max(lateness, environ.ingest.flush_interval + MAX_FLUSH_BACKOFF)
+            aggregate_cache = ResultCache(
+                max_entries=environ.cache.max_entries,
+                max_bytes=environ.cache.max_bytes,
+                ttl=environ.cache.ttl,
+                lateness=lateness,
+            )
+        heavy_hitters = None
+        if environ.top.fields:
+            heavy_hitters = HeavyHitters(
+                async_engine,
+                logger,
+                fields=environ.top.fields,
+                capacity=environ.top.capacity,
+                window=environ.top.window,
+                windows=environ.top.windows,
+                persisted=environ.top.persisted,
+                persist_interval=environ.top.persist_interval,
+                # The other workers count their own share of the events
+                shared=environ.workers > 1,
+            )
+            await heavy_hitters.start()
+        live_rollup = None
+        if environ.live.fields and environ.workers > 1:
+            # Each worker would only merge the events it ingested
+            logger.warning("Live rollup disabled, it needs a single worker")
+        elif environ.live.fields:
+            live_rollup = LiveRollup(environ.live.fields)
+        sketch_buffer = None
+        if environ.sketches.fields:
+            sketch_buffer = SketchBuffer(
+                async_engine,
+                logger,
+                fields=environ.sketches.fields,
+                flush_interval=environ.sketches.flush_interval,
+            )
+            await sketch_buffer.start()
+        ingest_buffer = None
+        if environ.ingest.write_behind:
+            logger.info("Starting write-behind ingest buffer")
+            ingest_buffer = IngestBuffer(
+                async_engine,
+                logger,
+                capacity=environ.ingest.buffer_size,
+                flush_size=environ.ingest.flush_size,
+                flush_interval=environ.ingest.flush_interval,
+                on_flush=partial(_count_flushed, (heavy_hitters, live_rollup, sketch_buffer)),
+            )
+            await ingest_buffer.start()
+        stream_hub = StreamHub(
+            logger,
+            interval=environ.stream.interval,
+            queue_size=environ.stream.queue_size,
+            keepalive=environ.stream.keepalive,
+        )
+        # The engines and their pools are owned by the lifespan and shared
+        # by every request through `request.state`
+        ctx = {
+            "logger": logger,
+            "engine": engine,
+            "async_engine": async_engine,
+            "session_factory": session_factory(engine),
+            "async_session_factory": async_session_factory(async_engine),
+            "ingest_buffer": ingest_buffer,
+            "aggregate_cache": aggregate_cache,
+            "heavy_hitters": heavy_hitters,
+            "live_rollup": live_rollup,
+            "sketch_buffer": sketch_buffer,
+            "stream_hub": stream_hub,
+        }
         if external_span:
             async with external_span() as ext_ctx:
                 ctx.update(ext_ctx)
@@ -26,7 +136,15 @@ def init_app(*args, **kwargs):
         else:
             yield ctx
         logger.info("Shutting down application")
+        await stream_hub.stop()
+        if ingest_buffer is not None:
+            await ingest_buffer.stop()
+        if heavy_hitters is not None:
+            await heavy_hitters.stop()
+        if sketch_buffer is not None:
+            await sketch_buffer.stop()
         logger.info("Cleaning SQL Engine")
+        await async_engine.dispose()
         engine.dispose()
 
     setup_logger(environ.log_level)
@@ -5,7 +5,7 @@ from typing import Any
 from fastapi import FastAPI
 from starlette.middleware.gzip import GZipMiddleware
 
-from ..middleware import LoggerMiddleware
+from ..middleware import LoggerMiddleware, TimingMiddleware
 from ..routes import router
 
 
@@ -14,6 +14,8 @@ def create_app(**kwargs: dict[str, Any]) -> FastAPI:
 
     app.add_middleware(LoggerMiddleware)
     app.add_middleware(GZipMiddleware, compresslevel=7, minimum_size=700)
+    # Outermost, so the elapsed time covers the whole middleware stack
+    app.add_middleware(TimingMiddleware)
 
     app.include_router(
         router,
@@ -1,7 +1,10 @@
+import atexit
 import json
 import logging
 import logging.config
+import queue
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Any, Literal
 
@@ -33,6 +36,9 @@ LOG_RECORD_BUILTIN_ATTRS = {
 }
 
 
+# Loggers whose records are handed over to the listener thread, see `setup_logger`
+QUEUED_LOGGERS = (_LOGGER_NAME, "sqlalchemy")
+
 LOGGING_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -122,14 +128,72 @@ class JsonFormatter(logging.Formatter):
             dict_record["response"] = extra
         if extra := _record.get("sql_query", None):
             dict_record["sql_query"] = extra
+        if extra := _record.get("request_id", None):
+            dict_record["request_id"] = extra
+        if extra := _record.get("duration_ms", None):
+            dict_record["duration_ms"] = extra
 
         return dict_record
 
 
+class LocalQueueHandler(QueueHandler):
+    """Queue handler for a listener of the same process.
+
+    The records are not pickled, so unlike `QueueHandler` they are not
+    formatted before being enqueued: only the message is merged with its
+    arguments and the formatting is left to the handlers of the listener.
+    """
+
+    @override
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def queue_handlers(*names: str) -> QueueListener:
+    """Move the handlers of the loggers to a `QueueListener` thread
+
+    The loggers enqueue their records with a `LocalQueueHandler` and the
+    listener formats and writes them, out of the thread that logs them (the
+    event loop). The listener is started and must be stopped to flush the
+    records left in the queue.
+    """
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handlers: list[logging.Handler] = []
+    for name in names:
+        logger = logging.getLogger(name)
+        if not logger.handlers:
+            # Leave the records to the handlers of the parent loggers
+            continue
+        handlers.extend(handler for handler in logger.handlers if handler not in handlers)
+        logger.handlers = [LocalQueueHandler(records)]
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logger() -> None:
+    """Stop the listener of the loggers, writing the records still enqueued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logger(log_level: str, logger_config: Path | None = None) -> None:
+    global _listener
+    stop_logger()
     if logger_config is not None:
         assert logger_config.exists(), "The logger json file does not exists"
         logging.config.fileConfig(logger_config)
     else:
         logging.config.dictConfig(LOGGING_CONFIG)
     logging.getLogger(_LOGGER_NAME).setLevel(log_level)
+    _listener = queue_handlers(*QUEUED_LOGGERS)
+
+
+atexit.register(stop_logger)
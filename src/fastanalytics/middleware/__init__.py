@@ -1,3 +1,4 @@
 from .logger import LoggerMiddleware
+from .timing import TimingMiddleware, request_metrics
 
-__all__ = ["LoggerMiddleware"]
+__all__ = ["LoggerMiddleware", "TimingMiddleware", "request_metrics"]
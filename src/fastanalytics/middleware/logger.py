@@ -1,49 +1,93 @@
-import copy
+import random
 import uuid
 from http import HTTPStatus
 from typing import TYPE_CHECKING
 
-from starlette.datastructures import URL, MutableHeaders
+from starlette.datastructures import MutableHeaders
 
 from .. import get_logger
-from ..config import constants
+from ..config import constants, environ
+from ..utils import request_id
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
     from typing import TypeAlias
 
     from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+    from ..config.environments import AccessLogSettings
+
     THasHeaders: TypeAlias = Scope | Message
     TASGILoggerInfo: TypeAlias = dict[str, str | dict[str, str]]
 
 
-def _copy_headers(asgi: "THasHeaders") -> dict[str, str]:
-    headers = copy.deepcopy(asgi["headers"])
-    return {key.decode("latin1"): value.decode("latin1") for key, value in headers}
+def _copy_headers(asgi: "THasHeaders", allowed: "frozenset[bytes]") -> dict[str, str]:
+    """Headers of the allow-list, the raw headers are only read and never copied"""
+    return {
+        key.decode("latin1"): value.decode("latin1")
+        for key, value in asgi["headers"]
+        if key.lower() in allowed
+    }
 
 
-def _extract_req_info(scope: "Scope") -> "TASGILoggerInfo":
-    url = URL(scope=scope)
+def _extract_req_info(scope: "Scope", allowed: "frozenset[bytes]") -> "TASGILoggerInfo":
     return {
         "http": f"{scope['scheme'].upper()}/{scope['http_version']}",
         "method": scope["method"],
-        "path": url.path,
-        "query": url.query,
-        "headers": _copy_headers(scope),
-        "client": "{!s}:{!s}".format(*scope["client"]) if scope["client"] else "-:-",
+        "path": scope["path"],
+        "query": scope["query_string"].decode("latin1"),
+        "headers": _copy_headers(scope, allowed),
+        "client": "{!s}:{!s}".format(*scope["client"]) if scope.get("client") else "-:-",
     }
 
 
-def _extract_res_info(message: "Message") -> "TASGILoggerInfo":
+def _extract_res_info(message: "Message", allowed: "frozenset[bytes]") -> "TASGILoggerInfo":
     return {
         "status_code": message["status"],
         "phrase": HTTPStatus(message["status"]).phrase,
-        "headers": _copy_headers(message),
+        "headers": _copy_headers(message, allowed),
     }
 
 
+class AccessSampler:
+    """Decide which requests are written in the access log.
+
+    Each response is logged with the rate of the class of its status code
+    (`2xx`, `5xx`, ...), taken from the longest route prefix of
+    `route_rates` matching the path of the request or from `rates`.
+    A missing class is always logged.
+    """
+
+    def __init__(
+        self,
+        rates: "Mapping[str, float]",
+        route_rates: "Mapping[str, Mapping[str, float]]",
+    ) -> None:
+        self._rates = dict(rates)
+        # The most specific (longest) prefix first
+        self._routes = sorted(
+            ((prefix, {**self._rates, **overrides}) for prefix, overrides in route_rates.items()),
+            key=lambda route: len(route[0]),
+            reverse=True,
+        )
+
+    def sampled(self, path: str, status_code: int) -> bool:
+        rates = next(
+            (rates for prefix, rates in self._routes if path.startswith(prefix)), self._rates
+        )
+        rate = rates.get(f"{status_code // 100}xx", 1.0)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
 class LoggerMiddleware:
-    def __init__(self, app: "ASGIApp") -> None:
+    """Access log of the HTTP requests.
+
+    The request and response details are only extracted for the requests
+    sampled, see `AccessSampler`, and only the headers of the allow-list
+    of the settings are included.
+    """
+
+    def __init__(self, app: "ASGIApp", settings: "AccessLogSettings | None" = None) -> None:
         self.app = app
         logger = None
         if hasattr(self.app, "state"):
@@ -51,23 +95,38 @@ class LoggerMiddleware:
         if not logger:
             logger = get_logger()
         self.logger = logger
+        settings = settings or environ.access_log
+        self.headers = _allowed_headers(settings.headers)
+        self.sampler = AccessSampler(settings.sample_rates, settings.route_sample_rates)
 
     async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
         async def logger_send(message: "Message") -> None:
             if message["type"] == "http.response.start":
-                extra_info["response"] = _extract_res_info(message)
+                response_start.append(message)
             await send(message)
 
-        extra_info = {}
         if scope["type"] not in {"http", "https"}:
             return await self.app(scope, receive, send)
 
-        extra_info["request"] = _extract_req_info(scope)
         headers = MutableHeaders(scope=scope)
-        if not headers.get(constants.REQ_ID_HEADER):
-            headers.update({constants.REQ_ID_HEADER: str(uuid.uuid4())})
+        req_id = headers.get(constants.REQ_ID_HEADER)
+        if not req_id:
+            req_id = str(uuid.uuid4())
+            headers.update({constants.REQ_ID_HEADER: req_id})
+        token = request_id.set(req_id)
+        response_start: list[Message] = []
         try:
             await self.app(scope, receive, logger_send)
         finally:
-            # Here is where the log message goes
-            self.logger.info("Trace access ASGI connection", extra=extra_info)
+            request_id.reset(token)
+            # A request failing before the response starts is answered with a 500
+            status_code = response_start[0]["status"] if response_start else 500
+            if self.sampler.sampled(scope["path"], status_code):
+                extra_info = {"request": _extract_req_info(scope, self.headers)}
+                if response_start:
+                    extra_info["response"] = _extract_res_info(response_start[0], self.headers)
+                self.logger.info("Trace access ASGI connection", extra=extra_info)
+
+
+def _allowed_headers(names: "Iterable[str]") -> "frozenset[bytes]":
+    return frozenset(name.lower().encode("latin1") for name in names)
@@ -0,0 +1,152 @@
+import bisect
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from starlette.datastructures import MutableHeaders
+
+from ..config import constants
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Upper bounds in seconds of the buckets of the request latency histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Label of the requests that did not match any route, so unknown paths do
+# not create a series each
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class _RouteMetrics:
+    __slots__ = ("statuses", "buckets", "total", "count")
+
+    def __init__(self) -> None:
+        self.statuses: dict[int, int] = {}
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+
+class RequestMetrics:
+    """Rate, errors and latency histograms of the requests by route template
+
+    The series are labelled with the path template of the route that served
+    the request (`/api/v1.0/events/aggregate/{field}`), never the raw path.
+    """
+
+    def __init__(self) -> None:
+        self._routes: dict[tuple[str, str], _RouteMetrics] = {}
+        self._in_progress = 0
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self._in_progress += 1
+
+    def record(self, method: str, route: str, status_code: int, elapsed: float) -> None:
+        with self._lock:
+            self._in_progress -= 1
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = _RouteMetrics()
+            metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+            metrics.buckets[bisect.bisect_left(DURATION_BUCKETS, elapsed)] += 1
+            metrics.total += elapsed
+            metrics.count += 1
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format
+
+        The latency is exposed as a histogram, the quantiles are computed with
+        `histogram_quantile` and can be aggregated across workers.
+        """
+        lines = [
+            "# HELP http_requests_total Requests served by route, method and status code",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (method, route), metrics in routes:
+                for status_code, count in sorted(metrics.statuses.items()):
+                    labels = _labels(method=method, route=route, status=str(status_code))
+                    lines.append(f"http_requests_total{{{labels}}} {count}")
+            lines += [
+                "# HELP http_request_errors_total Requests answered with a 5xx status code",
+                "# TYPE http_request_errors_total counter",
+            ]
+            for (method, route), metrics in routes:
+                errors = sum(count for code, count in metrics.statuses.items() if code >= 500)
+                lines.append(
+                    f"http_request_errors_total{{{_labels(method=method, route=route)}}} {errors}"
+                )
+            lines += [
+                "# HELP http_request_duration_seconds Latency of the requests by route and method",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route), metrics in routes:
+                cumulative = 0
+                for bound, count in zip((*DURATION_BUCKETS, "+Inf"), metrics.buckets, strict=True):
+                    cumulative += count
+                    labels = _labels(method=method, route=route, le=str(bound))
+                    lines.append(f"http_request_duration_seconds_bucket{{{labels}}} {cumulative}")
+                labels = _labels(method=method, route=route)
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.total}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.count}")
+            lines += [
+                "# HELP http_requests_in_progress Requests being served",
+                "# TYPE http_requests_in_progress gauge",
+                f"http_requests_in_progress {self._in_progress}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+
+
+# Metrics of the requests served by the process, exposed by GET /metrics
+request_metrics = RequestMetrics()
+
+
+class TimingMiddleware:
+    """Time every HTTP request.
+
+    The time until the response starts is sent in the `X-Elapsed-Time`
+    header (milliseconds) and the time until the response is complete,
+    streamed bodies included, is recorded in `request_metrics` by route
+    template.
+    """
+
+    def __init__(self, app: "ASGIApp", metrics: RequestMetrics = request_metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: "Scope", receive: "Receive", send: "Send") -> None:
+        async def timing_send(message: "Message") -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                MutableHeaders(scope=message)[constants.RES_TIME_ELAPSE] = f"{elapsed:.3f}ms"
+            await send(message)
+
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        # A request failing before the response starts is answered with a 500
+        status_code = 500
+        self.metrics.started()
+        try:
+            await self.app(scope, receive, timing_send)
+        finally:
+            route = scope.get("route")
+            self.metrics.record(
+                scope["method"],
+                getattr(route, "path_format", None) or UNMATCHED_ROUTE,
+                status_code,
+                time.perf_counter() - start,
+            )
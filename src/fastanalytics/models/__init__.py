@@ -1,6 +1,16 @@
 from .base import SCHEMA
 from .base import BaseHyperModel as BaseTable
+from .bootstrap import SchemaVersion
 from .events import Event
+from .sketches import EventSketch, EventTopValue
 from .utils import is_numeric
 
-__all__ = ["Event", "BaseTable", "SCHEMA", "is_numeric"]
+__all__ = [
+    "Event",
+    "EventSketch",
+    "EventTopValue",
+    "SchemaVersion",
+    "BaseTable",
+    "SCHEMA",
+    "is_numeric",
+]
@@ -13,9 +13,18 @@ class BaseHyperModel(SQLModel):
     __abstract__: ClassVar[bool] = True
     __time_column__: ClassVar = "time"
     __time_interval__: ClassVar = "INTERVAL 7 days"
-    # TODO: add compression settings from timescaledb
-    # and retention policies
-    # __drop_after__: ClassVar = "INTERVAL 3 months"
+    # Continuous aggregates (rollups) of the hypertable, each one with the
+    # count, sum, min and max of `measure` per `group_by` and bucket, synced
+    # by `db.timescale.aggregates.sync_continuous_aggregates`
+    __continuous_aggregates__: ClassVar = ()
+    # Native compression of the chunks older than `__compress_after__`,
+    # segmented and ordered inside the compressed batches by the given columns
+    __compress_segmentby__: ClassVar = None
+    __compress_orderby__: ClassVar = None
+    __compress_after__: ClassVar = None
+    # Retention policy, the chunks older than `__drop_after__` are dropped.
+    # Retention is opt-in, `RETENTION__DROP_AFTER` sets it by table name
+    __drop_after__: ClassVar = None
 
     __table_args__ = {"schema": SCHEMA}
 
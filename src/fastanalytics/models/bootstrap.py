@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import TEXT
+from sqlmodel import DateTime, Field, SQLModel
+
+from .base import SCHEMA
+
+
+class SchemaVersion(SQLModel, table=True):
+    """Fingerprint of the schema declared by the models as last bootstrapped in
+    the database, a single row written by `db.bootstrap.bootstrap_schema`"""
+
+    __tablename__ = "schema_version"  # type: ignore[assignment]
+    __table_args__ = {"schema": SCHEMA}
+
+    id: int = Field(default=1, primary_key=True)
+    version: int
+    fingerprint: str = Field(sa_type=TEXT)
+    applied_at: datetime = Field(sa_type=DateTime(timezone=True))  # type: ignore
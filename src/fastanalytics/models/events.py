@@ -13,6 +13,29 @@ from .base import BaseHyperModel
 
 class Event(BaseHyperModel, table=True):
     __tablename__ = "events"  # type: ignore[assignment]
+    __compress_segmentby__ = "page"
+    __compress_orderby__ = "time DESC"
+    __compress_after__ = "INTERVAL 7 days"
+    __continuous_aggregates__ = (
+        {
+            "name": "events_page_hourly",
+            "bucket_width": "INTERVAL 1 hour",
+            "group_by": "page",
+            "measure": "duration",
+            "start_offset": "INTERVAL 3 days",
+            "end_offset": "INTERVAL 1 hour",
+            "schedule_interval": "INTERVAL 30 minutes",
+        },
+        {
+            "name": "events_page_daily",
+            "bucket_width": "INTERVAL 1 day",
+            "group_by": "page",
+            "measure": "duration",
+            "start_offset": "INTERVAL 1 month",
+            "end_offset": "INTERVAL 1 day",
+            "schedule_interval": "INTERVAL 1 hour",
+        },
+    )
 
     page: Page = Field(sa_type=TEXT)
     agent: Annotated[str, StringConstraints(min_length=10)] = Field(sa_type=TEXT)
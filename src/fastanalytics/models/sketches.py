@@ -0,0 +1,66 @@
+# mypy: ignore-errors
+from typing import Any
+
+from sqlalchemy import BigInteger, UniqueConstraint, cast
+from sqlalchemy.dialects.postgresql import BIT, JSONB, TEXT
+from sqlalchemy.types import TypeDecorator
+from sqlmodel import Field
+
+from ..sketches.hll import SIZE
+from .base import SCHEMA, BaseHyperModel
+
+
+class SketchBits(TypeDecorator):
+    """Registers of a `HyperLogLog` as a fixed length `BIT` string, so the
+    sketches are merged in the database with `|` and `bit_or`"""
+
+    impl = BIT(SIZE * 8)
+    cache_ok = True
+
+    def bind_expression(self, bindvalue: Any) -> Any:
+        return cast(bindvalue, self.impl)
+
+    def process_bind_param(self, value: bytes | None, dialect: Any) -> str | None:
+        # Hexadecimal input of the BIT type
+        return None if value is None else f"x{value.hex()}"
+
+    def process_result_value(self, value: str | None, dialect: Any) -> bytes | None:
+        return None if value is None else int(value, 2).to_bytes(SIZE, "big")
+
+
+class EventSketch(BaseHyperModel, table=True):
+    """Sketches of the unique sessions and of the durations of the events of a
+    bucket by the value of a field, `time` is the start of the bucket.
+    Maintained by the ingest path, see `db.sketches.SketchBuffer`"""
+
+    __tablename__ = "event_sketches"  # type: ignore[assignment]
+    __table_args__ = (
+        UniqueConstraint("field", "value", "time", name="event_sketches_field_value_time"),
+        {"schema": SCHEMA},
+    )
+
+    field: str = Field(sa_type=TEXT)
+    # Value of the field as text, an empty string for NULL
+    value: str = Field(sa_type=TEXT)
+    sessions: bytes = Field(sa_type=SketchBits)
+    # Bins of the `DDSketch` of the durations as `{index: count}`
+    durations: dict[str, int] = Field(sa_type=JSONB)
+
+
+class EventTopValue(BaseHyperModel, table=True):
+    """Most frequent values of a field in a window of the heavy-hitters
+    sketches, `time` is the start of the window. Written once the window is
+    closed, see `db.top.HeavyHitters`, the counts of every worker are added"""
+
+    __tablename__ = "event_top_values"  # type: ignore[assignment]
+    __table_args__ = (
+        UniqueConstraint("field", "value", "time", name="event_top_values_field_value_time"),
+        {"schema": SCHEMA},
+    )
+
+    field: str = Field(sa_type=TEXT)
+    # Value of the field as text, an empty string for NULL
+    value: str = Field(sa_type=TEXT)
+    # Upper bound of the events with the value, the true count is at least `count - error`
+    count: int = Field(sa_type=BigInteger)
+    error: int = Field(sa_type=BigInteger)
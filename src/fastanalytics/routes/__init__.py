@@ -1,8 +1,9 @@
 from fastapi import status
+from fastapi.responses import PlainTextResponse
 from fastapi.routing import APIRouter
 
-from . import events
-from .health import health_check
+from . import events, events_sync, internal
+from .health import health_check, metrics
 
 __version__ = "1.0"
 VERSION = f"v{__version__}"
@@ -10,6 +11,9 @@ VERSION = f"v{__version__}"
 router = APIRouter(prefix=f"/api/{VERSION}")
 
 router.include_router(events.router, prefix="/events", tags=["events", VERSION])
+# Threadpool routes kept side by side with the asyncio ones to benchmark them
+router.include_router(events_sync.router, prefix="/sync/events", tags=["events-sync", VERSION])
+router.include_router(internal.router, prefix="/internal", tags=["internal", VERSION])
 
 router.add_api_route(
     "/healthzcheck",
@@ -18,5 +22,12 @@ router.add_api_route(
     status_code=status.HTTP_200_OK,
     tags=["health"],
 )
+router.add_api_route(
+    "/metrics",
+    metrics,
+    methods=["GET"],
+    response_class=PlainTextResponse,
+    tags=["health"],
+)
 
 __all__ = ["router"]
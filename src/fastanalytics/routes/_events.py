@@ -0,0 +1,493 @@
+"""Helpers shared by the asyncio and the threadpool versions of the events routes"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException, status
+from fastapi import Response as HttpResponse
+from pydantic import ValidationError
+from pydantic.alias_generators import to_camel
+from pydantic_core import to_json
+from sqlalchemy.dialects import postgresql
+
+from ..config import constants
+from ..db import BufferFullError
+from ..db.queries import (
+    AGGREGATE_COLUMNS,
+    aggregate_parts,
+    events_aggregate,
+    events_open_bucket,
+    live_start,
+    merge_live_groups,
+)
+from ..db.timescale.utils import bucket_start
+from ..models import Event, is_numeric
+from ..schemas import (
+    EventAggregate,
+    EventCreate,
+    EventSchema,
+    EventTop,
+    Page,
+    Response,
+    ResponsePage,
+    StatusEnum,
+)
+from ..schemas.events import EventRow, TopValue
+from ..schemas.queries import PageAggregate, StreamQuery
+from ..schemas.responses import dump_page
+from ..sketches.space_saving import top
+from ..utils import get_utc_now
+
+if TYPE_CHECKING:
+    from collections.abc import Generator, Mapping, Sequence
+    from typing import Any
+
+    from fastapi import Request
+    from sqlalchemy import Row, Select
+    from sqlalchemy.exc import SQLAlchemyError
+    from sqlalchemy.sql import ClauseElement, Executable
+    from sqlmodel import Session
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from starlette.datastructures import State
+
+    from ..db import IngestBuffer
+
+    # Statements of an aggregate page yielded to the route running it, which
+    # sends back their rows, and the rows and number of groups of the page
+    AggregatePlan = Generator[Executable, list[Row[Any]], tuple[list[Row[Any]], int]]
+
+
+def event_values(payload: EventCreate) -> "dict[str, Any]":
+    """Column values of the event to persist from a validated payload"""
+    values = payload.model_dump()
+    values["referrer"] = str(values["referrer"]) if values["referrer"] else None
+    return values
+
+
+def batch_values(
+    payload: "list[Any]",
+) -> "tuple[list[dict[str, Any]], list[dict[str, str]]]":
+    """Validate each item of a batch on its own, an item that is not an object
+    is an error of its index as any other invalid item
+
+    Return: the column values of the valid events and the errors of the invalid ones
+    """
+    rows: list[dict[str, Any]] = []
+    errors: list[dict[str, str]] = []
+    for index, item in enumerate(payload):
+        try:
+            rows.append(event_values(EventCreate.model_validate(item)))
+        except ValidationError as e_val:
+            errors.extend(_item_errors(index, e_val))
+    return rows, errors
+
+
+def _item_errors(index: int, error: ValidationError) -> "list[dict[str, str]]":
+    """Flatten the validation errors of one item in a batch into the envelope errors"""
+    return [
+        {
+            "index": str(index),
+            "field": ".".join(str(loc) for loc in detail["loc"]),
+            "type": detail["type"],
+            "message": detail["msg"],
+        }
+        for detail in error.errors(include_url=False)
+    ]
+
+
+def enqueue_event(
+    request: "Request",
+    response: "HttpResponse",
+    ingest_buffer: "IngestBuffer",
+    payload: EventCreate,
+) -> "Response[EventSchema]":
+    """Hand the event over to the write-behind buffer instead of inserting it"""
+    values = event_values(payload)
+    values["time"] = get_utc_now()
+    try:
+        ingest_buffer.put(values)
+    except BufferFullError:
+        request.state.logger.warning("Ingest buffer is full, rejecting event")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=Response(
+                status=StatusEnum.error,
+                message="Ingestion buffer is full, retry later",
+            ).model_dump(exclude_none=True, exclude_unset=True),
+            headers={"Retry-After": "1"},
+        ) from None
+    # The event is counted in memory once it is flushed, see `IngestBuffer`
+    response.status_code = status.HTTP_202_ACCEPTED
+    return Response(
+        status=StatusEnum.success,
+        message="Event accepted for ingestion",
+    )
+
+
+def count_events(
+    request: "Request", rows: "Sequence[dict[str, Any]]", times: "Sequence[datetime]"
+) -> None:
+    """Count inserted events in the sketches of the most frequent values, the
+    live rollup and the sketches of the unique sessions held in memory"""
+    for counter in (
+        request.state.heavy_hitters,
+        request.state.live_rollup,
+        request.state.sketch_buffer,
+    ):
+        if counter is not None:
+            counter.add(rows, times)
+
+
+def database_rows(
+    state: "State",
+    field_name: str,
+    page: PageAggregate,
+    query: "Select[Any]",
+    open_from: "datetime | None" = None,
+) -> "AggregatePlan":
+    """Rows of an aggregate page computed by the database, with the extra row
+    of `paginate`, and its number of groups
+
+    With the cache of the application the time range is split at the bucket
+    of the latest event: the groups of the closed buckets never change and
+    are cached until evicted, the ones of the open bucket are cached for the
+    TTL of the cache. Only the open bucket is recomputed while the closed
+    buckets stay the same. Without the cache the range is only split at
+    `open_from` when given, so the closed buckets can still be computed from
+    the rollups when the range ends inside a bucket. The legacy OFFSET pages
+    are not split as the offset spans both parts.
+
+    The statements are yielded to the route running the plan, see `run_plan`
+    and `run_plan_async`, so the asyncio and the threadpool routes share the
+    cache and answer the same.
+    """
+    aggregate_cache = state.aggregate_cache
+    if (page.page > 1 and not page.cursor) or (aggregate_cache is None and open_from is None):
+        rows = yield query
+        return rows, rows[0].total_groups if rows else 0
+    if aggregate_cache is not None:
+        bucket_key = ("open_bucket", page.interval)
+        open_from = aggregate_cache.get(bucket_key)
+        if open_from is None:
+            (open_from,) = (yield events_open_bucket(page.interval))[0]
+            if open_from is not None:
+                aggregate_cache.put(bucket_key, open_from)
+        # A closed bucket may still get late events, from the write-behind
+        # buffer or other workers, until the lateness of the cache is over
+        settled_until = get_utc_now() - timedelta(seconds=aggregate_cache.lateness)
+    parts = []
+    for part, closed in aggregate_parts(page, open_from):
+        if aggregate_cache is None:
+            parts.append(tuple((yield events_aggregate(field_name, part))))
+            continue
+        key = (
+            "aggregate",
+            field_name,
+            tuple(sorted(set(part.func))),
+            part.model_dump_json(exclude={"func", "format"}),
+        )
+        part_rows = aggregate_cache.get(key)
+        if part_rows is None:
+            part_rows = tuple((yield events_aggregate(field_name, part)))
+            aggregate_cache.put(
+                key,
+                part_rows,
+                immutable=closed and part.end is not None and part.end <= settled_until,
+            )
+        parts.append(part_rows)
+    if page.order == "desc":
+        parts.reverse()
+    total_groups = sum(part_rows[0].total_groups for part_rows in parts if part_rows)
+    rows = [row for part_rows in parts for row in part_rows]
+    return rows[: page.page_size + 1], total_groups
+
+
+def aggregate_rows(
+    state: "State",
+    field_name: str,
+    page: "PageAggregate",
+    query: "Select[Any]",
+) -> "AggregatePlan":
+    """Rows of an aggregate page, with the extra row of `paginate`, and its number of groups
+
+    The minutes held by the live rollup of the application are merged from
+    memory, the database only aggregates the time range before them, see
+    `merge_live_groups`. The partials are taken before the query, a minute
+    leaving the rollup meanwhile is still merged.
+    """
+    live_rollup = state.live_rollup
+    start = None
+    if live_rollup is not None and field_name in live_rollup.fields:
+        held_from, partials = live_rollup.snapshot(field_name)
+        start = live_start(field_name, page, held_from)
+    if start is None:
+        return (yield from database_rows(state, field_name, page, query))
+    rows: Sequence[Row[Any]] = []
+    total_groups = 0
+    if page.start is None or page.start < start:
+        before = page.model_copy(update={"end": start})
+        rows, total_groups = yield from database_rows(
+            state,
+            field_name,
+            before,
+            events_aggregate(field_name, before),
+            bucket_start(start, page.interval),
+        )
+    partials = [
+        partial
+        for partial in partials
+        if partial[0] >= start and (page.end is None or partial[0] < page.end)
+    ]
+    return merge_live_groups(field_name, rows, total_groups, partials, page)
+
+
+def run_plan(session: "Session", plan: "AggregatePlan") -> "tuple[list[Row[Any]], int]":
+    """Run the statements of an aggregate plan with a sync session"""
+    try:
+        statement = next(plan)
+        while True:
+            statement = plan.send(list(session.execute(statement).all()))
+    except StopIteration as stop:
+        return stop.value  # type: ignore[no-any-return]
+
+
+async def run_plan_async(
+    session: "AsyncSession", plan: "AggregatePlan"
+) -> "tuple[list[Row[Any]], int]":
+    """Run the statements of an aggregate plan with an asyncio session"""
+    try:
+        statement = next(plan)
+        while True:
+            statement = plan.send(list((await session.execute(statement)).all()))
+    except StopIteration as stop:
+        return stop.value  # type: ignore[no-any-return]
+
+
+def top_field(request: "Request", field: str) -> str:
+    """Resolve the name of a field with its most frequent values counted from its alias
+
+    Raise: `HTTPException` when the values of the field are not counted
+    """
+    field_name = EventSchema.field_by_alias(field)
+    heavy_hitters = request.state.heavy_hitters
+    if heavy_hitters is None or field_name not in heavy_hitters.fields:
+        request.state.logger.warning("Invalid field for top values %s", field)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=Response(
+                status=StatusEnum.error,
+                message=f"The most frequent values are not counted for: {field}",
+            ).model_dump(exclude_none=True, exclude_unset=True),
+        )
+    return field_name
+
+
+def top_result(
+    field: str,
+    start: datetime,
+    end: datetime,
+    counters: "Mapping[str, tuple[int, int]]",
+    limit: int,
+) -> EventTop:
+    return EventTop(
+        field=field,
+        start=start,
+        end=end,
+        values=[
+            TopValue(value=value, count=count, error=error)
+            for value, count, error in top(counters, limit)
+        ],
+    )
+
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Columns of the events selected as rows, see `events_page` and `events_export`
+EVENT_COLUMNS = [column.name for column in Event.__table__.columns]  # type: ignore[attr-defined]
+# Names of the exported columns, as the events are serialized by the API
+EXPORT_COLUMNS = [to_camel(name) for name in EVENT_COLUMNS]
+
+
+def export_header(export_format: str) -> str:
+    """Leading line of an export, only CSV has a header"""
+    if export_format == "csv":
+        return _csv_lines([EXPORT_COLUMNS])
+    return ""
+
+
+def export_chunk(rows: "Sequence[Row[Any]]", export_format: str) -> str:
+    """Lines of an export for a batch of rows of `events_export`"""
+    if export_format == "csv":
+        return _csv_lines(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+    return "".join(
+        to_json(dict(zip(EXPORT_COLUMNS, row, strict=True)), fallback=str).decode() + "\n"
+        for row in rows
+    )
+
+
+def stream_page(query: StreamQuery) -> PageAggregate:
+    """Aggregate page of the open bucket of a stream subscription"""
+    return PageAggregate(
+        interval=query.interval,
+        func=query.func,
+        start=bucket_start(get_utc_now(), query.interval),
+        page_size=constants.EVENTS_STREAM_GROUPS,
+    )
+
+
+def stream_message(event: str, groups: "Sequence[dict[str, Any]]") -> str:
+    """Server-sent event with the groups of a stream as its JSON data"""
+    return f"event: {event}\ndata: {to_json(groups).decode()}\n\n"
+
+
+def _csv_lines(rows: "Any") -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+# Documentation of the columnar representation of the list endpoints
+COLUMNAR_RESPONSE: "dict[int | str, dict[str, Any]]" = {
+    status.HTTP_200_OK: {
+        "content": {constants.COLUMNAR_MEDIA_TYPE: {}},
+        "description": "Page with `results` as `{column: [values...]}` when requested "
+        "with `format=columnar` or the columnar `Accept` media type",
+    }
+}
+
+
+def wants_columnar(request: "Request", page: Page) -> bool:
+    """Whether the client asked for the columnar representation of a page"""
+    return page.format == "columnar" or constants.COLUMNAR_MEDIA_TYPE in request.headers.get(
+        "accept", ""
+    )
+
+
+def columnar_response(
+    envelope: ResponsePage, rows: "Sequence[Row[Any]]", columns: "Sequence[str]"
+) -> HttpResponse:
+    """Response of a page with its rows transposed into `{column: [values...]}`
+
+    The values are serialized straight from the rows of the database, no
+    model is built per row, and the keys are written once per column.
+    """
+    body = envelope.model_dump(mode="json", by_alias=True, exclude_none=True)
+    if rows:
+        fields = list(rows[0]._fields)
+        values = list(zip(*rows, strict=True))
+        body["results"] = {to_camel(name): values[fields.index(name)] for name in columns}
+    else:
+        body["results"] = {to_camel(name): [] for name in columns}
+    return HttpResponse(
+        content=to_json(body, fallback=str), media_type=constants.COLUMNAR_MEDIA_TYPE
+    )
+
+
+# Fields of the events in the order they are serialized by `EventSchema`
+_EVENT_ROW_FIELDS = tuple(EventRow.__annotations__)
+
+
+def event_row(row: "Row[Any]") -> EventRow:
+    """Event of a row selected with `as_rows`, keyed in the order of `EventSchema`"""
+    mapping = row._mapping
+    return {name: mapping[name] for name in _EVENT_ROW_FIELDS}  # type: ignore[return-value]
+
+
+def rows_response(
+    row_type: type,
+    rows: "Sequence[Any]",
+    message: str,
+    page: Page,
+    total_records: int,
+    next_cursor: str | None = None,
+) -> HttpResponse:
+    """Successful response of a page of rows, serialized as `ResponsePage` would
+    but without validating a model per row, see `dump_page`"""
+    return HttpResponse(
+        content=dump_page(
+            row_type,
+            rows,
+            status=StatusEnum.success,
+            message=message,
+            page=page,
+            total_records=total_records,
+            next_cursor=next_cursor,
+        ),
+        media_type="application/json",
+    )
+
+
+def aggregate_columns(page: PageAggregate) -> "list[str]":
+    """Columns of the aggregated groups of a page, as labelled by `events_aggregate`"""
+    return ["field", "interval", "count", *(AGGREGATE_COLUMNS[agg] for agg in page.func)]
+
+
+def aggregate_field(request: "Request", field: str, page: Page) -> str:
+    """Resolve the name of the model field to aggregate by from its alias
+
+    Raise: `HTTPException` when the field does not exist or it is numeric
+    """
+    field_name = EventSchema.field_by_alias(field)
+    if not field_name:
+        request.state.logger.warning("Invalid field for avg aggregation %s", field)
+        raise bad_request(f"Invalid field for aggregation: {field}", page)
+    if is_numeric(Event, field_name):
+        request.state.logger.warning("Numeric field for aggregation %s", field)
+        raise bad_request("It is only allowed to aggregate non-numeric fields", page)
+    return field_name
+
+
+def aggregate_result(row: "Row[Any]") -> EventAggregate:
+    """Aggregated group of a row or of a group merged with the live rollup,
+    without the pagination columns of the query"""
+    return EventAggregate(
+        **{key: value for key, value in row._asdict().items() if key in EventAggregate.model_fields}
+    )
+
+
+def bad_request(message: str, page: Page) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=ResponsePage(
+            status=StatusEnum.error,
+            message=message,
+            page=page,
+        ).model_dump(exclude_none=True, exclude_unset=True),
+    )
+
+
+def internal_error(page: Page | None = None) -> HTTPException:
+    detail: Response[EventSchema] | ResponsePage[EventSchema]
+    if page is None:
+        detail = Response(status=StatusEnum.error, message="Internal server error")
+    else:
+        detail = ResponsePage(
+            status=StatusEnum.error,
+            message="Internal server error",
+            total_records=0,
+            page=page,
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=detail.model_dump(exclude_none=True, exclude_unset=True),
+    )
+
+
+def log_sql_error(
+    request: "Request", message: str, e_sql: "SQLAlchemyError", query: "ClauseElement"
+) -> None:
+    request.state.logger.error(
+        "%s (Type=%s) (Msg=%s)",
+        message,
+        type(e_sql).__name__,
+        e_sql._message(),
+        extra={
+            "sql_query": query.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        },
+    )
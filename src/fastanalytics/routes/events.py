@@ -1,30 +1,83 @@
 # mypy: disable-error-code=no-untyped-def
-
+import asyncio
 from typing import TYPE_CHECKING
 
 from fastapi import HTTPException, Request, status
+from fastapi import Response as HttpResponse
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
 from sqlalchemy.exc import SQLAlchemyError
-from sqlmodel import col, func, select
 
-from ..db import approximate_row_count
-from ..db.timescale.functions import time_bucket
-from ..depends import PageQuery, PageQueryAgg, Session
-from ..models import Event, is_numeric
+from ..config import constants
+from ..db import insert_events
+from ..db.pagination import page_rows
+from ..db.queries import (
+    AGGREGATE_KEYS,
+    EVENT_KEYS,
+    events_aggregate,
+    events_by_id,
+    events_count,
+    events_export,
+    events_page,
+)
+from ..db.top import add_counters, top_values
+from ..depends import (
+    AsyncSession,
+    EventsBatchBody,
+    ExportQueryParam,
+    PageQuery,
+    PageQueryAgg,
+    StreamQueryParam,
+    TopQueryParam,
+)
+from ..models import Event
 from ..schemas import (
     EventAggregate,
+    EventBatch,
     EventCreate,
     EventSchema,
-    Page,
+    EventTop,
     Response,
     ResponsePage,
     StatusEnum,
 )
+from ..schemas.events import EventAggregateRow, EventRow
+from ._events import (
+    COLUMNAR_RESPONSE,
+    EVENT_COLUMNS,
+    EXPORT_MEDIA_TYPES,
+    aggregate_columns,
+    aggregate_field,
+    aggregate_result,
+    aggregate_rows,
+    bad_request,
+    batch_values,
+    columnar_response,
+    count_events,
+    enqueue_event,
+    event_row,
+    event_values,
+    export_chunk,
+    export_header,
+    internal_error,
+    log_sql_error,
+    rows_response,
+    run_plan_async,
+    stream_message,
+    stream_page,
+    top_field,
+    top_result,
+    wants_columnar,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Hashable
     from typing import Any
 
-    from sqlalchemy.sql import SQLColumnExpression
+    from sqlalchemy import Select
+    from starlette.datastructures import State
+
+    from ..db.stream import Subscription
 
 router = APIRouter(tags=["events"])
 
@@ -34,43 +87,33 @@ router = APIRouter(tags=["events"])
     response_model_by_alias=True,
     response_model_exclude_none=True,
     response_model=ResponsePage[EventSchema],
+    responses=COLUMNAR_RESPONSE,
 )
-def read_events(request: Request, session: Session, page: PageQuery):
-    limit = page.page_size
-    offset = (page.page - 1) * limit
-    query = select(Event).limit(limit).offset(offset)
+async def read_events(request: Request, session: AsyncSession, page: PageQuery):
+    columnar = wants_columnar(request, page)
+    try:
+        query = events_page(page, as_rows=True)
+    except ValueError as e_val:
+        raise bad_request(str(e_val), page) from None
     try:
-        events = session.exec(query).all()
-        aprox_size = session.exec(select(approximate_row_count(Event))).one()
+        events, next_cursor = page_rows((await session.exec(query)).all(), EVENT_KEYS, page)
+        aprox_size = (await session.exec(events_count(page))).one()
     except SQLAlchemyError as e_sql:
-        request.state.logger.error(
-            "Datase error fetching events (Type=%s) (Msg=%s)",
-            type(e_sql).__name__,
-            e_sql._message(),
-            extra={
-                "sql_query": query.compile(
-                    bind=session.bind, compile_kwargs={"literal_binds": True}
-                )
-            },
+        log_sql_error(request, "Datase error fetching events", e_sql, query)
+        raise internal_error(page) from None
+    message = "Successfully retrieved the model #Events"
+    if columnar:
+        response = ResponsePage(
+            status=StatusEnum.success,
+            message=message,
+            total_records=aprox_size,
+            next_cursor=next_cursor,
+            page=page,
         )
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=ResponsePage(
-                status=StatusEnum.error,
-                message="Internal server error",
-                total_records=0,
-                page=Page.model_validate(page.model_dump()),
-            ).model_dump(exclude_none=True, exclude_unset=True),
-        ) from None
-    return ResponsePage(
-        results=events,
-        status=StatusEnum.success,
-        message="Successfully retrieved the model #Events",
-        total_records=aprox_size,
-        # TODO: passing the actual page query object gives a
-        # pydantic validation error indicating that the field is not
-        # a valid Page instance
-        page=Page.model_validate(page.model_dump()),
+        return columnar_response(response, events, EVENT_COLUMNS)
+    # The rows are already valid, skip the models of the response envelope
+    return rows_response(
+        EventRow, [event_row(event) for event in events], message, page, aprox_size, next_cursor
     )
 
 
@@ -80,97 +123,212 @@ def read_events(request: Request, session: Session, page: PageQuery):
     response_model_by_alias=True,
     response_model_exclude_none=True,
     response_model=ResponsePage[EventAggregate],
+    responses=COLUMNAR_RESPONSE,
 )
-def agg_events(
+async def agg_events(
     request: Request,
-    session: Session,
+    session: AsyncSession,
     field: str,
     page: PageQueryAgg,
 ):
-    field_name = EventSchema.field_by_alias(field)
-    if not field_name:
-        request.state.logger.warning("Invalid field for avg aggregation %s", field)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=ResponsePage(
-                status=StatusEnum.error,
-                message=f"Invalid field for aggregation: {field}",
-                page=Page.model_validate(page, from_attributes=True),
-            ).model_dump(exclude_none=True, exclude_unset=True),
-        )
-    if is_numeric(Event, field_name):
-        request.state.logger.warning("Numeric field for aggregation %s", field)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=ResponsePage(
-                status=StatusEnum.error,
-                message="It is only allowed to aggregate non-numeric fields",
-                page=Page.model_validate(page.model_dump()),
-            ).model_dump(exclude_none=True, exclude_unset=True),
-        )
-    col_field = col(getattr(Event, field_name))
-    limit = page.page_size
-    offset = (page.page - 1) * limit
-
-    bucket_interval = time_bucket(page.interval, col(Event.time)).label("interval")
-    columns: list[SQLColumnExpression[Any]] = [
-        bucket_interval,
-        col_field.label("field"),
-        func.count(col_field).label("count"),
-    ]
-    for agg in page.func:
-        if agg == "avg":
-            columns.append(func.avg(Event.duration).label("avg_duration"))
-        elif agg == "min":
-            columns.append(func.min(Event.duration).label("min_duration"))
-        elif agg == "max":
-            columns.append(func.max(Event.duration).label("max_duration"))
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=ResponsePage(
-                    status=StatusEnum.error,
-                    message=f"Unknow aggregation function {agg}",
-                    page=Page.model_validate(page.model_dump()),
-                ).model_dump(exclude_none=True, exclude_unset=True),
-            )
-    query = select(*columns).group_by(bucket_interval, col_field)
+    field_name = aggregate_field(request, field, page)
+    try:
+        query = events_aggregate(field_name, page)
+    except ValueError as e_val:
+        raise bad_request(str(e_val), page) from None
     try:
         # Intentionally use the execute method marked as deprecated
         # due to the SQLmodel sessions exec method convert the results
         # into tuples that cannot be interpreted as pydantic models
-        results = session.execute(query).all()
-        paged_results = [
-            EventAggregate(**result._asdict()) for result in results[offset : limit * page.page]
-        ]
+        rows, total_groups = await run_plan_async(
+            session, aggregate_rows(request.state, field_name, page, query)
+        )
+        results, next_cursor = page_rows(rows, AGGREGATE_KEYS, page)
     except SQLAlchemyError as e_sql:
-        request.state.logger.error(
-            "Datase error fetching event aggregates (Type=%s) (Msg=%s)",
-            type(e_sql).__name__,
-            e_sql._message(),
-            extra={
-                "sql_query": query.compile(
-                    bind=session.bind, compile_kwargs={"literal_binds": True}
-                )
-            },
+        log_sql_error(request, "Datase error fetching event aggregates", e_sql, query)
+        raise internal_error(page) from None
+    message = f"Aggregated #Event.{field}"
+    if wants_columnar(request, page):
+        response = ResponsePage(
+            status=StatusEnum.success,
+            message=message,
+            total_records=total_groups,
+            next_cursor=next_cursor,
+            page=page,
         )
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=ResponsePage(
-                status=StatusEnum.error,
-                message="Internal server error",
-                page=Page.model_validate(page.model_dump()),
-            ).model_dump(exclude_none=True, exclude_unset=True),
-        ) from None
-    return ResponsePage(
+        return columnar_response(response, results, aggregate_columns(page))
+    return rows_response(
+        EventAggregateRow,
+        [result._asdict() for result in results],
+        message,
+        page,
+        total_groups,
+        next_cursor,
+    )
+
+
+@router.get(
+    "/top/{field}",
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model=Response[EventTop],
+)
+async def top_events(request: Request, session: AsyncSession, field: str, query: TopQueryParam):
+    """Most frequent values of a field in the windows covering the time range,
+    by default the windows held in memory.
+
+    The windows held in memory are merged from their sketches without
+    touching the database, only the older windows are read from it. With
+    several workers every window is read from the database.
+    """
+    field_name = top_field(request, field)
+    heavy_hitters = request.state.heavy_hitters
+    start, end = heavy_hitters.time_range(query.start, query.end)
+    counters, held_from = heavy_hitters.counters(field_name, start, end)
+    if start < held_from:
+        statement = top_values(field_name, start, held_from, heavy_hitters.capacity)
+        try:
+            add_counters(counters, (await session.execute(statement)).all())
+        except SQLAlchemyError as e_sql:
+            log_sql_error(request, "Datase error fetching top values", e_sql, statement)
+            raise internal_error() from None
+    return Response(
+        result=top_result(field, start, end, counters, query.limit),
         status=StatusEnum.success,
-        message=f"Aggregated #Event.{field}",
-        results=paged_results,
-        total_records=len(results),
-        page=Page.model_validate(page.model_dump()),
+        message=f"Most frequent values of #Event.{field}",
     )
 
 
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()},
+            "description": "Events streamed as NDJSON or CSV",
+        }
+    },
+)
+async def export_events(request: Request, export: ExportQueryParam):
+    """Stream the events matching the filters, sorted by time, without a limit.
+
+    The rows are fetched from a server-side cursor in batches, so the memory
+    used does not depend on the number of events exported, and the export
+    stops as soon as the client disconnects.
+    """
+    query = events_export(export).execution_options(yield_per=constants.EVENTS_EXPORT_BATCH)
+    chunks = _export_chunks(request, query, export.format)
+    try:
+        # Open the cursor before answering, so a failing query is still a 500
+        header = await anext(chunks)
+    except SQLAlchemyError as e_sql:
+        log_sql_error(request, "Datase error exporting events", e_sql, query)
+        raise internal_error() from None
+    return StreamingResponse(
+        _prepend(header, chunks),
+        media_type=EXPORT_MEDIA_TYPES[export.format],
+        headers={"Content-Disposition": f'attachment; filename="events.{export.format}"'},
+    )
+
+
+async def _export_chunks(
+    request: Request, query: "Select[Any]", export_format: str
+) -> "AsyncIterator[str]":
+    """Header and batches of an export, the session is owned by the stream
+    and closed with it as the response outlives the request dependencies"""
+    async with request.state.async_session_factory() as session:
+        result = await session.stream(query)
+        yield export_header(export_format)
+        exported = 0
+        async for rows in result.partitions():
+            if await request.is_disconnected():
+                request.state.logger.info(
+                    "Client disconnected, export stopped after %d events", exported
+                )
+                return
+            exported += len(rows)
+            yield export_chunk(rows, export_format)
+        request.state.logger.info("Exported %d events", exported)
+
+
+async def _prepend(first: str, chunks: "AsyncIterator[str]") -> "AsyncIterator[str]":
+    if first:
+        yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+@router.get(
+    "/stream",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"text/event-stream": {}},
+            "description": "Server-sent `snapshot` and `update` events with the "
+            "aggregated groups of the open bucket",
+        }
+    },
+)
+async def stream_events(request: Request, query: StreamQueryParam):
+    """Stream the aggregated groups of the open bucket of `interval` as they change.
+
+    The first event is a `snapshot` of every group, the next ones `update`
+    events with the groups that changed since. The groups are computed once
+    per `STREAM__INTERVAL` for every client of the same field, interval and
+    functions, a client too slow to read them is disconnected.
+    """
+    page = stream_page(query)
+    field_name = aggregate_field(request, query.field, page)
+    try:
+        events_aggregate(field_name, page)
+    except ValueError as e_val:
+        raise bad_request(str(e_val), page) from None
+    state = request.state
+
+    async def fetch() -> "dict[Hashable, dict[str, Any]]":
+        # The open bucket moves on with the time
+        bucket = stream_page(query)
+        async with state.async_session_factory() as session:
+            rows, _ = await run_plan_async(
+                session,
+                aggregate_rows(state, field_name, bucket, events_aggregate(field_name, bucket)),
+            )
+        return {
+            (row.interval, row.field_key): aggregate_result(row).model_dump(
+                mode="json", by_alias=True, exclude_none=True
+            )
+            for row in rows[: bucket.page_size]
+        }
+
+    key = (field_name, page.interval, tuple(sorted(set(page.func))))
+    subscription = state.stream_hub.subscribe(key, fetch)
+    return StreamingResponse(
+        _stream_messages(state, key, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_messages(
+    state: "State", key: "Hashable", subscription: "Subscription"
+) -> "AsyncIterator[str]":
+    """Messages of a client until it disconnects or it is dropped"""
+    hub = state.stream_hub
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), hub.keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield stream_message(*message)
+    finally:
+        hub.unsubscribe(key, subscription)
+
+
 @router.get(
     "/{event_id}",
     status_code=status.HTTP_200_OK,
@@ -178,8 +336,8 @@ def agg_events(
     response_model_exclude_none=True,
     response_model=Response[EventSchema],
 )
-def find_event(request: Request, session: Session, event_id: int):
-    event = session.exec(select(Event).where(Event.id == event_id)).first()
+async def find_event(request: Request, session: AsyncSession, event_id: int):
+    event = (await session.exec(events_by_id(event_id))).first()
     if not event:
         request.state.logger.warning("Event with id %s not found", event_id)
         raise HTTPException(
@@ -187,7 +345,7 @@ def find_event(request: Request, session: Session, event_id: int):
             detail=Response(
                 status=StatusEnum.error,
                 message=f"Event with id {event_id} not found",
-            ),
+            ).model_dump(exclude_none=True, exclude_unset=True),
         )
     return Response(
         result=event,
@@ -204,32 +362,81 @@ def find_event(request: Request, session: Session, event_id: int):
     response_model_exclude_none=True,
     response_model_exclude_unset=True,
     name="Create single event",
+    responses={
+        status.HTTP_202_ACCEPTED: {"description": "Event queued by the write-behind buffer"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Write-behind buffer is full"},
+    },
 )
-def create_event(request: Request, session: Session, payload: EventCreate):
-    raw_obj = payload.model_dump()
-    raw_obj["referrer"] = str(raw_obj["referrer"]) if raw_obj["referrer"] else None
-    db_obj = Event.model_validate(raw_obj)
+async def create_event(
+    request: Request, response: HttpResponse, session: AsyncSession, payload: EventCreate
+):
+    ingest_buffer = request.state.ingest_buffer
+    if ingest_buffer is not None:
+        return enqueue_event(request, response, ingest_buffer, payload)
+    values = event_values(payload)
+    db_obj = Event.model_validate(values)
     try:
         session.add(db_obj)
-        session.commit()
-        session.refresh(db_obj)
+        await session.commit()
+        await session.refresh(db_obj)
     except SQLAlchemyError as e_sql:
-        session.rollback()
+        await session.rollback()
         request.state.logger.exception(
             # TODO: Add a correlational middleware to have a request ID
             "Database error: processing request ...",
             # request.headers.get(constants.REQ_ID_HEADER),
             exc_info=e_sql,
         )
+        raise internal_error() from None
+    count_events(request, [values], [db_obj.time])
+    return Response(
+        result=db_obj,
+        status=StatusEnum.success,
+        message="Event created successfully",
+    )
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_201_CREATED,
+    response_model=Response[EventBatch],
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    name="Create events in bulk",
+)
+async def create_events(request: Request, session: AsyncSession, payload: EventsBatchBody):
+    """Validate each event of the batch on its own and insert all the valid ones
+    in a single transaction, the invalid items are reported in `errors` by index"""
+    rows, errors = batch_values(payload)
+    if not rows:
+        request.state.logger.warning("Batch of %d events without valid items", len(payload))
         raise HTTPException(
-            status_code=500,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=Response(
                 status=StatusEnum.error,
-                message="Internal server error",
+                message="None of the events in the batch is valid",
+                errors=errors,
             ).model_dump(exclude_none=True, exclude_unset=True),
-        ) from None
+        )
+    try:
+        keys = await session.run_sync(insert_events, rows)
+        await session.commit()
+    except SQLAlchemyError as e_sql:
+        await session.rollback()
+        request.state.logger.exception(
+            "Database error: inserting batch of %d events",
+            len(rows),
+            exc_info=e_sql,
+        )
+        raise internal_error() from None
+    count_events(request, rows, [time for _, time in keys])
     return Response(
-        result=db_obj,
+        result=EventBatch(
+            accepted=len(keys),
+            rejected=len(payload) - len(rows),
+            ids=[event_id for event_id, _ in keys],
+        ),
         status=StatusEnum.success,
-        message="Event created successfully",
+        message=f"Created {len(keys)} of {len(payload)} events",
+        errors=errors or None,
     )
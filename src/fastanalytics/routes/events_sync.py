@@ -0,0 +1,262 @@
+# mypy: disable-error-code=no-untyped-def
+"""Threadpool version of the events routes using a sync session, mounted
+under `/sync/events` to benchmark it against the asyncio routes"""
+
+from fastapi import HTTPException, Request, status
+from fastapi import Response as HttpResponse
+from fastapi.routing import APIRouter
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import insert_events
+from ..db.pagination import page_rows
+from ..db.queries import (
+    AGGREGATE_KEYS,
+    EVENT_KEYS,
+    events_aggregate,
+    events_by_id,
+    events_count,
+    events_page,
+)
+from ..db.top import add_counters, top_values
+from ..depends import EventsBatchBody, PageQuery, PageQueryAgg, Session, TopQueryParam
+from ..models import Event
+from ..schemas import (
+    EventAggregate,
+    EventBatch,
+    EventCreate,
+    EventSchema,
+    EventTop,
+    Response,
+    ResponsePage,
+    StatusEnum,
+)
+from ._events import (
+    COLUMNAR_RESPONSE,
+    EVENT_COLUMNS,
+    aggregate_columns,
+    aggregate_field,
+    aggregate_result,
+    aggregate_rows,
+    bad_request,
+    batch_values,
+    columnar_response,
+    count_events,
+    enqueue_event,
+    event_values,
+    internal_error,
+    log_sql_error,
+    run_plan,
+    top_field,
+    top_result,
+    wants_columnar,
+)
+
+router = APIRouter(tags=["events-sync"])
+
+
+@router.get(
+    "",
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model=ResponsePage[EventSchema],
+    responses=COLUMNAR_RESPONSE,
+)
+def read_events(request: Request, session: Session, page: PageQuery):
+    columnar = wants_columnar(request, page)
+    try:
+        query = events_page(page, as_rows=columnar)
+    except ValueError as e_val:
+        raise bad_request(str(e_val), page) from None
+    try:
+        events, next_cursor = page_rows(session.exec(query).all(), EVENT_KEYS, page)
+        aprox_size = session.exec(events_count(page)).one()
+    except SQLAlchemyError as e_sql:
+        log_sql_error(request, "Datase error fetching events", e_sql, query)
+        raise internal_error(page) from None
+    response = ResponsePage(
+        results=None if columnar else events,
+        status=StatusEnum.success,
+        message="Successfully retrieved the model #Events",
+        total_records=aprox_size,
+        next_cursor=next_cursor,
+        page=page,
+    )
+    if columnar:
+        return columnar_response(response, events, EVENT_COLUMNS)
+    return response
+
+
+@router.get(
+    "/aggregate/{field}",
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model=ResponsePage[EventAggregate],
+    responses=COLUMNAR_RESPONSE,
+)
+def agg_events(
+    request: Request,
+    session: Session,
+    field: str,
+    page: PageQueryAgg,
+):
+    field_name = aggregate_field(request, field, page)
+    try:
+        query = events_aggregate(field_name, page)
+    except ValueError as e_val:
+        raise bad_request(str(e_val), page) from None
+    try:
+        # Intentionally use the execute method marked as deprecated
+        # due to the SQLmodel sessions exec method convert the results
+        # into tuples that cannot be interpreted as pydantic models
+        rows, total_groups = run_plan(
+            session, aggregate_rows(request.state, field_name, page, query)
+        )
+        results, next_cursor = page_rows(rows, AGGREGATE_KEYS, page)
+    except SQLAlchemyError as e_sql:
+        log_sql_error(request, "Datase error fetching event aggregates", e_sql, query)
+        raise internal_error(page) from None
+    columnar = wants_columnar(request, page)
+    response = ResponsePage(
+        status=StatusEnum.success,
+        message=f"Aggregated #Event.{field}",
+        results=None if columnar else [aggregate_result(result) for result in results],
+        total_records=total_groups,
+        next_cursor=next_cursor,
+        page=page,
+    )
+    if columnar:
+        return columnar_response(response, results, aggregate_columns(page))
+    return response
+
+
+@router.get(
+    "/top/{field}",
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model=Response[EventTop],
+)
+def top_events(request: Request, session: Session, field: str, query: TopQueryParam):
+    field_name = top_field(request, field)
+    heavy_hitters = request.state.heavy_hitters
+    start, end = heavy_hitters.time_range(query.start, query.end)
+    counters, held_from = heavy_hitters.counters(field_name, start, end)
+    if start < held_from:
+        statement = top_values(field_name, start, held_from, heavy_hitters.capacity)
+        try:
+            add_counters(counters, session.execute(statement).all())
+        except SQLAlchemyError as e_sql:
+            log_sql_error(request, "Datase error fetching top values", e_sql, statement)
+            raise internal_error() from None
+    return Response(
+        result=top_result(field, start, end, counters, query.limit),
+        status=StatusEnum.success,
+        message=f"Most frequent values of #Event.{field}",
+    )
+
+
+@router.get(
+    "/{event_id}",
+    status_code=status.HTTP_200_OK,
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model=Response[EventSchema],
+)
+def find_event(request: Request, session: Session, event_id: int):
+    event = session.exec(events_by_id(event_id)).first()
+    if not event:
+        request.state.logger.warning("Event with id %s not found", event_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=Response(
+                status=StatusEnum.error,
+                message=f"Event with id {event_id} not found",
+            ).model_dump(exclude_none=True, exclude_unset=True),
+        )
+    return Response(
+        result=event,
+        status=StatusEnum.success,
+        message="Processed successfully",
+    )
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    response_model=Response[EventSchema],
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    response_model_exclude_unset=True,
+    name="Create single event",
+    responses={
+        status.HTTP_202_ACCEPTED: {"description": "Event queued by the write-behind buffer"},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Write-behind buffer is full"},
+    },
+)
+def create_event(request: Request, response: HttpResponse, session: Session, payload: EventCreate):
+    ingest_buffer = request.state.ingest_buffer
+    if ingest_buffer is not None:
+        return enqueue_event(request, response, ingest_buffer, payload)
+    values = event_values(payload)
+    db_obj = Event.model_validate(values)
+    try:
+        session.add(db_obj)
+        session.commit()
+        session.refresh(db_obj)
+    except SQLAlchemyError as e_sql:
+        session.rollback()
+        request.state.logger.exception("Database error: processing request ...", exc_info=e_sql)
+        raise internal_error() from None
+    count_events(request, [values], [db_obj.time])
+    return Response(
+        result=db_obj,
+        status=StatusEnum.success,
+        message="Event created successfully",
+    )
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_201_CREATED,
+    response_model=Response[EventBatch],
+    response_model_by_alias=True,
+    response_model_exclude_none=True,
+    name="Create events in bulk",
+)
+def create_events(request: Request, session: Session, payload: EventsBatchBody):
+    """Validate each event of the batch on its own and insert all the valid ones
+    in a single transaction, the invalid items are reported in `errors` by index"""
+    rows, errors = batch_values(payload)
+    if not rows:
+        request.state.logger.warning("Batch of %d events without valid items", len(payload))
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=Response(
+                status=StatusEnum.error,
+                message="None of the events in the batch is valid",
+                errors=errors,
+            ).model_dump(exclude_none=True, exclude_unset=True),
+        )
+    try:
+        keys = insert_events(session, rows)
+        session.commit()
+    except SQLAlchemyError as e_sql:
+        session.rollback()
+        request.state.logger.exception(
+            "Database error: inserting batch of %d events",
+            len(rows),
+            exc_info=e_sql,
+        )
+        raise internal_error() from None
+    count_events(request, rows, [time for _, time in keys])
+    return Response(
+        result=EventBatch(
+            accepted=len(keys),
+            rejected=len(payload) - len(rows),
+            ids=[event_id for event_id, _ in keys],
+        ),
+        status=StatusEnum.success,
+        message=f"Created {len(keys)} of {len(payload)} events",
+        errors=errors or None,
+    )
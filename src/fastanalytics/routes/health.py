@@ -1,6 +1,12 @@
 # mypy: disable-error-code=no-untyped-def
 
 from fastapi import Request
+from fastapi.responses import PlainTextResponse
+
+from ..middleware import request_metrics
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
 
 def health_check(request: Request):
@@ -9,3 +15,10 @@ def health_check(request: Request):
     # the status of the database and the usage of the service itself.
     request.state.logger.debug("Call of the health check")
     return {"status": "ok", "message": "All working fine"}
+
+
+def metrics():
+    """Request rate, errors and latency histograms by route in the Prometheus
+    text format, e.g. p95 with `histogram_quantile(0.95, sum by (route, le)
+    (rate(http_request_duration_seconds_bucket[5m])))`"""
+    return PlainTextResponse(request_metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
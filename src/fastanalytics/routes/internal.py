@@ -0,0 +1,72 @@
+# mypy: disable-error-code=no-untyped-def
+
+from typing import Annotated
+
+from fastapi import Query, Request
+from fastapi.routing import APIRouter
+
+from ..db import pool_stats, query_recorder
+from ..schemas import CacheStats, IngestStats, PoolStats, QueryStats, StreamStats
+
+router = APIRouter(tags=["internal"])
+
+
+@router.get(
+    "/ingest",
+    response_model=IngestStats,
+    response_model_by_alias=True,
+)
+def ingest_stats(request: Request):
+    """Queue depth and flush latency of the write-behind ingest buffer"""
+    ingest_buffer = request.state.ingest_buffer
+    if ingest_buffer is None:
+        return IngestStats(enabled=False)
+    return ingest_buffer.stats()
+
+
+@router.get(
+    "/pool",
+    response_model=dict[str, PoolStats | None],
+    response_model_by_alias=True,
+)
+def pool_usage(request: Request):
+    """Checked out connections, overflow and checkout waits of the connection pools,
+    the time spent opening connections left out of the waits"""
+    return {
+        "async": pool_stats(request.state.async_engine),
+        "sync": pool_stats(request.state.engine),
+    }
+
+
+@router.get(
+    "/cache",
+    response_model=CacheStats,
+    response_model_by_alias=True,
+)
+def cache_stats(request: Request):
+    """Hits, misses, evictions and memory of the cache of aggregate results"""
+    aggregate_cache = request.state.aggregate_cache
+    if aggregate_cache is None:
+        return CacheStats(enabled=False)
+    return aggregate_cache.stats()
+
+
+@router.get(
+    "/stream",
+    response_model=StreamStats,
+    response_model_by_alias=True,
+)
+def stream_stats(request: Request):
+    """Producers, clients and dropped clients of the live aggregate streams"""
+    return request.state.stream_hub.stats()
+
+
+@router.get(
+    "/queries",
+    response_model=list[QueryStats],
+    response_model_by_alias=True,
+)
+def query_stats(limit: Annotated[int, Query(ge=1)] = 50):
+    """Latency histograms of the SQL statements by query shape, the shapes
+    with the highest total time first"""
+    return query_recorder.stats(limit)
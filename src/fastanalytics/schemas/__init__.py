@@ -1,7 +1,8 @@
 from .events import Event as EventSchema
-from .events import EventAggregate, EventCreate
+from .events import EventAggregate, EventBatch, EventCreate, EventTop
 from .queries import Page as Page
 from .responses import Response, ResponsePage, StatusEnum
+from .stats import CacheStats, IngestStats, PoolStats, QueryStats, StreamStats
 
 __all__ = [
     "Response",
@@ -11,4 +12,11 @@ __all__ = [
     "Page",
     "StatusEnum",
     "EventAggregate",
+    "EventBatch",
+    "EventTop",
+    "IngestStats",
+    "PoolStats",
+    "CacheStats",
+    "QueryStats",
+    "StreamStats",
 ]
@@ -2,8 +2,19 @@ import uuid
 from datetime import datetime
 from typing import Annotated, Any
 
-from pydantic import AnyHttpUrl, Field, IPvAnyAddress, NonNegativeFloat
+from pydantic import (
+    AliasGenerator,
+    AnyHttpUrl,
+    ConfigDict,
+    Field,
+    IPvAnyAddress,
+    NonNegativeFloat,
+    NonNegativeInt,
+    with_config,
+)
+from pydantic.alias_generators import to_camel
 from pydantic.types import StringConstraints
+from typing_extensions import NotRequired, TypedDict
 
 from .._types import Page
 from ..utils import get_utc_now
@@ -17,6 +28,30 @@ class EventAggregate(Base):
     avg_duration: NonNegativeFloat | None = None
     min_duration: NonNegativeFloat | None = None
     max_duration: NonNegativeFloat | None = None
+    # Unique sessions and percentiles of the duration of the group,
+    # estimated unless computed with `exact`
+    uniques: NonNegativeInt | None = None
+    p50_duration: NonNegativeFloat | None = None
+    p90_duration: NonNegativeFloat | None = None
+    p99_duration: NonNegativeFloat | None = None
+
+
+class TopValue(Base):
+    # Value of the field as text, an empty string for the events without it
+    value: str
+    # Upper bound of the number of events with the value, the true number is
+    # at least `count - error`
+    count: NonNegativeInt
+    error: NonNegativeInt
+
+
+class EventTop(Base):
+    """Most frequent values of a field in a time range. i.e. GET /events/top/{field}"""
+
+    field: str
+    start: datetime
+    end: datetime
+    values: list[TopValue]
 
 
 class EventCreate(Base):
@@ -35,3 +70,46 @@ class Event(EventCreate):
 
     id: int
     time: datetime = Field(default_factory=get_utc_now)
+
+
+class EventBatch(Base):
+    """Summary of a bulk insertion of events. i.e. POST /events/batch"""
+
+    accepted: int
+    rejected: int
+    ids: list[int]
+
+
+# Rows read from the database are already valid, the typed dicts below only
+# describe how to serialize them with the same output of their models
+_ROW_CONFIG = ConfigDict(alias_generator=AliasGenerator(serialization_alias=to_camel))
+
+
+@with_config(_ROW_CONFIG)
+class EventRow(TypedDict):
+    """Serialization of a row of the events table, same output as `Event`"""
+
+    page: str
+    agent: str
+    ip_address: IPvAnyAddress
+    referrer: str | None
+    session_id: uuid.UUID
+    duration: float
+    id: int
+    time: datetime
+
+
+@with_config(_ROW_CONFIG)
+class EventAggregateRow(TypedDict):
+    """Serialization of a row of the aggregated events, same output as `EventAggregate`"""
+
+    field: Any
+    interval: datetime
+    count: int
+    avg_duration: NotRequired[float | None]
+    min_duration: NotRequired[float | None]
+    max_duration: NotRequired[float | None]
+    uniques: NotRequired[int | None]
+    p50_duration: NotRequired[float | None]
+    p90_duration: NotRequired[float | None]
+    p99_duration: NotRequired[float | None]
@@ -1,16 +1,39 @@
+import uuid
+from datetime import datetime, timedelta, timezone
 from typing import Annotated, Literal
 
-from pydantic import ConfigDict, Field, NonNegativeInt, PositiveInt
+from pydantic import (
+    ConfigDict,
+    Field,
+    IPvAnyNetwork,
+    NonNegativeInt,
+    PositiveInt,
+    StringConstraints,
+    field_validator,
+    model_validator,
+)
 from pydantic.alias_generators import to_camel, to_snake
 
 from ._base import Base
 
 PageLimit = Annotated[PositiveInt, Field(ge=1, le=1000)]
 PageOffset = Annotated[PositiveInt, Field(default=1)]
-AggFunction = Literal["avg", "min", "max"]
+AggFunction = Literal["avg", "min", "max", "uniques", "p50", "p90", "p99"]
+SortOrder = Literal["asc", "desc"]
+# Longest time range of an exact aggregation of `uniques` and the percentiles
+EXACT_UNIQUES_MAX_RANGE = timedelta(days=1)
+ExportFormat = Literal["ndjson", "csv"]
+ResponseFormat = Literal["rows", "columnar"]
+# Cursors are base64 encoded and case sensitive, opt out of `str_to_lower`
+Cursor = Annotated[str, StringConstraints(to_lower=False)]
+# Paths and URLs are case sensitive as well
+PagePath = Annotated[str, StringConstraints(pattern=r"^/.*$", to_lower=False)]
+Referrer = Annotated[str, StringConstraints(to_lower=False)]
+# Aliases of the fields are camel case
+FieldAlias = Annotated[str, StringConstraints(to_lower=False)]
 
 
-class Page(Base):
+class _Pagination(Base):
     model_config = ConfigDict(
         alias_generator=to_snake,
         title="Pagination Query",
@@ -20,11 +43,125 @@ class Page(Base):
 
     page_size: PageLimit = 500
     page: PageOffset = 1
+    cursor: Cursor | None = Field(
+        default=None,
+        description="Opaque cursor of the next page returned in the pagination metadata, "
+        "when it is given `page` is ignored",
+    )
+    order: SortOrder = "desc"
+
+
+class TimeRange(Base):
+    model_config = ConfigDict(
+        alias_generator=to_snake,
+        title="Time Range Query",
+        extra="ignore",
+        validate_by_name=True,
+    )
+
+    start: datetime | None = Field(
+        default=None,
+        description="Only events at or after this time, UTC when it has no timezone",
+    )
+    end: datetime | None = Field(
+        default=None,
+        description="Only events before this time, UTC when it has no timezone",
+    )
+
+    @field_validator("start", "end", mode="after")
+    @classmethod
+    def has_timezone(cls, value: datetime | None) -> datetime | None:
+        if value is not None and (value.tzinfo is None or value.tzinfo.utcoffset(value) is None):
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+    @model_validator(mode="after")
+    def validate_range(self) -> "TimeRange":
+        if self.start is not None and self.end is not None and self.start >= self.end:
+            raise ValueError("The start of the time range must be before its end")
+        return self
+
+
+class EventFilters(TimeRange):
+    model_config = ConfigDict(title="Events Filters Query")
+
+    page_path: list[PagePath] | None = Field(
+        default=None,
+        description="Only events of any of these pages",
+        examples=[["/home", "/pricing"]],
+    )
+    session_id: list[uuid.UUID] | None = Field(
+        default=None,
+        description="Only events of any of these sessions",
+    )
+    referrer: list[Referrer] | None = Field(
+        default=None,
+        description="Only events with any of these referrers",
+    )
+    ip_address: list[IPvAnyNetwork] | None = Field(
+        default=None,
+        description="Only events with an IP address in any of these networks (CIDR), "
+        "a single address matches only itself",
+        examples=[["10.0.0.0/8", "192.168.1.10"]],
+    )
+
+
+class Page(_Pagination, EventFilters):
+    model_config = ConfigDict(title="Pagination Query")
+
+    format: ResponseFormat = Field(
+        default="rows",
+        description="`rows` returns a list of objects, `columnar` an object of "
+        "`{column: [values...]}` (also selected with the columnar `Accept` media type)",
+    )
+
+
+class ExportQuery(EventFilters):
+    model_config = ConfigDict(title="Export Query")
+
+    format: ExportFormat = Field(
+        default="ndjson",
+        description="`ndjson` streams an event per line as JSON, `csv` a header and a row per event",
+    )
+    order: SortOrder = "asc"
+
+
+class TopQuery(TimeRange):
+    model_config = ConfigDict(title="Top Values Query")
+
+    limit: int = Field(default=10, ge=1, le=100, description="Number of the most frequent values")
+
+
+class StreamQuery(Base):
+    model_config = ConfigDict(
+        alias_generator=to_snake,
+        title="Stream Query",
+        extra="ignore",
+        validate_by_name=True,
+        str_to_lower=True,
+    )
+
+    field: FieldAlias = Field(
+        description="Field to aggregate by, as named in the events", examples=["page"]
+    )
+    interval: str = Field(
+        default="1 minute",
+        description="Aggregation interval of the buckets, the groups of the latest one are streamed",
+        pattern=r"^\d+\s+(second|seconds|minute|minutes|hour|hours|day|days|week|weeks)$",
+    )
+    func: list[AggFunction] = Field(
+        default=["avg"],
+        description="List of aggregation functions to apply over the interval, as in "
+        "`/events/aggregate/{field}`",
+        min_length=1,
+    )
 
 
 class PageAggregate(Page):
     model_config = ConfigDict(str_to_lower=True)
 
+    order: SortOrder = "asc"
+
     interval: str = Field(
         default="1 hour",
         description="Aggregation interval used for grouping over time",
@@ -32,13 +169,31 @@ class PageAggregate(Page):
     )
     func: list[AggFunction] = Field(
         default=["avg"],
-        description="List of aggregation functions to apply over the interval",
+        description="List of aggregation functions to apply over the interval, `avg`, "
+        "`min`, `max` and the percentiles `p50`, `p90` and `p99` of the duration and "
+        "`uniques` (number of unique sessions)",
         min_length=1,
-        examples=[["avg"], ["min", "count", "max"]],
+        examples=[["avg"], ["min", "count", "max"], ["uniques", "p50", "p99"]],
+    )
+    exact: bool = Field(
+        default=False,
+        description="Compute `uniques` and the percentiles exactly from the raw events "
+        "instead of estimating them from the sketches, only for a time range of at "
+        "most a day",
     )
 
+    @model_validator(mode="after")
+    def validate_exact(self) -> "PageAggregate":
+        if self.exact and (
+            self.start is None
+            or self.end is None
+            or self.end - self.start > EXACT_UNIQUES_MAX_RANGE
+        ):
+            raise ValueError("The exact aggregations need a time range of at most a day")
+        return self
+
 
-class PageMetaData(Page):
+class PageMetaData(_Pagination):
     model_config = ConfigDict(
         title="Pagination Meta Data",
         alias_generator=to_camel,
@@ -47,3 +202,4 @@ class PageMetaData(Page):
 
     total_records: NonNegativeInt
     total_pages: NonNegativeInt
+    next_cursor: str | None = None
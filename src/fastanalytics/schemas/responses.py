@@ -1,16 +1,20 @@
 from collections.abc import Sequence
 from enum import Enum
-from typing import Annotated, Generic, TypeVar
+from functools import cache
+from typing import Annotated, Any, Generic, TypeVar
 
-from pydantic import BaseModel, ConfigDict, Field, NonNegativeInt, model_validator
+from pydantic import BaseModel, ConfigDict, Field, NonNegativeInt, TypeAdapter, model_validator
+from typing_extensions import TypedDict
 
 from ._base import Base
 from .queries import Page, PageMetaData
 
 _TModel = TypeVar("_TModel", bound=BaseModel)
+_TRow = TypeVar("_TRow")
 _ExcludedStatus = Annotated["StatusEnum", Field(exclude=True)]
 _ExcludedMessage = Annotated[str, Field(exclude=True)]
 _ExcludedNonNegativeInt = Annotated[NonNegativeInt, Field(exclude=True)]
+_ExcludedCursor = Annotated[str | None, Field(exclude=True)]
 
 
 class StatusEnum(str, Enum):
@@ -50,21 +54,72 @@ class ResponsePage(_Envelope, Generic[_TModel]):
 
     results: Sequence[_TModel] | None = None
     total_records: _ExcludedNonNegativeInt = Field(default=0)
+    next_cursor: _ExcludedCursor = None
     page: Annotated[Page, Field(exclude=True)]
 
     @model_validator(mode="after")
     def validate_meta(self) -> "ResponsePage[_TModel]":
-        total_pages = (self.total_records // self.page.page_size) + (
-            1 if self.total_records % self.page.page_size > 0 else 0
-        )
-        self.metadata = MetaData(
-            status=self.status,
-            message=self.message,
-            pagination=PageMetaData(
-                total_records=self.total_records,
-                page=self.page.page,
-                total_pages=total_pages,
-                page_size=self.page.page_size,
-            ),
+        self.metadata = page_metadata(
+            self.status, self.message, self.page, self.total_records, self.next_cursor
         )
         return self
+
+
+def page_metadata(
+    status: StatusEnum,
+    message: str,
+    page: Page,
+    total_records: int,
+    next_cursor: str | None = None,
+) -> MetaData:
+    """Metadata of a page of results with its pagination"""
+    total_pages = (total_records // page.page_size) + (
+        1 if total_records % page.page_size > 0 else 0
+    )
+    return MetaData(
+        status=status,
+        message=message,
+        pagination=PageMetaData(
+            total_records=total_records,
+            page=page.page,
+            total_pages=total_pages,
+            page_size=page.page_size,
+            order=page.order,
+            next_cursor=next_cursor,
+        ),
+    )
+
+
+class _PageBody(TypedDict, Generic[_TRow]):
+    metadata: MetaData
+    results: list[_TRow]
+
+
+@cache
+def _page_serializer(row_type: type) -> TypeAdapter[_PageBody[Any]]:
+    return TypeAdapter(_PageBody[row_type])  # type: ignore[valid-type]
+
+
+def dump_page(
+    row_type: type,
+    rows: Sequence[Any],
+    *,
+    status: StatusEnum,
+    message: str,
+    page: Page,
+    total_records: int,
+    next_cursor: str | None = None,
+) -> bytes:
+    """JSON body of a page of rows, same as the one of `ResponsePage`
+
+    The rows come from the database and are not validated again, they are
+    dumped straight to bytes by the serializer of `row_type`, a typed dict
+    of the row, built once per type.
+    """
+    body: _PageBody[Any] = {
+        "metadata": page_metadata(status, message, page, total_records, next_cursor),
+        "results": list(rows),
+    }
+    return _page_serializer(row_type).dump_json(
+        body, by_alias=True, exclude_none=True, fallback=str
+    )
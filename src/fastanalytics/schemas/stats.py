@@ -0,0 +1,75 @@
+from pydantic import NonNegativeFloat, NonNegativeInt
+
+from ._base import Base
+
+
+class IngestStats(Base):
+    """Counters of the write-behind buffer of POST /events"""
+
+    enabled: bool
+    depth: NonNegativeInt = 0
+    capacity: NonNegativeInt = 0
+    accepted: NonNegativeInt = 0
+    rejected: NonNegativeInt = 0
+    flushed: NonNegativeInt = 0
+    failed: NonNegativeInt = 0
+    flushes: NonNegativeInt = 0
+    last_flush_seconds: NonNegativeFloat = 0.0
+    max_flush_seconds: NonNegativeFloat = 0.0
+    total_flush_seconds: NonNegativeFloat = 0.0
+
+
+class PoolStats(Base):
+    """Usage of the connection pool of an engine"""
+
+    pool_size: NonNegativeInt
+    max_overflow: int
+    checked_out: NonNegativeInt
+    checked_in: NonNegativeInt
+    overflow: NonNegativeInt
+    checkouts: NonNegativeInt = 0
+    timeouts: NonNegativeInt = 0
+    wait_seconds_total: NonNegativeFloat = 0.0
+    wait_seconds_max: NonNegativeFloat = 0.0
+
+
+class CacheStats(Base):
+    """Usage of the in-process cache of aggregate results"""
+
+    enabled: bool
+    entries: NonNegativeInt = 0
+    max_entries: NonNegativeInt = 0
+    bytes: NonNegativeInt = 0
+    max_bytes: NonNegativeInt = 0
+    ttl_seconds: NonNegativeFloat = 0.0
+    hits: NonNegativeInt = 0
+    misses: NonNegativeInt = 0
+    evictions: NonNegativeInt = 0
+    expirations: NonNegativeInt = 0
+
+
+class QueryStats(Base):
+    """Latency of the executions of a query shape"""
+
+    statement: str
+    calls: NonNegativeInt
+    errors: NonNegativeInt = 0
+    total_ms: NonNegativeFloat = 0.0
+    mean_ms: NonNegativeFloat = 0.0
+    max_ms: NonNegativeFloat = 0.0
+    # Upper bound of the bucket of the histogram holding the percentile
+    p50_ms: NonNegativeFloat = 0.0
+    p95_ms: NonNegativeFloat = 0.0
+    p99_ms: NonNegativeFloat = 0.0
+    # Executions by upper bound in milliseconds of the buckets
+    buckets: dict[str, NonNegativeInt] = {}
+
+
+class StreamStats(Base):
+    """Producers and clients of the live aggregate streams"""
+
+    producers: NonNegativeInt = 0
+    subscribers: NonNegativeInt = 0
+    # Messages queued to the clients, and clients dropped as their queue was full
+    published: NonNegativeInt = 0
+    dropped: NonNegativeInt = 0
@@ -0,0 +1,7 @@
+"""Probabilistic sketches of the events, small summaries that can be merged"""
+
+from .ddsketch import DDSketch
+from .hll import HyperLogLog
+from .space_saving import SpaceSaving
+
+__all__ = ["DDSketch", "HyperLogLog", "SpaceSaving"]
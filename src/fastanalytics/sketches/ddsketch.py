@@ -0,0 +1,85 @@
+"""DDSketch of a distribution of non-negative values, for its quantiles
+
+The values are counted in bins of geometrically growing width, the bin `i`
+holds the values in `(MIN_VALUE * GAMMA ** (i - 1), MIN_VALUE * GAMMA ** i]`
+with `GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)`, so a
+quantile answered with the midpoint of its bin is within
+`RELATIVE_ACCURACY` (1%) of the exact one whatever the distribution. The
+values up to `MIN_VALUE` are counted in the bin 0 and answered as 0.
+
+Sketches are merged by adding the counts of their bins, without any loss: a
+merged sketch answers the same as the sketch of all the values. Only the
+bins with values are kept, at most about 115 per decade of values.
+"""
+
+import math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+
+RELATIVE_ACCURACY = 0.01
+MIN_VALUE = 1e-3
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+
+_LOG_GAMMA = math.log(GAMMA)
+
+
+def bin_index(value: float) -> int:
+    if value <= MIN_VALUE:
+        return 0
+    return max(math.ceil(math.log(value / MIN_VALUE) / _LOG_GAMMA), 1)
+
+
+def bin_value(index: int) -> float:
+    """Value answered for the bin, the one with the lowest relative error to both of its bounds"""
+    if index == 0:
+        return 0.0
+    return MIN_VALUE * 2 * GAMMA**index / (GAMMA + 1)
+
+
+def exact_quantile(ordered: "Sequence[float]", q: float) -> float | None:
+    """Exact quantile of sorted values with the rank of `quantile`"""
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(q * len(ordered)), 1) - 1]
+
+
+def quantile(bins: "Mapping[int, int]", q: float) -> float | None:
+    """Value of the first value whose cumulative count reaches `q * count`, the
+    rank of `percentile_disc`, `None` without values"""
+    count = sum(bins.values())
+    if not count:
+        return None
+    rank = max(math.ceil(q * count), 1)
+    seen = 0
+    for index in sorted(bins):
+        seen += bins[index]
+        if seen >= rank:
+            return bin_value(index)
+    return bin_value(max(bins))
+
+
+class DDSketch:
+    """Mergeable sketch of the quantiles of the values added to it"""
+
+    __slots__ = ("bins",)
+
+    def __init__(self, bins: "Mapping[int, int] | None" = None) -> None:
+        self.bins: dict[int, int] = dict(bins) if bins else {}
+
+    def add(self, value: float) -> None:
+        index = bin_index(value)
+        self.bins[index] = self.bins.get(index, 0) + 1
+
+    def update(self, other: "DDSketch") -> None:
+        """Merge another sketch into this one, the union of both distributions"""
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def quantile(self, q: float) -> float | None:
+        return quantile(self.bins, q)
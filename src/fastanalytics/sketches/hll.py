@@ -0,0 +1,117 @@
+"""HyperLogLog sketch of the number of distinct values of a stream
+
+The values are hashed to 64 bits, the first `PRECISION` bits select one of
+`REGISTERS` registers and the rank (position of the first set bit) of the
+rest is recorded in it. The estimate is the bias corrected harmonic mean of
+`2 ** rank` over the registers, with linear counting for the small
+cardinalities, its relative standard error is `STANDARD_ERROR` (1.04 /
+sqrt(REGISTERS), about 1.6%) so 95% of the estimates are within 3.3%.
+
+Unlike the usual byte per register, a register is a bitmap of the ranks seen
+(`RANK_BITS` bits, the rank is the highest bit set), so the union of two
+sketches is the bitwise OR of their bytes, which Postgres computes with the
+`|` operator and the `bit_or` aggregate of the `BIT` type. The ranks are
+capped at `RANK_BITS`, the estimates stay accurate up to about
+`REGISTERS * 2 ** RANK_BITS` (~268M) distinct values.
+
+The registers take `SIZE` bytes (8 KB). A sketch of few values is sparse
+instead, the positions of the bits set in the registers (one per value at
+most), until there are more than `SPARSE_LIMIT`: the cost of the sketches
+of rare values (e.g. most referrers) grows with their number of values.
+"""
+
+import math
+import sys
+from array import array
+from collections import Counter
+from hashlib import blake2b
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+RANK_BITS = 16
+# Size in bytes of the registers of a sketch
+SIZE = REGISTERS * RANK_BITS // 8
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+# Bits set in a sparse sketch before its registers are allocated, the set of
+# positions takes about as much memory as the registers then
+SPARSE_LIMIT = 128
+
+_HASH_BITS = 64
+_RANK_SPACE = _HASH_BITS - PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Mergeable sketch of the number of distinct values added to it, sparse
+    until more than `SPARSE_LIMIT` bits of its registers are set"""
+
+    __slots__ = ("_registers", "_positions")
+
+    def __init__(self, registers: bytes | None = None) -> None:
+        if registers is not None and len(registers) != SIZE:
+            raise ValueError(f"A sketch has {SIZE} bytes of registers, got {len(registers)}")
+        self._registers = None if registers is None else bytearray(registers)
+        self._positions: set[int] = set()
+
+    def add(self, value: str) -> None:
+        hashed = _hash(value)
+        index = hashed >> _RANK_SPACE
+        rank = min(_RANK_SPACE - (hashed & ((1 << _RANK_SPACE) - 1)).bit_length() + 1, RANK_BITS)
+        # Registers are big endian, the bit `rank - 1` of the register is set,
+        # the bit `RANK_BITS - rank` of the register counted from the left
+        position = index * RANK_BITS + RANK_BITS - rank
+        if self._registers is not None:
+            self._registers[position // 8] |= 0x80 >> (position % 8)
+            return
+        self._positions.add(position)
+        if len(self._positions) > SPARSE_LIMIT:
+            self._densify()
+
+    def update(self, other: "HyperLogLog") -> None:
+        """Merge another sketch into this one, the union of both streams"""
+        if self._registers is None and other._registers is None:
+            self._positions |= other._positions
+            if len(self._positions) > SPARSE_LIMIT:
+                self._densify()
+            return
+        merged = int.from_bytes(self.to_bytes(), "big") | int.from_bytes(other.to_bytes(), "big")
+        self._registers = bytearray(merged.to_bytes(SIZE, "big"))
+        self._positions = set()
+
+    def positions(self) -> list[int] | None:
+        """Sorted positions of the bits set in the registers counted from the
+        left, `None` once the sketch is no longer sparse"""
+        return None if self._registers is not None else sorted(self._positions)
+
+    def to_bytes(self) -> bytes:
+        if self._registers is not None:
+            return bytes(self._registers)
+        registers = bytearray(SIZE)
+        for position in self._positions:
+            registers[position // 8] |= 0x80 >> (position % 8)
+        return bytes(registers)
+
+    def estimate(self) -> int:
+        return estimate(self.to_bytes())
+
+    def _densify(self) -> None:
+        self._registers = bytearray(self.to_bytes())
+        self._positions = set()
+
+
+def estimate(registers: bytes) -> int:
+    """Estimated number of distinct values of the registers of a sketch"""
+    bitmaps = array("H", registers)
+    if sys.byteorder == "little":
+        bitmaps.byteswap()
+    ranks = Counter(bitmap.bit_length() for bitmap in bitmaps)
+    harmonic = sum(count * 2.0**-rank for rank, count in ranks.items())
+    raw = _ALPHA * REGISTERS * REGISTERS / harmonic
+    zeros = ranks.get(0, 0)
+    if raw <= 2.5 * REGISTERS and zeros:
+        return round(REGISTERS * math.log(REGISTERS / zeros))
+    return round(raw)
@@ -0,0 +1,110 @@
+"""Space-Saving sketch of the most frequent values of a stream, its heavy hitters
+
+The sketch monitors at most `capacity` values with a counter each. A value
+already monitored increments its counter, a new one takes the place of a
+value with the lowest counter `min` once the sketch is full, starting from
+`min + 1` with an error of `min`. A counter is never below the true count of
+its value and over it by at most its error, and every value with a count
+over `n / capacity` (`n` values added) is monitored, so the top counters are
+the top values whenever their counts are apart by more than their errors.
+
+The counters are kept in buckets of values with the same count (the *stream
+summary*), so adding a value takes a constant time whatever the capacity.
+Sketches are merged by adding their counters, a value missing from a full
+sketch counts as its `min` with the same error.
+"""
+
+import heapq
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+
+class SpaceSaving:
+    """Sketch of the `capacity` most frequent values added to it"""
+
+    __slots__ = ("capacity", "total", "_counts", "_errors", "_buckets", "_min")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        # Number of values added
+        self.total = 0
+        self._counts: dict[str, int] = {}
+        self._errors: dict[str, int] = {}
+        # Values by count, in the order they reached it
+        self._buckets: dict[int, dict[str, None]] = {}
+        self._min = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, value: str) -> None:
+        self.total += 1
+        count = self._counts.get(value)
+        if count is not None:
+            self._move(value, count)
+            return
+        if len(self._counts) < self.capacity:
+            self._counts[value] = 1
+            self._errors[value] = 0
+            self._buckets.setdefault(1, {})[value] = None
+            self._min = 1
+            return
+        # Replace the value that reached the lowest count first
+        lowest = self._min
+        evicted = next(iter(self._buckets[lowest]))
+        del self._counts[evicted], self._errors[evicted]
+        self._counts[value] = lowest
+        self._errors[value] = lowest
+        self._buckets[lowest][value] = None
+        del self._buckets[lowest][evicted]
+        self._move(value, lowest)
+
+    def _move(self, value: str, count: int) -> None:
+        bucket = self._buckets[count]
+        del bucket[value]
+        self._counts[value] = count + 1
+        self._buckets.setdefault(count + 1, {})[value] = None
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min:
+                self._min = count + 1
+
+    @property
+    def min_count(self) -> int:
+        """Count of the values not monitored at most, 0 until the sketch is full"""
+        return self._min if len(self._counts) >= self.capacity else 0
+
+    def counters(self) -> "dict[str, tuple[int, int]]":
+        """Count and error of each monitored value"""
+        return {value: (count, self._errors[value]) for value, count in self._counts.items()}
+
+    def top(self, n: int) -> "list[tuple[str, int, int]]":
+        """The `n` values with the highest counts as `(value, count, error)`"""
+        return top(self.counters(), n)
+
+
+def merge(sketches: "Iterable[SpaceSaving]") -> "dict[str, tuple[int, int]]":
+    """Counters of the union of the streams of the sketches, as `{value: (count, error)}`"""
+    sketches = list(sketches)
+    merged: dict[str, tuple[int, int]] = {}
+    for sketch in sketches:
+        for value, (count, error) in sketch.counters().items():
+            merged_count, merged_error = merged.get(value, (0, 0))
+            merged[value] = (merged_count + count, merged_error + error)
+    for sketch in sketches:
+        # A value the sketch does not monitor may have been seen up to `min` times
+        lowest = sketch.min_count
+        if lowest:
+            for value, (count, error) in merged.items():
+                if value not in sketch._counts:
+                    merged[value] = (count + lowest, error + lowest)
+    return merged
+
+
+def top(counters: "Mapping[str, tuple[int, int]]", n: int) -> "list[tuple[str, int, int]]":
+    """The `n` values with the highest counts as `(value, count, error)`, the
+    lowest error first for the same count"""
+    best = heapq.nsmallest(n, counters.items(), key=lambda item: (-item[1][0], item[1][1]))
+    return [(value, count, error) for value, (count, error) in best]
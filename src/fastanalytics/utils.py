@@ -1,5 +1,9 @@
+from contextvars import ContextVar
 from datetime import datetime, timezone
 
+# Request ID (`X-Request-ID`) of the request being served, set by `LoggerMiddleware`
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
 
 def get_utc_now() -> datetime:
     """Get the current datetime aware of UTC timezone
@@ -0,0 +1,97 @@
+import math
+import random
+
+import pytest
+
+from fastanalytics.sketches import DDSketch
+from fastanalytics.sketches.ddsketch import MIN_VALUE, RELATIVE_ACCURACY, exact_quantile
+
+# Float rounding of the bins on top of the guaranteed accuracy
+_EPSILON = 1e-9
+_QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0]
+
+
+def _sketch(values: list[float]) -> DDSketch:
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def _assert_accurate(sketch: DDSketch, values: list[float], q: float) -> None:
+    exact = exact_quantile(sorted(values), q)
+    estimated = sketch.quantile(q)
+    assert exact is not None and estimated is not None
+    if exact <= MIN_VALUE:
+        assert estimated == 0.0
+    else:
+        assert abs(estimated - exact) <= (RELATIVE_ACCURACY + _EPSILON) * exact
+
+
+def test_empty_sketch_has_no_quantile():
+    assert DDSketch().quantile(0.5) is None
+    assert exact_quantile([], 0.5) is None
+
+
+@pytest.mark.parametrize(
+    "distribution",
+    [
+        lambda rng: rng.lognormvariate(math.log(15_000), 1.0),
+        lambda rng: rng.expovariate(1 / 150),
+        lambda rng: rng.uniform(0, 1_000),
+        lambda rng: rng.paretovariate(1.1),
+    ],
+    ids=["lognormal", "exponential", "uniform", "pareto"],
+)
+def test_quantiles_within_relative_accuracy(distribution):
+    rng = random.Random(0)
+    values = [distribution(rng) for _ in range(20_000)]
+    sketch = _sketch(values)
+    assert sketch.count == len(values)
+    for q in _QUANTILES:
+        _assert_accurate(sketch, values, q)
+
+
+@pytest.mark.parametrize("count", range(1, 12))
+def test_small_groups_have_the_rank_of_percentile_disc(count):
+    # Values far apart, a quantile of another rank is off by far more than
+    # the accuracy
+    values = [10.0 * 2**index for index in range(count)]
+    random.Random(count).shuffle(values)
+    sketch = _sketch(values)
+    for q in [*_QUANTILES, *(index / count for index in range(count + 1))]:
+        _assert_accurate(sketch, values, q)
+
+
+def test_exact_quantile_is_percentile_disc():
+    # SELECT percentile_disc(q) WITHIN GROUP (ORDER BY v) FROM generate_series(1, 4) AS v
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert [exact_quantile(values, q) for q in (0.0, 0.25, 0.26, 0.5, 0.75, 0.99, 1.0)] == [
+        1.0,
+        1.0,
+        2.0,
+        2.0,
+        3.0,
+        4.0,
+        4.0,
+    ]
+
+
+def test_values_up_to_the_minimum_are_zero():
+    sketch = _sketch([0.0, MIN_VALUE / 2, MIN_VALUE])
+    assert sketch.bins == {0: 3}
+    assert sketch.quantile(1.0) == 0.0
+
+
+def test_merge_is_lossless():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(5, 2) for _ in range(5_000)]
+    parts = [_sketch(values[start::4]) for start in range(4)]
+    merged = DDSketch()
+    for part in parts:
+        merged.update(part)
+    whole = _sketch(values)
+    assert merged.bins == whole.bins
+    for q in _QUANTILES:
+        assert merged.quantile(q) == whole.quantile(q)
+        _assert_accurate(merged, values, q)
@@ -0,0 +1,103 @@
+import math
+import random
+import uuid
+
+import pytest
+
+from fastanalytics.sketches import HyperLogLog
+from fastanalytics.sketches.hll import SIZE, SPARSE_LIMIT, STANDARD_ERROR
+
+
+def _sessions(count: int, rng: random.Random) -> list[str]:
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+
+
+def _sketch(values: list[str]) -> HyperLogLog:
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_empty_sketch_estimates_zero():
+    assert HyperLogLog().estimate() == 0
+
+
+@pytest.mark.parametrize("cardinality", [10, 100, 1_000, 10_000, 100_000])
+def test_estimate_within_standard_error(cardinality):
+    # 4 standard errors, a seeded run out of them is a broken estimator
+    values = _sessions(cardinality, random.Random(cardinality))
+    exact = len(set(values))
+    assert abs(_sketch(values).estimate() - exact) <= max(4 * STANDARD_ERROR * exact, 1)
+
+
+def test_root_mean_square_error_is_the_standard_error():
+    rng = random.Random(0)
+    errors = []
+    for _ in range(30):
+        values = _sessions(5_000, rng)
+        exact = len(set(values))
+        errors.append((_sketch(values).estimate() - exact) / exact)
+    assert math.sqrt(sum(error**2 for error in errors) / len(errors)) <= 1.5 * STANDARD_ERROR
+
+
+def test_duplicates_are_counted_once():
+    values = _sessions(2_000, random.Random(1))
+    assert _sketch(values * 5).estimate() == _sketch(values).estimate()
+
+
+def test_merge_is_the_sketch_of_the_union():
+    values = _sessions(20_000, random.Random(2))
+    first, second = _sketch(values[:12_000]), _sketch(values[8_000:])
+    first.update(second)
+    assert first.to_bytes() == _sketch(values).to_bytes()
+    assert abs(first.estimate() - 20_000) <= 4 * STANDARD_ERROR * 20_000
+
+
+def test_registers_round_trip():
+    sketch = _sketch(_sessions(500, random.Random(3)))
+    registers = sketch.to_bytes()
+    assert len(registers) == SIZE
+    assert HyperLogLog(registers).estimate() == sketch.estimate()
+
+
+def test_registers_of_another_size_are_rejected():
+    with pytest.raises(ValueError):
+        HyperLogLog(bytes(SIZE - 1))
+
+
+def test_sparse_sketch_has_the_registers_of_a_dense_one():
+    values = _sessions(SPARSE_LIMIT // 2, random.Random(4))
+    sparse = _sketch(values)
+    dense = HyperLogLog(bytes(SIZE))
+    for value in values:
+        dense.add(value)
+    assert sparse.positions() is not None and dense.positions() is None
+    assert sparse.to_bytes() == dense.to_bytes()
+    assert sparse.estimate() == dense.estimate()
+
+
+def test_sparse_sketch_turns_dense_past_its_limit():
+    values = _sessions(4 * SPARSE_LIMIT, random.Random(5))
+    sketch = _sketch(values[:SPARSE_LIMIT])
+    assert sketch.positions() is not None
+    for value in values[SPARSE_LIMIT:]:
+        sketch.add(value)
+    assert sketch.positions() is None
+    assert sketch.to_bytes() == _sketch(values).to_bytes()
+
+
+def test_positions_are_the_bits_set_from_the_left():
+    sketch = _sketch(_sessions(50, random.Random(6)))
+    registers = int.from_bytes(sketch.to_bytes(), "big")
+    assert sketch.positions() == [
+        position for position in range(SIZE * 8) if registers >> (SIZE * 8 - 1 - position) & 1
+    ]
+
+
+def test_merge_of_sparse_and_dense_sketches():
+    values = _sessions(3_000, random.Random(7))
+    sparse, dense = _sketch(values[:10]), _sketch(values[10:])
+    sparse.update(dense)
+    assert sparse.positions() is None
+    assert sparse.to_bytes() == _sketch(values).to_bytes()
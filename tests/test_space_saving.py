@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fastanalytics.db import top as db_top
+from fastanalytics.db.top import HeavyHitters, add_counters
+from fastanalytics.sketches import SpaceSaving
+from fastanalytics.sketches.space_saving import merge, top
+
+
+def _zipf(count: int, values: int, rng: random.Random) -> list[str]:
+    weights = [1 / rank**1.1 for rank in range(1, values + 1)]
+    return [f"/page/{rank}" for rank in rng.choices(range(values), weights, k=count)]
+
+
+def _sketch(values: list[str], capacity: int) -> SpaceSaving:
+    sketch = SpaceSaving(capacity)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def _assert_bounded(counters: dict[str, tuple[int, int]], exact: Counter[str]) -> None:
+    for value, (count, error) in counters.items():
+        assert count - error <= exact[value] <= count
+
+
+def test_exact_below_capacity():
+    values = _zipf(10_000, 50, random.Random(0))
+    sketch = _sketch(values, 100)
+    assert sketch.total == len(values)
+    assert sketch.min_count == 0
+    assert sketch.counters() == {value: (count, 0) for value, count in Counter(values).items()}
+
+
+@pytest.mark.parametrize("capacity", [10, 50, 200])
+def test_counts_bounded_over_capacity(capacity):
+    values = _zipf(50_000, 2_000, random.Random(capacity))
+    exact = Counter(values)
+    sketch = _sketch(values, capacity)
+    assert len(sketch) == capacity
+    assert sketch.total == len(values)
+    _assert_bounded(sketch.counters(), exact)
+    # Every value seen more than `n / capacity` times is monitored
+    assert {value for value, count in exact.items() if count > len(values) / capacity} <= set(
+        sketch.counters()
+    )
+    # The unmonitored values are seen at most `min` times
+    assert all(
+        count <= sketch.min_count
+        for value, count in exact.items()
+        if value not in sketch.counters()
+    )
+
+
+def test_top_values_of_distinct_counts():
+    rng = random.Random(1)
+    values = [
+        f"/{value}"
+        for value, count in [("a", 3_000), ("b", 2_000), ("c", 1_000)]
+        for _ in range(count)
+    ]
+    values += [f"/rare/{rng.randrange(5_000)}" for _ in range(2_000)]
+    rng.shuffle(values)
+    assert [value for value, _, _ in _sketch(values, 20).top(3)] == ["/a", "/b", "/c"]
+
+
+def test_merge_below_capacity_is_exact():
+    rng = random.Random(2)
+    first, second = _zipf(5_000, 30, rng), _zipf(5_000, 30, rng)
+    merged = merge([_sketch(first, 50), _sketch(second, 50)])
+    assert merged == {value: (count, 0) for value, count in Counter(first + second).items()}
+
+
+def test_merge_bounded_over_capacity():
+    rng = random.Random(3)
+    first, second = _zipf(20_000, 1_000, rng), _zipf(20_000, 1_000, rng)
+    sketches = [_sketch(first, 40), _sketch(second, 40)]
+    merged = merge(sketches)
+    _assert_bounded(merged, Counter(first + second))
+    assert set(merged) == set(sketches[0].counters()) | set(sketches[1].counters())
+
+
+def test_top_orders_ties_by_error_then_first_seen():
+    counters = {"/a": (5, 2), "/b": (7, 0), "/c": (5, 0), "/d": (5, 2), "/e": (1, 0)}
+    assert top(counters, 4) == [("/b", 7, 0), ("/c", 5, 0), ("/a", 5, 2), ("/d", 5, 2)]
+    assert top(counters, 10)[-1] == ("/e", 1, 0)
+    assert top(counters, 0) == []
+
+
+def test_add_counters_adds_database_rows_to_memory():
+    counters = merge([_sketch(["/a", "/a", "/b"], 10)])
+    add_counters(counters, [("/a", 4, 1), ("/c", 2, 0)])
+    add_counters(counters, [("/c", 1, 1)])
+    assert counters == {"/a": (6, 1), "/b": (1, 0), "/c": (3, 1)}
+    assert top(counters, 2) == [("/a", 6, 1), ("/c", 3, 1)]
+
+
+class _Clock:
+    def __init__(self, now: datetime) -> None:
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class _Session:
+    """Records the rows written by `HeavyHitters.persist`"""
+
+    def __init__(self, written: list[dict]) -> None:
+        self._written = written
+
+    async def __aenter__(self) -> "_Session":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        pass
+
+    async def run_sync(self, function: object, rows: list[dict]) -> None:
+        self._written.extend(rows)
+
+    async def commit(self) -> None:
+        pass
+
+
+def test_windows_rotate_out_of_memory(monkeypatch):
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    clock = _Clock(start)
+    written: list[dict] = []
+    monkeypatch.setattr(db_top, "get_utc_now", clock)
+    monkeypatch.setattr(db_top, "AsyncSession", lambda engine: _Session(written))
+    hitters = HeavyHitters(
+        None,
+        logging.getLogger(__name__),
+        ["page"],
+        10,
+        60,
+        2,
+        5,
+        1.0,  # type: ignore[arg-type]
+    )
+
+    hitters.add([{"page": "/a"}] * 3, [start] * 3)
+    clock.now = start + timedelta(seconds=60)
+    hitters.add([{"page": "/b"}] * 2, [clock.now] * 2)
+    counters, held_from = hitters.counters("page", *hitters.time_range(None, None))
+    assert counters == {"/a": (3, 0), "/b": (2, 0)}
+    assert held_from == start
+
+    # The first window is closed and written, then left out once older than
+    # the two latest windows, and its late events are no longer counted
+    clock.now = start + timedelta(seconds=120.5)
+    assert asyncio.run(hitters.persist())
+    assert [(row["value"], row["time"], row["count"]) for row in written] == [("/a", start, 3)]
+    hitters.add([{"page": "/a"}], [start])
+    counters, held_from = hitters.counters("page", *hitters.time_range(start, None))
+    assert counters == {"/b": (2, 0)}
+    assert held_from == start + timedelta(seconds=60)